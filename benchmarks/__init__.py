@@ -0,0 +1,10 @@
+""" Performance benchmarks for IndexedList
+
+Run the suite and save the results:
+
+    python -m benchmarks.run --sizes 1000 100000 --output results.json
+
+Then compare results saved from two commits:
+
+    python -m benchmarks.compare before.json after.json
+"""
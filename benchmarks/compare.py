@@ -0,0 +1,105 @@
+""" Compares two sets of benchmark results written by benchmarks.run
+
+Prints the ratio of each measurement in the second file to the same measurement
+in the first, marking those that got worse by more than the threshold:
+
+    python -m benchmarks.compare before.json after.json --threshold 0.1
+
+Exits with status 1 if any measurement got worse by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+from typing import Dict, List, Tuple
+
+# Measurements compared between results, where lower values are better
+MEASUREMENTS = ("seconds", "bytes")
+
+# Fractional increase above which a measurement is reported as a regression
+DEFAULT_THRESHOLD = 0.1
+
+
+def load(path: str) -> Dict[Tuple, dict]:
+    """ Load benchmark results, keyed by (benchmark, variant, size, cardinality)
+
+    :param path: Path of a JSON file written by benchmarks.run
+    """
+
+    with open(path) as results_file:
+        report = json.load(results_file)
+
+    return {
+        (result["benchmark"], result["variant"], result["size"], result["cardinality"]): result
+        for result in report["results"]
+    }
+
+
+def compare(before: Dict[Tuple, dict], after: Dict[Tuple, dict],
+            threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """ Compare the measurements present in both sets of results
+
+    Returns one dict per measurement, holding the key, measurement name, both values,
+    their ratio, and whether the increase is over the threshold.
+
+    :param before: Results to compare against
+    :param after: Results being compared
+    :param threshold: Fractional increase above which a measurement is a regression
+    """
+
+    comparisons = []
+
+    for key in sorted(before.keys() & after.keys(), key=str):
+
+        for measurement in MEASUREMENTS:
+
+            if measurement not in before[key] or measurement not in after[key]:
+                continue
+
+            before_value = before[key][measurement]
+            after_value = after[key][measurement]
+            ratio = after_value / before_value if before_value else None
+
+            comparisons.append({
+                "key": key,
+                "measurement": measurement,
+                "before": before_value,
+                "after": after_value,
+                "ratio": ratio,
+                "regression": ratio is not None and ratio > 1 + threshold
+            })
+
+    return comparisons
+
+
+def main(args: List[str] = None):
+    """ Compare two benchmark result files from the command line
+
+    :param args: Command line arguments, or None to use sys.argv
+    """
+
+    parser = argparse.ArgumentParser(description="Compare IndexedList benchmark results")
+    parser.add_argument("before", help="Results to compare against")
+    parser.add_argument("after", help="Results being compared")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Fractional increase reported as a regression")
+
+    parsed = parser.parse_args(args)
+
+    comparisons = compare(load(parsed.before), load(parsed.after), parsed.threshold)
+
+    for comparison in comparisons:
+        benchmark, variant, size, cardinality = comparison["key"]
+        ratio = "n/a" if comparison["ratio"] is None else f"{comparison['ratio']:.2f}x"
+        flag = "  REGRESSION" if comparison["regression"] else ""
+
+        print(f"{benchmark:<18} {variant:<22} size={size:<9} cardinality={cardinality:<7} "
+              f"{comparison['measurement']:<8} {ratio}{flag}")
+
+    if any(comparison["regression"] for comparison in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
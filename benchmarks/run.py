@@ -0,0 +1,366 @@
+""" Runs the benchmark suite, writing the results as JSON
+
+Each benchmark is run for every combination of list size and key cardinality
+given. Items are dicts of the form:
+
+    {"key": i % cardinality, "value": i, "nested": {"key": str(i % cardinality)}}
+
+Times are the best of several repeats, in seconds. Memory is measured with
+tracemalloc, so it covers allocations made by Python objects only.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from typing import Callable, Iterator, List
+
+from indexedlist import IndexedList, vectorized
+
+# List sizes and key cardinalities used when none are given
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_CARDINALITIES = (10, 1000)
+
+# Fractions of the list returned by range seeks
+RANGE_SELECTIVITIES = (0.001, 0.01, 0.1)
+
+# Number of lookups on the list when measuring extend with several lookups
+MANY_LOOKUPS = 3
+
+# Number and size of the batches added to a full list when measuring extend
+EXTEND_BATCHES = 100
+EXTEND_BATCH_SIZE = 40
+
+# Number of items replaced and deleted when measuring churn, as a fraction of the list
+CHURN_FRACTION = 0.01
+
+
+def make_items(size: int, cardinality: int) -> list:
+    """ Build the items benchmarks are run against
+
+    :param size: Number of items
+    :param cardinality: Number of distinct keys
+    """
+
+    return [
+        {"key": i % cardinality, "value": i, "nested": {"key": str(i % cardinality)}}
+        for i in range(0, size)
+    ]
+
+
+def best_time(func: Callable[..., object], repeats: int, setup: Callable[[], object] = None) -> float:
+    """ Returns the fastest of several timed calls of a function, in seconds
+
+    :param func: Function to time. If setup is given, it's called with setup's result.
+    :param repeats: Number of times to call the function
+    :param setup: Function called before each timed call, whose time isn't measured
+    """
+
+    times = []
+
+    for _ in range(0, repeats):
+        argument = setup() if setup is not None else None
+
+        gc.collect()
+        start = time.perf_counter()
+
+        if setup is not None:
+            func(argument)
+        else:
+            func()
+
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def bench_extend(items: list, repeats: int) -> Iterator[dict]:
+    """ Time extending an empty list with 0, 1 and several lookups
+
+    :param items: Items to add
+    :param repeats: Number of times to repeat each measurement
+    """
+
+    definitions = [
+        lambda ilist: ilist.item["key"],
+        lambda ilist: ilist.item["value"],
+        lambda ilist: ilist.item["nested"]["key"]
+    ]
+
+    for lookup_count in (0, 1, MANY_LOOKUPS):
+
+        def setup():
+            ilist = IndexedList()
+            ilist.create_lookups(definition(ilist) for definition in definitions[:lookup_count])
+
+            return ilist
+
+        yield {
+            "benchmark": "extend",
+            "variant": f"{lookup_count}_lookups",
+            "seconds": best_time(lambda ilist: ilist.extend(items), repeats, setup)
+        }
+
+    # Extending a full list in small batches should cost the same however
+    # large the list (and so the postings being added to) already is
+    batch = items[:EXTEND_BATCH_SIZE]
+
+    def full_list():
+        ilist = IndexedList(items)
+        ilist.create_lookup(ilist.item["key"])
+
+        return ilist
+
+    def extend_batches(ilist):
+        for _ in range(0, EXTEND_BATCHES):
+            ilist.extend(batch)
+
+    seconds = best_time(extend_batches, repeats, full_list)
+
+    yield {
+        "benchmark": "extend",
+        "variant": "batches_into_full_list",
+        "operations": EXTEND_BATCHES,
+        "seconds": seconds,
+        "seconds_per_operation": seconds / EXTEND_BATCHES
+    }
+
+
+def bench_create_lookup(items: list, repeats: int) -> Iterator[dict]:
+    """ Time building sorted and hashed lookups on a list, and measure their memory
+
+    :param items: Items in the list
+    :param repeats: Number of times to repeat each measurement
+    """
+
+    for hashed in (False, True):
+        variant = "hashed" if hashed else "sorted"
+
+        yield {
+            "benchmark": "create_lookup",
+            "variant": variant,
+            "seconds": best_time(
+                lambda ilist: ilist.create_lookup(ilist.item["key"], hashed=hashed),
+                repeats,
+                lambda: IndexedList(items)
+            )
+        }
+
+        ilist = IndexedList(items)
+
+        gc.collect()
+        tracemalloc.start()
+        ilist.create_lookup(ilist.item["key"], hashed=hashed)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        yield {
+            "benchmark": "lookup_memory",
+            "variant": variant,
+            "bytes": allocated,
+            "bytes_per_item": allocated / max(len(items), 1)
+        }
+
+
+def bench_seek(items: list, cardinality: int, repeats: int) -> Iterator[dict]:
+    """ Time == and .in_ searches served by a lookup
+
+    :param items: Items in the list
+    :param cardinality: Number of distinct keys
+    :param repeats: Number of times to repeat each measurement
+    """
+
+    ilist = IndexedList(items)
+    ilist.create_lookup(ilist.item["key"])
+
+    keys = list(range(0, min(5, cardinality)))
+
+    queries = {
+        "equals": ilist.item["key"] == keys[0],
+        "in": ilist.item["key"].in_(*keys)
+    }
+
+    for variant, query in queries.items():
+        yield {
+            "benchmark": "lookup_seek",
+            "variant": variant,
+            "rows": ilist.count(query),
+            "seconds": best_time(lambda: sum(1 for _ in ilist.search(query)), repeats)
+        }
+
+
+def bench_range_seek(items: list, repeats: int) -> Iterator[dict]:
+    """ Time range searches served by a lookup, returning different fractions of the list
+
+    :param items: Items in the list
+    :param repeats: Number of times to repeat each measurement
+    """
+
+    ilist = IndexedList(items)
+    ilist.create_lookup(ilist.item["value"])
+
+    for selectivity in RANGE_SELECTIVITIES:
+        query = ilist.item["value"] < max(int(len(items) * selectivity), 1)
+
+        yield {
+            "benchmark": "lookup_range_seek",
+            "variant": f"selectivity_{selectivity}",
+            "rows": ilist.count(query),
+            "seconds": best_time(lambda: sum(1 for _ in ilist.search(query)), repeats)
+        }
+
+
+def bench_scan(items: list, repeats: int) -> Iterator[dict]:
+    """ Time full list scans through nested item[...] transformations
+
+    :param items: Items in the list
+    :param repeats: Number of times to repeat each measurement
+    """
+
+    ilist = IndexedList(items)
+
+    queries = {
+        "nested_string": ilist.item["nested"]["key"] == "1",
+        "numeric": ilist.item["value"] == 1
+    }
+
+    for variant, query in queries.items():
+        yield {
+            "benchmark": "data_scan",
+            "variant": variant,
+            "seconds": best_time(lambda: sum(1 for _ in ilist.search(query)), repeats)
+        }
+
+
+def bench_churn(items: list, repeats: int) -> Iterator[dict]:
+    """ Time replacing and deleting items in a list with two lookups
+
+    :param items: Items in the list
+    :param repeats: Number of times to repeat each measurement
+    """
+
+    changes = max(int(len(items) * CHURN_FRACTION), 1)
+    positions = random.Random(0).sample(range(0, len(items) - changes), changes)
+
+    def setup():
+        ilist = IndexedList(items)
+        ilist.create_lookup(ilist.item["key"])
+        ilist.create_lookup(ilist.item["value"])
+
+        return ilist
+
+    def replace(ilist):
+        for position in positions:
+            ilist[position] = items[-position - 1]
+
+    def delete(ilist):
+        for position in positions:
+            del ilist[position]
+
+    for variant, func in (("setitem", replace), ("delitem", delete)):
+        seconds = best_time(func, repeats, setup)
+
+        yield {
+            "benchmark": "churn",
+            "variant": variant,
+            "operations": changes,
+            "seconds": seconds,
+            "seconds_per_operation": seconds / changes
+        }
+
+
+def run(sizes: List[int], cardinalities: List[int], repeats: int) -> List[dict]:
+    """ Run every benchmark for each combination of list size and key cardinality
+
+    :param sizes: List sizes to benchmark
+    :param cardinalities: Numbers of distinct keys to benchmark
+    :param repeats: Number of times to repeat each measurement
+    """
+
+    results = []
+
+    for size in sizes:
+
+        for cardinality in cardinalities:
+            items = make_items(size, cardinality)
+
+            benchmarks = [
+                bench_extend(items, repeats),
+                bench_create_lookup(items, repeats),
+                bench_seek(items, cardinality, repeats),
+                bench_range_seek(items, repeats),
+                bench_scan(items, repeats),
+                bench_churn(items, repeats)
+            ]
+
+            for benchmark in benchmarks:
+
+                for result in benchmark:
+                    result.update({"size": size, "cardinality": cardinality})
+                    results.append(result)
+
+                    print(json.dumps(result), file=sys.stderr)
+
+    return results
+
+
+def environment() -> dict:
+    """ Returns details of the environment the benchmarks were run in """
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": vectorized.available(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+
+def main(args: List[str] = None):
+    """ Run the benchmark suite from the command line
+
+    :param args: Command line arguments, or None to use sys.argv
+    """
+
+    parser = argparse.ArgumentParser(description="Run IndexedList benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="List sizes to benchmark (up to 10000000)")
+    parser.add_argument("--cardinalities", type=int, nargs="+", default=DEFAULT_CARDINALITIES,
+                        help="Numbers of distinct keys to benchmark")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Number of times to repeat each measurement")
+    parser.add_argument("--output", help="File to write JSON results to, instead of stdout")
+
+    parsed = parser.parse_args(args)
+
+    report = {
+        "environment": environment(),
+        "results": run(parsed.sizes, parsed.cardinalities, parsed.repeats)
+    }
+
+    if parsed.output is None:
+        print(json.dumps(report, indent=2))
+        return
+
+    with open(parsed.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
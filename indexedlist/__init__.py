@@ -1 +1,2 @@
 from .core import IndexedList, Indexable
+from .params import Param
@@ -0,0 +1,232 @@
+""" Recording of the queries run against an IndexedList, and advice on which lookups to create
+
+Recording is opt-in. Once started, every search and count is logged:
+
+    my_list.record_workload()
+    ...
+    for recommendation in my_list.advise():
+        print(recommendation)
+
+advise() looks through the recorded queries for comparisons that no lookup could
+serve, and estimates how much work a lookup on each comparison's transformations
+would have saved. Savings are measured in the planner's relative cost units (see
+plans.py), assuming the lookup would have narrowed each search down to the rows it
+returned. Lookups are ranked by the cost saved per row they would hold, which is
+roughly the number of full list scans they would have avoided.
+"""
+
+from collections import deque
+from typing import TYPE_CHECKING, Generator, Iterable, List
+
+from . import comparators as cmps
+from . import operations as ops
+from . import patterns
+from . import plans
+
+if TYPE_CHECKING:
+    from .core import IndexedList
+
+# Number of queries a Workload keeps by default, after which the oldest are discarded
+DEFAULT_MAX_RECORDS = 10000
+
+
+class QueryRecord:
+    """ Details of a query that was run against an IndexedList """
+
+    def __init__(self, query: patterns.Pattern, scanned: bool, rows_examined: float,
+                 rows_returned: int):
+        """ Construct a new QueryRecord
+
+        :param query: Pattern representing the query
+        :param scanned: True if the query was answered with a full list scan
+        :param rows_examined: Number of items checked against the query (estimated
+            from the plan when the query started from lookups)
+        :param rows_returned: Number of items returned
+        """
+
+        self.query = query
+        self.scanned = scanned
+        self.rows_examined = rows_examined
+        self.rows_returned = rows_returned
+
+        seekable = patterns.seekable_patterns(query)
+
+        # Transformation signatures and comparator types of each comparison a lookup could serve
+        self.signatures = tuple(pattern.transformations.signature for pattern in seekable)
+        self.comparator_types = tuple(type(pattern.comparator) for pattern in seekable)
+
+    def describe(self) -> dict:
+        """ Returns a dict describing the query record """
+
+        return {
+            "query": str(self.query),
+            "comparators": [comparator_type.__name__ for comparator_type in self.comparator_types],
+            "scanned": self.scanned,
+            "rows_examined": self.rows_examined,
+            "rows_returned": self.rows_returned
+        }
+
+
+class Workload:
+    """ Log of the queries run against an IndexedList while recording """
+
+    def __init__(self, max_records: int = DEFAULT_MAX_RECORDS):
+        """ Construct a new, empty Workload
+
+        :param max_records: Number of queries to keep, after which the oldest are discarded
+        """
+
+        self.records = deque(maxlen=max_records)
+
+        # Queries are only recorded while enabled
+        self.enabled = True
+
+    def __len__(self):
+
+        return len(self.records)
+
+    def record(self, plan: plans.QueryPlan, row_count: int, rows_returned: int):
+        """ Log a query that has been run
+
+        :param plan: QueryPlan used to run the query
+        :param row_count: Number of items in the list when the query was run
+        :param rows_returned: Number of items the query returned
+        """
+
+        first_operation = plan.operations[0]
+        scanned = isinstance(first_operation, ops.DataScan)
+
+        if scanned or first_operation.estimated_rows is None:
+            rows_examined = row_count
+        else:
+            rows_examined = first_operation.estimated_rows
+
+        self.records.append(QueryRecord(plan.query, scanned, rows_examined, rows_returned))
+
+    def record_results(self, plan: plans.QueryPlan, row_count: int,
+                       results: Iterable[tuple]) -> Generator[tuple, None, None]:
+        """ Pass through the results of a search, logging the query once they've been read
+
+        The query is logged when the results are exhausted or the generator is closed,
+        counting only the results that were read.
+
+        :param plan: QueryPlan used to run the query
+        :param row_count: Number of items in the list when the query was run
+        :param results: Iterable of (index, item) tuples returned by the plan
+        """
+
+        rows_returned = 0
+
+        try:
+            for result in results:
+                rows_returned += 1
+                yield result
+        finally:
+            self.record(plan, row_count, rows_returned)
+
+
+class Recommendation:
+    """ A lookup recommended by advise(), with the estimated benefit and cost of creating it """
+
+    def __init__(self, definition: patterns.IndexerPattern, hashed: bool = True):
+        """ Construct a new Recommendation
+
+        :param definition: Definition of the lookup, as accepted by create_lookup()
+        :param hashed: If True, the lookup only needs to serve == and .in_ searches
+        """
+
+        self.definition = definition
+        self.hashed = hashed
+
+        # Number of recorded queries the lookup would have served
+        self.queries = 0
+
+        # Estimated cost the lookup would have saved across those queries
+        self.cost_saved = 0.0
+
+        # Estimated number of row ids the lookup would hold
+        self.rows_held = 0
+
+        # Set to True if advise() created the lookup
+        self.created = False
+
+    def __str__(self):
+
+        return str(self.describe())
+
+    @property
+    def score(self) -> float:
+        """ Estimated cost saved per row id held, roughly the number of full list scans avoided """
+
+        return self.cost_saved / max(self.rows_held, 1)
+
+    def describe(self) -> dict:
+        """ Returns a dict describing the recommendation """
+
+        return {
+            "definition": str(self.definition),
+            "hashed": self.hashed,
+            "queries": self.queries,
+            "cost_saved": self.cost_saved,
+            "rows_held": self.rows_held,
+            "score": self.score,
+            "created": self.created
+        }
+
+
+def advise(workload: Workload, data: "IndexedList") -> List[Recommendation]:
+    """ Rank lookups that would have served recorded queries, best first
+
+    Only comparisons that none of the list's lookups (including ones not yet built)
+    could serve are considered. A hashed lookup is recommended when a comparison's
+    transformations were only searched with == and .in_, otherwise a sorted lookup.
+
+    :param workload: Workload of recorded queries
+    :param data: IndexedList the queries were run against
+    """
+
+    recommendations = {}
+
+    for record in workload.records:
+        unserved = [
+            pattern for pattern in patterns.seekable_patterns(record.query)
+            if not _has_lookup(pattern, data)
+        ]
+
+        if not unserved:
+            continue
+
+        cost_saved = max(
+            record.rows_examined * plans._scan_row_cost(record.query)
+            - record.rows_returned * plans.FETCH_ROW_COST,
+            0
+        )
+
+        for pattern in unserved:
+            signature = pattern.transformations.signature
+            recommendation = recommendations.get(signature)
+
+            if recommendation is None:
+                recommendation = Recommendation(patterns.IndexerPattern(pattern.transformations))
+                recommendation.rows_held = len(data)
+                recommendations[signature] = recommendation
+
+            if not isinstance(pattern.comparator, (cmps.EqualsComparator, cmps.InComparator)):
+                recommendation.hashed = False
+
+            recommendation.queries += 1
+            recommendation.cost_saved += cost_saved
+
+    return sorted(recommendations.values(), key=lambda recommendation: recommendation.score, reverse=True)
+
+
+def _has_lookup(pattern: patterns.SearchPattern, data: "IndexedList") -> bool:
+    """ Returns True if the list has a lookup, built or not, that could serve a comparison
+
+    :param pattern: SearchPattern representing the comparison
+    :param data: IndexedList the query was run against
+    """
+
+    lookup, _ = plans._find_lookup_for_search(pattern, data.lookups.by_signature)
+
+    return lookup is not None or bool(plans.lookups_to_build(pattern, data.lookups))
@@ -7,10 +7,12 @@ a GreaterThanEquals comparator:
     my_item.search(my_item.item >= 10)
 """
 
-from typing import Iterable
+from typing import Iterable, Set
 
+from . import params
 
-class Comparator:
+
+class Comparator(params.Parameterized):
     """ Generic Comparator, meant for subclassing """
 
     def __init__(self):
@@ -29,6 +31,26 @@ class Comparator:
 
         raise NotImplementedError("Not implemented in base comparator class")
 
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params standing in for the values being compared against """
+
+        return set()
+
+    @property
+    def key(self) -> tuple:
+        """ Tuple identifying the values being compared against """
+
+        raise NotImplementedError("Not implemented in base comparator class")
+
+    def bind(self, values: dict) -> "Comparator":
+        """ Return a copy of the Comparator with any Params replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        return self
+
     def covers(self, other_comparator: "Comparator") -> bool:
         """ Returns True if this comparator is a logical superset of other_comparator
 
@@ -59,6 +81,29 @@ class SingleItemComparator(Comparator):
 
         self.value = value
 
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params standing in for the values being compared against """
+
+        return params.names(self.value)
+
+    @property
+    def key(self) -> tuple:
+        """ Tuple identifying the value being compared against """
+
+        return self.value,
+
+    def bind(self, values: dict) -> "SingleItemComparator":
+        """ Return a copy of the Comparator with any Params replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        if not self.params:
+            return self
+
+        return type(self)(params.bind(self.value, values))
+
     @property
     def values(self) -> tuple:
         """ Return value as a single-valued tuple
@@ -80,7 +125,31 @@ class MultiItemComparator(Comparator):
 
         super().__init__()
 
-        self.values = values
+        # Repeated values would be seeked (and counted) more than once
+        self.values = _distinct(values)
+
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params standing in for the values being compared against """
+
+        return params.names(*self.values)
+
+    @property
+    def key(self) -> tuple:
+        """ Tuple identifying the values being compared against """
+
+        return tuple(self.values)
+
+    def bind(self, values: dict) -> "MultiItemComparator":
+        """ Return a copy of the Comparator with any Params replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        if not self.params:
+            return self
+
+        return type(self)(params.bind(tuple(self.values), values))
 
 
 class RangeComparator(Comparator):
@@ -103,6 +172,71 @@ class RangeComparator(Comparator):
         self.start_inclusive = start_inclusive
         self.end_inclusive = end_inclusive
 
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params standing in for the values being compared against """
+
+        return params.names(self.start_key, self.end_key)
+
+    @property
+    def key(self) -> tuple:
+        """ Tuple identifying the range being compared against """
+
+        return self.start_key, self.start_inclusive, self.end_key, self.end_inclusive
+
+    def bind(self, values: dict) -> "RangeComparator":
+        """ Return a copy of the Comparator with any Params replaced by values
+
+        Subclasses only accept the keys they use, so only keys that are set are passed on.
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        if not self.params:
+            return self
+
+        keys = {}
+
+        if self.start_key is not None:
+            keys["start_key"] = params.bind(self.start_key, values)
+
+        if self.end_key is not None:
+            keys["end_key"] = params.bind(self.end_key, values)
+
+        return type(self)(**keys)
+
+    def _covers_range(self, other_comparison: "RangeComparator") -> bool:
+        """ Returns True if other_comparison's range falls entirely within this range
+
+        :param other_comparison: A RangeComparator to check
+        """
+
+        if self.start_key is not None:
+
+            if other_comparison.start_key is None:
+                return False
+
+            if other_comparison.start_key < self.start_key:
+                return False
+
+            if (other_comparison.start_key == self.start_key
+                    and other_comparison.start_inclusive and not self.start_inclusive):
+                return False
+
+        if self.end_key is not None:
+
+            if other_comparison.end_key is None:
+                return False
+
+            if other_comparison.end_key > self.end_key:
+                return False
+
+            if (other_comparison.end_key == self.end_key
+                    and other_comparison.end_inclusive and not self.end_inclusive):
+                return False
+
+        return True
+
 
 class EqualsComparator(SingleItemComparator):
     """ Represents an equality (==) comparison """
@@ -214,7 +348,8 @@ class GreaterThanComparator(RangeComparator):
             EqualsComparator: self._covers_equals,
             InComparator: self._covers_in,
             GreaterThanComparator: self._covers_greater_than,
-            GreaterThanEqualsComparator: self._covers_greater_than_equals
+            GreaterThanEqualsComparator: self._covers_greater_than_equals,
+            BetweenComparator: self._covers_range
         }
 
     def __str__(self):
@@ -280,7 +415,8 @@ class GreaterThanEqualsComparator(RangeComparator):
             EqualsComparator: self._covers_equals,
             InComparator: self._covers_in,
             GreaterThanComparator: self._covers_greater_than,
-            GreaterThanEqualsComparator: self._covers_greater_than_equals
+            GreaterThanEqualsComparator: self._covers_greater_than_equals,
+            BetweenComparator: self._covers_range
         }
 
     def __str__(self):
@@ -345,7 +481,8 @@ class LessThanComparator(RangeComparator):
             EqualsComparator: self._covers_equals,
             InComparator: self._covers_in,
             LessThanComparator: self._covers_less_than,
-            LessThanEqualsComparator: self._covers_less_than_equals
+            LessThanEqualsComparator: self._covers_less_than_equals,
+            BetweenComparator: self._covers_range
         }
 
     def __str__(self):
@@ -411,7 +548,8 @@ class LessThanEqualsComparator(RangeComparator):
             EqualsComparator: self._covers_equals,
             InComparator: self._covers_in,
             LessThanComparator: self._covers_less_than,
-            LessThanEqualsComparator: self._covers_less_than_equals
+            LessThanEqualsComparator: self._covers_less_than_equals,
+            BetweenComparator: self._covers_range
         }
 
     def __str__(self):
@@ -457,3 +595,85 @@ class LessThanEqualsComparator(RangeComparator):
         """
 
         return other_comparison.end_key <= self.end_key
+
+
+class BetweenComparator(RangeComparator):
+    """ Represents a comparison against an inclusive range of values
+
+    Handles queries like: my_list.item.between(1, 10)
+    """
+
+    def __init__(self, start_key: object, end_key: object):
+        """ Construct a new BetweenComparator
+
+        :param start_key: Key representing the inclusive start of the range
+        :param end_key: Key representing the inclusive end of the range
+        """
+
+        super().__init__(
+            start_key=start_key,
+            end_key=end_key,
+            start_inclusive=True,
+            end_inclusive=True
+        )
+
+        self.cover_checks = {
+            EqualsComparator: self._covers_equals,
+            InComparator: self._covers_in,
+            GreaterThanComparator: self._covers_range,
+            GreaterThanEqualsComparator: self._covers_range,
+            LessThanComparator: self._covers_range,
+            LessThanEqualsComparator: self._covers_range,
+            BetweenComparator: self._covers_range
+        }
+
+    def __str__(self):
+
+        return f".between({self.start_key}, {self.end_key})"
+
+    def matches(self, item: object) -> bool:
+        """ Returns True if item is between start_key and end_key values, inclusive
+
+        :param item: Item to check against start_key and end_key values
+        """
+
+        return self.start_key <= item <= self.end_key
+
+    def _covers_equals(self, other_comparison: EqualsComparator) -> bool:
+        """ Returns True if other_comparison covers a subset of this Comparator's values
+
+        :param other_comparison: An EqualsComparator to check
+        """
+
+        return self.matches(other_comparison.value)
+
+    def _covers_in(self, other_comparison: InComparator) -> bool:
+        """ Returns True if other_comparison covers a subset of this Comparator's values
+
+        :param other_comparison: An InComparator to check
+        """
+
+        return all(self.matches(value) for value in other_comparison.values)
+
+
+def _distinct(values: Iterable) -> tuple:
+    """ Returns the values without repeats, keeping the order they first appear in
+
+    :param values: Iterable of values, which may be unhashable
+    """
+
+    values = list(values)
+
+    try:
+        return tuple(dict.fromkeys(values))
+    except TypeError:
+        pass
+
+    distinct = []
+
+    for value in values:
+
+        if value not in distinct:
+            distinct.append(value)
+
+    return tuple(distinct)
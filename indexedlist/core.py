@@ -1,15 +1,53 @@
 """ Core classes used to implement the IndexedList """
 
+import bisect
+import contextlib
+import copy
+import functools
+import importlib
+import operator
+import pickle
+import sys
 import uuid
 
-from typing import Iterable, Generator, List, Callable
+from collections.abc import MutableMapping
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from typing import Iterable, Generator, List, Callable, Optional, Tuple
 
 from sortedcontainers import SortedDict
 
+from . import advisor
 from . import comparators as cmps
 from . import patterns
 from . import exc
+from . import locks
+from . import parallel
 from . import plans
+from . import postings
+
+# Fraction of a lookup's items a range search is assumed to match when its
+# bounds are Params, which aren't known until a prepared query runs
+UNKNOWN_RANGE_FRACTION = 1 / 3
+
+# Maximum number of plans kept for prepared queries on each IndexedList
+PLAN_CACHE_SIZE = 256
+
+# Average distance between row ids given to items when the row ids around an
+# insertion are spread out and there's no item on one side to limit them
+ROW_ID_SPACING = 4
+
+
+def _writes(method: Callable) -> Callable:
+    """ Decorate an IndexedList method that changes the list or its lookups to hold the write lock """
+
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+
+        with self._lock.write():
+            return method(self, *args, **kwargs)
+
+    return locked
 
 
 class IndexedList:
@@ -27,24 +65,75 @@ class IndexedList:
 
         my_list.search(my_list.item == 2)
 
+    Queries can be combined with & (and), | (or) and ~ (not):
+
+        my_list.search((my_list.item['a'] == 2) & (my_list.item['b'] > 10))
+
     Order of items returned by the generator is NOT guaranteed. It is recommended that
     only immutable objects be stored if lookups will be used (unless the application
     ensures their values do not change).
     """
 
-    def __init__(self, items=None):
+    def __init__(self, items=None, parallel_scan_rows: int = None, scan_workers: int = None,
+                 concurrent: bool = False):
         """ Construct a new IndexedList
 
         :param items: Items to add to list
+        :param parallel_scan_rows: Full list scans of at least this many items are
+            split across a pool of worker processes, or None to always scan in the
+            current process. Items and queries must be picklable to scan in parallel,
+            and are scanned in the current process if they aren't.
+        :param scan_workers: Number of worker processes used for parallel
+            scans, defaulting to the number of CPUs
+        :param concurrent: If True, the list can be searched from several threads while
+            another changes it. Changes wait for searches to finish reading their results,
+            and searches wait for changes to finish (see locks.ReadWriteLock).
         """
 
+        # Lets many threads read the list while one changes it, if concurrent
+        self.concurrent = concurrent
+        self._lock = locks.ReadWriteLock() if concurrent else locks.NO_LOCK
+
+        # Plans for prepared queries, keyed by the shape of the query
+        self._plan_cache = {}
+
+        # Settings for splitting full list scans across worker processes
+        self.parallel_scan_rows = parallel_scan_rows
+        self.scan_workers = scan_workers
+
         # Holds any lookups that have been created for the IndexedList,
         # keyed by lookup name
-        self.lookups = {}
+        self.lookups = LookupCollection()
 
         # Holds the actual items provided
         self._data = []
 
+        # Lookups store stable row ids rather than list positions, so a deletion
+        # doesn't invalidate the positions held by every lookup. _row_ids runs
+        # parallel to _data and is always in ascending order, which lets a row id
+        # be translated back to its current position with a bisect.
+        self._row_ids = []
+        self._next_row_id = 0
+
+        # True while a snapshot shares _data and _row_ids. They're copied
+        # before the list next changes them in place (see _own_rows()).
+        self._rows_shared = False
+
+        # Arrays of transformed values used by vectorized scans, keyed by
+        # transformation signature. Cleared whenever the list changes.
+        self._columns = {}
+
+        # Lookups created with lazy=True that haven't been built yet, and
+        # lookups created with background=True that are being built
+        self._lazy_lookups = set()
+        self._lookup_builds = []
+
+        # Log of queries run, kept while recording (see record_workload())
+        self.workload = None
+
+        # Changes held back from lookups inside batch() (see _Batch)
+        self._batch = None
+
         if items:
             self._add_items(items)
 
@@ -56,405 +145,2431 @@ class IndexedList:
 
         return len(self._data)
 
+    @_writes
     def __setitem__(self, key, value):
 
-        # TODO: Restore lookups to previous state if an error is raised anywhere here
-        # Add the new items to lookups
-        self._add_to_lookups(value, key)
+        if isinstance(key, slice):
+            self._set_slice(key, value)
+            return
+
+        # The replacement item takes over the row id of the item it replaces
+        row_id = self._row_ids[key]
 
-        # Remove the old item from any lookups
+        # Move the row id to the new item's key in any lookups. Lookups are
+        # updated first, as they may raise an error while transforming items.
         previous_item = self._data[key]
-        self._delete_from_lookups(previous_item, key)
+        self._replace_in_lookups(previous_item, value, row_id)
 
         # Add the new item to the position
+        self._own_rows()
         self._data[key] = value
+        self._columns.clear()
 
     def __getitem__(self, item):
 
-        return self._data[item]
+        return self._data[item]
+
+    def __repr__(self):
+
+        return f"IndexedList({self._data})"
+
+    @_writes
+    def __delitem__(self, key):
+
+        if isinstance(key, slice):
+            self._remove_slice(key)
+        else:
+            self._remove_by_index(key)
+
+    @_writes
+    def __iadd__(self, other):
+
+        self._add_items(other)
+
+        return self
+
+    def advise(self, create_above: float = None) -> List[advisor.Recommendation]:
+        """ Recommend lookups that would have sped up the queries recorded so far
+
+        Recommendations are ranked by their score: the estimated cost a lookup would
+        have saved per row it would hold, which is roughly the number of full list
+        scans it would have avoided. See advisor.py for how estimates are made.
+
+            my_list.record_workload()
+            ...
+            my_list.advise(create_above=10)
+
+        :param create_above: If given, create the recommended lookups scoring at least this
+        """
+
+        if self.workload is None:
+            raise ValueError("No workload recorded, call record_workload() first")
+
+        # Only creating lookups needs the write lock, which create_lookups() takes
+        with self._lock.read():
+            recommendations = advisor.advise(self.workload, self)
+
+        if create_above is None:
+            return recommendations
+
+        to_create = [
+            recommendation for recommendation in recommendations
+            if recommendation.score >= create_above
+        ]
+
+        self.create_lookups(
+            {"definition": recommendation.definition, "hashed": recommendation.hashed}
+            for recommendation in to_create
+        )
+
+        for recommendation in to_create:
+            recommendation.created = True
+
+        return recommendations
+
+    @_writes
+    def analyze(self, buckets: int = 100):
+        """ Build histograms on all sorted lookups to improve range search planning
+
+        Without a histogram, the planner assumes every key in a lookup holds the
+        same number of items when estimating the size of a range search. Histograms
+        are not updated as items are added or removed, so re-run analyze() after
+        the distribution of the data changes significantly.
+
+        :param buckets: Number of buckets in each histogram
+        """
+
+        if self._batch is not None:
+            self._apply_batch()
+
+        for lookup in self.lookups.values():
+
+            if lookup.ordered and lookup.ready:
+                lookup.analyze(buckets)
+
+        # Estimates have changed, so plans may have too
+        self._plan_cache.clear()
+
+    @_writes
+    def append(self, object: object):
+        """ Append an object to the list
+
+        :param object: Object to append
+        """
+
+        self._add_items((object,))
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Group changes to the list so lookups are updated once, and undone if an error is raised
+
+        Inside the with block, the list changes as usual, but lookups aren't updated.
+        When the block ends, the net change is applied to each lookup in one grouped
+        pass, so an item added and later removed, or replaced by an item with the
+        same key, costs nothing. If an error is raised, the list and its lookups are
+        restored to how they were before the block. Batches can be nested, in
+        which case the inner ones are part of the outermost batch.
+
+            with my_list.batch():
+                my_list.extend(new_items)
+                del my_list[0]
+
+        Searches inside the block see the changes made so far, as pending changes are
+        applied to lookups before planning. Errors raised by lookup definitions are
+        raised when the changes are applied, rather than by the change itself.
+
+        On a concurrent list, the write lock is held for the whole block, so other
+        threads never see a partly applied batch.
+        """
+
+        with self._lock.write():
+
+            if self._batch is not None:
+                yield self
+                return
+
+            self._batch = _Batch(self._next_row_id)
+
+            try:
+                yield self
+                self._apply_batch()
+            except BaseException:
+                self._roll_back_batch()
+                raise
+
+            self._batch = None
+
+    def count(self, query: ["ItemProxy", patterns.Pattern, object]) -> int:
+        """ Count the items matching a query
+
+        When the query can be answered entirely from lookups, the count is taken
+        from the number of row ids held under each key, and no items are fetched.
+
+            my_list.count(my_list.item > 100)
+
+        For compatibility with list.count(), any value other than a query counts
+        the items equal to that value.
+
+        :param query: ItemProxy or Pattern representing the query, or a value to count
+        """
+
+        if not isinstance(query, (ItemProxy, patterns.Pattern)):
+            query = self.item == query
+
+        self._prepare_lookups(query)
+
+        with self._lock.read():
+            plan = self._plan(query, counting=True)
+            count = plan.count(self)
+
+            if self.workload is not None and self.workload.enabled:
+                self.workload.record(plan, len(self._data), count)
+
+        return count
+
+    def exists(self, query: ["ItemProxy", patterns.Pattern]) -> bool:
+        """ Returns True if any items match a query, without fetching them if possible
+
+        :param query: ItemProxy or Pattern representing the query
+        """
+
+        self._prepare_lookups(query)
+
+        with self._lock.read():
+            return self._plan(query, counting=True).exists(self)
+
+    def first(self, query: ["ItemProxy", patterns.Pattern], order_by: ["ItemProxy", str] = None,
+              descending: bool = False) -> Optional[tuple]:
+        """ Returns the (index, item) tuple of the first match found, or None
+
+        The search stops as soon as a match is found. As with search(), which
+        matching item is found first is not guaranteed unless order_by is given.
+
+        :param query: ItemProxy or Pattern representing the query
+        :param order_by: Key to order results by, or "index" to order them by list index
+        :param descending: If True, return the match with the largest key
+        """
+
+        results = self.search(query, order_by=order_by, descending=descending, limit=1)
+
+        try:
+            return next(results, None)
+        finally:
+
+            # Release the read lock now rather than when the results are garbage collected
+            if self.concurrent:
+                results.close()
+
+    @_writes
+    def build_lookups(self):
+        """ Finish building any lookups created with lazy=True or background=True
+
+        Lazy lookups are built now, and background builds are waited for.
+        """
+
+        self._finish_lookup_builds(wait=True)
+
+        if self._lazy_lookups:
+            self._build_lazy_lookups(self.lookups.values())
+
+            # Anything left was removed from the list's lookups before being built
+            self._lazy_lookups.clear()
+
+    @_writes
+    def clear(self):
+        """ Remove all items from the list, emptying its lookups """
+
+        if self._batch is not None:
+            self._batch.pending.remove(self._row_ids, self._data)
+        else:
+
+            for lookup in self.lookups.values():
+
+                if lookup.ready:
+                    lookup.clear()
+
+            for build in self._lookup_builds:
+                build.changes.append((False, self._row_ids, self._data))
+
+        self._data = []
+        self._row_ids = []
+        self._columns.clear()
+
+    def create_lookup(self, definition: object = None, name: str = None, hashed: bool = False,
+                      lazy: bool = False, background: bool = False):
+        """ Create a lookup for faster searching
+
+        :param definition: Definition of how and which values get stored in the lookup
+            Generally, this will be either None (so create a lookup of all
+            values in the list) or an expression using the .item property,
+            like my_list.item or my_list.item["b"]. Can also be a search query
+            if you want to create filtered lookup (i.e. my_list.item > 100).
+
+        :param name: Name of the index, or None for an autogenerated name
+
+        :param hashed: If True, back the lookup with a plain dict instead of a SortedDict.
+            Adding and removing items is cheaper and keys don't need to be orderable
+            against each other, but the lookup can only serve == and .in_ searches.
+
+        :param lazy: If True, don't build the lookup until a query it could serve is planned
+
+        :param background: If True, build the lookup in a background thread. Searches
+            use scans until the build finishes, and any error raised while building
+            is raised by the next search.
+        """
+
+        self.create_lookups(
+            [{"definition": definition, "name": name, "hashed": hashed}],
+            lazy=lazy,
+            background=background
+        )
+
+    @_writes
+    def create_lookups(self, definitions: Iterable[object], workers: int = None,
+                       lazy: bool = False, background: bool = False):
+        """ Create several lookups at once, walking the list only once to fill them
+
+            my_list.create_lookups([my_list.item["a"], my_list.item["b"]])
+            my_list.create_lookups([{"definition": my_list.item["a"], "hashed": True}])
+
+        :param definitions: Iterable of lookup definitions (as accepted by create_lookup()),
+            or dicts of keyword arguments for create_lookup()
+        :param workers: Number of processes to split transforming the items across, or
+            None to transform them in the current process. Items and definitions must be
+            picklable to use workers.
+        :param lazy: If True, don't build each lookup until a query it could serve is planned
+        :param background: If True, build the lookups in a background thread. Searches
+            use scans until the build finishes.
+        """
+
+        if lazy and background:
+            raise ValueError("A lookup can't be both lazy and built in the background")
+
+        # New lookups are filled from the list as it is now, so bring the others up to date
+        if self._batch is not None:
+            self._apply_batch()
+
+        new_lookups = [
+            self._new_lookup(**definition) if isinstance(definition, dict)
+            else self._new_lookup(definition)
+            for definition in definitions
+        ]
+
+        if lazy:
+            self._lazy_lookups.update(new_lookups)
+        elif background:
+            self._lookup_builds.append(_LookupBuild(new_lookups, self._row_ids, self._data, workers))
+        else:
+
+            # Add all existing data to the lookups
+            self._fill_lookups(
+                lookups=new_lookups,
+                row_ids=self._row_ids,
+                items=self._data,
+                workers=workers
+            )
+
+        # Save the lookups to our dict of eligible lookups. Lookups that are
+        # still to be built are ignored by the planner until they're ready.
+        for new_lookup in new_lookups:
+            new_lookup.ready = not (lazy or background)
+            self.lookups[new_lookup.name] = new_lookup
+
+    @_writes
+    def extend(self, iterable: Iterable):
+        """ Add all items from an iterable to the list
+
+        :param iterable: Iterable of items to add to the list
+        """
+
+        self._add_items(iterable)
+
+    def index(self, value: object, start: int = 0, stop: int = sys.maxsize) -> int:
+        """ Returns the index of the first item equal to a value
+
+        :param value: Value to look for
+        :param start: Index to start looking from
+        :param stop: Index to stop looking before
+        """
+
+        return self._data.index(value, start, stop)
+
+    @_writes
+    def insert(self, index: int, object: object):
+        """ Insert an object before an index
+
+        Lookups only have the new item added. The items around it keep their
+        row ids unless there's no gap left between the row ids either side,
+        in which case a few nearby items are given new ones (see _allocate_row_ids()).
+
+        :param index: Index to insert the object before
+        :param object: Object to insert
+        """
+
+        self._insert_items(index, (object,))
+
+    @_writes
+    def pop(self, index: int = -1) -> object:
+        """ Remove and return the item at an index (the last item by default)
+
+        :param index: Index of the item to remove
+        """
+
+        if not self._data:
+            raise IndexError("pop from empty list")
+
+        item = self._data[index]
+        self._remove_by_index(index)
+
+        return item
+
+    def prepare(self, query: ["ItemProxy", patterns.Pattern], order_by: ["ItemProxy", str] = None,
+                descending: bool = False, limit: int = None, offset: int = 0) -> "PreparedQuery":
+        """ Plan a query once so it can be run many times with different values
+
+        Use Params as placeholders for values that will be supplied each time the
+        query is run:
+
+            by_id = my_list.prepare(my_list.item['id'] == Param('id'))
+            results = by_id.run(id=5)
+
+        Plans are cached on the list by the shape of the query, so preparing the
+        same query again reuses the existing plan. Plans are rebuilt when lookups
+        are added, replaced or removed, after analyze(), and when the list has grown or
+        shrunk significantly. As values aren't known when planning, the plan may
+        not be the best one for every value (see README).
+
+        :param query: ItemProxy or Pattern representing the query, which may contain Params
+        :param order_by: Key to order results by, "index" to order them by list
+            index, or None for no particular order
+        :param descending: If True, order results from largest to smallest
+        :param limit: Maximum number of results to return, or None for no limit
+        :param offset: Number of results to skip
+        """
+
+        return PreparedQuery(
+            data=self,
+            query=query,
+            order_by=order_by,
+            descending=descending,
+            limit=limit,
+            offset=offset
+        )
+
+    def record_workload(self, enabled: bool = True, max_records: int = advisor.DEFAULT_MAX_RECORDS):
+        """ Start or stop recording the searches and counts run against the list
+
+        Recorded queries are held in the workload attribute and used by advise().
+
+        :param enabled: If True, start a new recording, discarding any earlier one.
+            If False, stop recording, keeping the queries recorded so far.
+        :param max_records: Number of queries to keep, after which the oldest are discarded
+        """
+
+        if enabled:
+            self.workload = advisor.Workload(max_records)
+        elif self.workload is not None:
+            self.workload.enabled = False
+
+    @_writes
+    def remove(self, value: object):
+        """ Remove the first item equal to a value
+
+        :param value: Value to remove
+        """
+
+        try:
+            index = self._data.index(value)
+        except ValueError:
+            raise ValueError("IndexedList.remove(x): x not in list") from None
+
+        self._remove_by_index(index)
+
+    @_writes
+    def reverse(self):
+        """ Reverse the order of the items in place
+
+        Lookups have their row ids remapped rather than being rebuilt.
+        """
+
+        self._reorder(range(len(self._data) - 1, -1, -1))
+
+    def search(self, query: ["ItemProxy", patterns.Pattern], order_by: ["ItemProxy", str] = None,
+               descending: bool = False, limit: int = None,
+               offset: int = 0) -> Generator[tuple, None, None]:
+        """ Search for items and return their indices and values
+
+        Construct queries using .item in the following manner (where my_list is your
+        IndexedList object):
+
+            results = my_list.search(my_list.item == 100)
+            results = my_list.search(my_list.item > 100)
+            results = my_list.search(my_list.item.in_(1, 2, 3))
+            results = my_list.search((my_list.item > 100) & (my_list.item < 200))
+
+        Order of items returned is not guaranteed unless order_by is given:
+
+            results = my_list.search(my_list.item > 100, order_by="index")
+            results = my_list.search(my_list.item["a"] > 100, order_by=my_list.item["b"], limit=10)
+
+        :param query: ItemProxy or Pattern representing the query to execute
+        :param order_by: Key to order results by, "index" to order them by list
+            index, or None for no particular order. Items the key can't be
+            taken from are left out.
+        :param descending: If True, order results from largest to smallest
+        :param limit: Maximum number of results to return, or None for no limit
+        :param offset: Number of results to skip
+        """
+
+        self._prepare_lookups(query, order_by)
+
+        def run():
+            plan = self._plan(
+                query=query,
+                order_by=order_by,
+                descending=descending,
+                limit=limit,
+                offset=offset
+            )
+
+            results = plan.execute(self)
+
+            if self.workload is not None and self.workload.enabled:
+                results = self.workload.record_results(plan, len(self._data), results)
+
+            return results
+
+        return self._read_results(run)
+
+    def plan(self, query: ["ItemProxy", patterns.Pattern], order_by: ["ItemProxy", str] = None,
+             descending: bool = False, limit: int = None, offset: int = 0) -> plans.QueryPlan:
+        """ Construct a query plan that dictates how the search will be conducted
+
+        Construct queries using .item in the following manner (where my_list is your
+        IndexedList object):
+
+            results = my_list.search(my_list.item == 100)
+            results = my_list.search(my_list.item > 100)
+            results = my_list.search(my_list.item.in_(1, 2, 3))
+
+        :param query: ItemProxy or Pattern representing the query to plan
+        :param order_by: Key to order results by, "index" to order them by list
+            index, or None for no particular order
+        :param descending: If True, order results from largest to smallest
+        :param limit: Maximum number of results to return, or None for no limit
+        :param offset: Number of results to skip
+        """
+
+        self._prepare_lookups(query, order_by)
+
+        with self._lock.read():
+            return self._plan(
+                query=query,
+                order_by=order_by,
+                descending=descending,
+                limit=limit,
+                offset=offset
+            )
+
+    def snapshot(self) -> "Snapshot":
+        """ Returns a read-only view of the list and its lookups as they are now
+
+        The snapshot can be searched like the list, and keeps returning the same
+        results however the list changes afterwards. Taking one copies nothing:
+        the list of items and the lookups' contents are shared with the snapshot.
+        Instead, the first change made to the list afterwards copies the list of
+        items (not the items themselves) and the mapping of each lookup it
+        changes, which costs about as much as list(my_list) on a large list.
+        Lookups then copy each posting the first time they change it. Taking
+        several snapshots between changes only pays for these copies once.
+        Searching a snapshot never takes the list's lock, so long searches on a
+        concurrent list's snapshot don't hold up changes to it.
+
+            report = my_list.snapshot()
+            results = report.search(report.item > 100)
+
+        Lookups that haven't been built yet (created with lazy=True or background=True)
+        aren't included, and lookups can't be added to the snapshot.
+        """
+
+        with self._lock.read():
+
+            # Only the thread changing the list can see its batch, and already holds the write lock
+            if self._batch is not None:
+                self._apply_batch()
+
+            return Snapshot(self)
+
+    @_writes
+    def sort(self, key: Callable[[object], object] = None, reverse: bool = False):
+        """ Sort the items in place, keeping items that compare equal in their existing order
+
+        Lookups have their row ids remapped rather than being rebuilt.
+
+        :param key: Function returning the value to sort each item by, or None to sort the items themselves
+        :param reverse: If True, sort from largest to smallest
+        """
+
+        data = self._data
+
+        if key is None:
+            sort_key = data.__getitem__
+        else:
+            def sort_key(position):
+                return key(data[position])
+
+        self._reorder(sorted(range(len(data)), key=sort_key, reverse=reverse))
+
+    @staticmethod
+    def _new_lookup(definition: object = None, name: str = None, hashed: bool = False) -> "Lookup":
+        """ Construct an empty lookup from a definition, as described in create_lookup()
+
+        :param definition: Definition of how and which values get stored in the lookup
+        :param name: Name of the index, or None for an autogenerated name
+        :param hashed: If True, back the lookup with a plain dict instead of a SortedDict
+        """
+
+        # If no definition is provided, just add all items in the list to the lookup
+        # exactly how they appear.
+        if definition is None:
+            pattern = patterns.IndexerPattern(TransformationCollection())
+        elif isinstance(definition, ItemProxy):
+            pattern = definition.pattern
+        else:
+            pattern = definition
+
+        lookup_class = HashLookup if hashed else Lookup
+
+        return lookup_class(
+            pattern=pattern,
+            name=name
+        )
+
+    def _remove_by_index(self, index: int):
+        """ Delete an item at a given list index
+
+        :param index: Numeric index of item to delete
+        """
+
+        # Get the current value and row id of item at that index
+        item = self._data[index]
+        row_id = self._row_ids[index]
+
+        # Remove the item and row id from all lookups. Row ids of later
+        # items are untouched, so no other lookup entries need updating.
+        self._delete_from_lookups(item, row_id)
+
+        # Remove the item from the underlying data list
+        self._own_rows()
+        del self._data[index]
+        del self._row_ids[index]
+        self._columns.clear()
+
+    def _remove_slice(self, key: slice):
+        """ Delete the items in a slice, removing them from lookups in one pass
+
+        :param key: Slice of items to delete
+        """
+
+        items = self._data[key]
+
+        if not items:
+            return
+
+        self._update_lookups(removed_row_ids=self._row_ids[key], removed_items=items)
+
+        self._own_rows()
+        del self._data[key]
+        del self._row_ids[key]
+        self._columns.clear()
+
+    def _set_slice(self, key: slice, values: Iterable):
+        """ Replace the items in a slice, updating lookups in one pass
+
+        As with lists, a slice with a step must be replaced by the same number of
+        items, while any other slice can be replaced by any number of items.
+
+        :param key: Slice of items to replace
+        :param values: Iterable of replacement items
+        """
+
+        values = list(values)
+        start, stop, step = key.indices(len(self._data))
+
+        if step == 1:
+            self._replace_range(start, max(start, stop), values)
+            return
+
+        positions = range(start, stop, step)
+
+        if len(values) != len(positions):
+            raise ValueError(
+                f"attempt to assign sequence of size {len(values)} "
+                f"to extended slice of size {len(positions)}"
+            )
+
+        # The replacement items take over the row ids of the items they replace
+        row_ids = self._row_ids[key]
+
+        self._update_lookups(
+            removed_row_ids=row_ids,
+            removed_items=self._data[key],
+            added_row_ids=row_ids,
+            added_items=values
+        )
+
+        self._own_rows()
+        self._data[key] = values
+        self._columns.clear()
+
+    def _replace_range(self, start: int, stop: int, items: list):
+        """ Replace the items between two indices with any number of items
+
+        The new items take over the row ids of the items they replace, and any
+        more are given row ids after them. Lookups are updated in one pass before
+        the list is changed, so an error raised while transforming the new items
+        leaves the list unchanged.
+
+        :param start: Index of the first item to replace
+        :param stop: Index after the last item to replace, at least start
+        :param items: Replacement items
+        """
+
+        at_end = stop >= len(self._data)
+        extra_count = max(len(items) - (stop - start), 0)
+
+        if not extra_count:
+            extra_row_ids = []
+        elif at_end:
+            extra_row_ids = list(range(self._next_row_id, self._next_row_id + extra_count))
+        else:
+            extra_row_ids = self._allocate_row_ids(stop, extra_count)
+
+        # Allocating row ids may have given nearby items new ones, so read these afterwards
+        removed_row_ids = self._row_ids[start:stop]
+        row_ids = (removed_row_ids + extra_row_ids)[:len(items)]
+
+        self._update_lookups(
+            removed_row_ids=removed_row_ids,
+            removed_items=self._data[start:stop],
+            added_row_ids=row_ids,
+            added_items=items
+        )
+
+        if at_end:
+            self._next_row_id += extra_count
+
+        self._own_rows()
+        self._data[start:stop] = items
+        self._row_ids[start:stop] = row_ids
+        self._columns.clear()
+
+    def _insert_items(self, index: int, items: Iterable):
+        """ Insert items before an index, adding them to lookups in one pass
+
+        :param index: Index to insert the items before, following the rules of list.insert()
+        :param items: Iterable of items to insert
+        """
+
+        items = list(items)
+
+        if index < 0:
+            index = max(index + len(self._data), 0)
+
+        if index >= len(self._data):
+            self._add_items(items)
+            return
+
+        if not items:
+            return
+
+        row_ids = self._allocate_row_ids(index, len(items))
+
+        self._update_lookups(added_row_ids=row_ids, added_items=items)
+
+        self._own_rows()
+        self._data[index:index] = items
+        self._row_ids[index:index] = row_ids
+        self._columns.clear()
+
+    def _allocate_row_ids(self, index: int, count: int) -> List[int]:
+        """ Choose row ids for items being inserted before an index
+
+        Row ids must stay in ascending list order, so the new row ids are spread
+        evenly across the gap between the row ids of the items either side.
+        Row ids left by deleted items usually leave a gap. When it's too small,
+        the row ids of nearby items are spread out to make room (see _relabel_rows()).
+
+        :param index: Index the items are being inserted before, which must be in the list
+        :param count: Number of row ids needed
+        """
+
+        high = self._row_ids[index]
+
+        # Row ids can go below zero, so there's always room at the start
+        if index == 0:
+            return list(range(high - count, high))
+
+        low = self._row_ids[index - 1]
+
+        if high - low - 1 < count:
+            return self._relabel_rows(index, count)
+
+        step = (high - low) / (count + 1)
+
+        return [low + int(step * position) for position in range(1, count + 1)]
+
+    def _relabel_rows(self, index: int, count: int) -> List[int]:
+        """ Give new row ids to the items around an index, leaving room for items inserted there
+
+        This is the list labelling scheme used for order maintenance. Windows of
+        items around the index are tried in doubling sizes, until one has enough
+        row ids available between its neighbours, or reaches an end of the list
+        where row ids are unlimited. The row ids of the items in it are spread
+        across those available. Larger windows must be emptier to qualify, which
+        leaves room in the smaller windows inside them, so repeated inserts in the
+        same place don't keep relabelling large parts of the list.
+
+        Only the items in the window are updated in lookups, by moving their row ids
+        between postings under their existing keys. Lookups being built in the
+        background have the items removed and added again once they're built.
+
+        :param index: Index the items are being inserted before, which must be in the list
+        :param count: Number of row ids needed for the inserted items
+        :returns: Row ids for the inserted items
+        """
+
+        self._own_rows()
+
+        row_ids = self._row_ids
+        size = len(row_ids)
+        levels = size.bit_length()
+        level = 0
+
+        while True:
+            level += 1
+            start = (index >> level) << level
+            end = min(start + (1 << level), size)
+
+            if start == 0 or end == size:
+                break
+
+            # The allowed density falls from 1 for the smallest windows
+            # to 1 / ROW_ID_SPACING for the whole list
+            available = row_ids[end] - row_ids[start - 1] - 1
+
+            if end - start + count <= available * (1 - (1 - 1 / ROW_ID_SPACING) * level / levels):
+                break
+
+        window_size = end - start
+
+        if start > 0 and end < size:
+            low = row_ids[start - 1]
+            available = row_ids[end] - low - 1
+        elif end < size:
+            available = (window_size + count) * ROW_ID_SPACING
+            low = row_ids[end] - available - 1
+        else:
+            available = (window_size + count) * ROW_ID_SPACING
+            low = row_ids[start - 1] if start > 0 else row_ids[0] - 1
+            self._next_row_id = max(self._next_row_id, low + available + 1)
+
+        # Half the spare row ids are left either side of the inserted items, where
+        # further inserts are most likely, and the rest spread between the window's items
+        reserve = (available - window_size - count) // 2
+        offset = index - start
+        inserted_slot = offset + reserve // 2
+
+        slots = (
+            list(range(0, offset)) +
+            list(range(inserted_slot + count + reserve - reserve // 2, window_size + count + reserve))
+        )
+        step = available / (window_size + count + reserve)
+
+        inserted = [low + 1 + int(step * slot) for slot in range(inserted_slot, inserted_slot + count)]
+        window = [low + 1 + int(step * slot) for slot in slots]
+
+        moved = {
+            row_id: new_row_id
+            for row_id, new_row_id in zip(row_ids[start:end], window)
+            if row_id != new_row_id
+        }
+
+        lookups = [lookup for lookup in self.lookups.values() if lookup.ready]
+
+        moved_items = [
+            item for row_id, item in zip(row_ids[start:end], self._data[start:end])
+            if row_id in moved
+        ]
+
+        if self._batch is not None:
+            self._batch.pending.remove(moved.keys(), moved_items)
+            self._batch.pending.add(moved.values(), moved_items)
+        else:
+
+            if moved and lookups:
+                groups = _group_items(lookups, list(moved), moved_items)
+
+                for lookup, grouped in zip(lookups, groups):
+                    lookup.move_grouped(grouped, moved)
+
+            # Background builds hold the old row ids, so move the items once they're built
+            for build in self._lookup_builds:
+                build.changes.append((False, list(moved), moved_items))
+                build.changes.append((True, list(moved.values()), moved_items))
+
+        row_ids[start:end] = window
+
+        return inserted
+
+    def _reorder(self, positions: Iterable[int]):
+        """ Rearrange the items in place, remapping row ids in lookups to match
+
+        Row ids stay in the same ascending order along the list, so an item moving
+        to a new position takes the row id previously held at that position.
+
+        :param positions: Current positions of the items, in their new order
+        """
+
+        positions = list(positions)
+
+        row_ids = self._row_ids
+        new_row_ids = {
+            row_ids[position]: row_id
+            for position, row_id in zip(positions, row_ids)
+            if row_ids[position] != row_id
+        }
+
+        if not new_row_ids:
+            return
+
+        self._own_rows()
+        data = self._data
+
+        # Background builds hold the old row ids, so they (like batches) have the
+        # moved items removed and added again under their new row ids
+        if self._batch is not None or self._lookup_builds:
+            moved_items = [
+                data[position]
+                for position, row_id in zip(positions, row_ids)
+                if row_ids[position] != row_id
+            ]
+
+        if self._batch is not None:
+            self._batch.pending.remove(new_row_ids.keys(), moved_items)
+            self._batch.pending.add(new_row_ids.values(), moved_items)
+        else:
+
+            for lookup in self.lookups.values():
+
+                if lookup.ready:
+                    lookup.remap_row_ids(new_row_ids)
+
+            for build in self._lookup_builds:
+                build.changes.append((False, list(new_row_ids), moved_items))
+                build.changes.append((True, list(new_row_ids.values()), moved_items))
+
+        data[:] = [data[position] for position in positions]
+        self._columns.clear()
+
+    def _own_rows(self):
+        """ Copy the items and row ids before changing them in place, if a snapshot shares them """
+
+        if self._rows_shared:
+            self._data = list(self._data)
+            self._row_ids = list(self._row_ids)
+            self._rows_shared = False
+
+    def _position_of(self, row_id: int) -> int:
+        """ Translate a row id stored in a lookup into the item's current list index
+
+        :param row_id: Row id of an item currently stored in the list
+        """
+
+        return bisect.bisect_left(self._row_ids, row_id)
+
+    def _delete_from_lookups(self, item: object, row_id: int):
+        """ Remove an item from all lookups
+
+        :param item: Value of item to remove
+        :param row_id: Row id of value to remove
+        """
+
+        if self._batch is not None:
+            self._batch.pending.remove((row_id,), (item,))
+            return
+
+        # Transform the item for every lookup before changing any, so that an
+        # error raised by a transformation leaves all the lookups unchanged
+        keys = [
+            (lookup, lookup.pattern.match_and_transform(item))
+            for lookup in self.lookups.values()
+            if lookup.ready
+        ]
+
+        for lookup, key in keys:
+            lookup.remove_key(key, row_id)
+
+        for build in self._lookup_builds:
+            build.changes.append((False, (row_id,), (item,)))
+
+    def _add_items(self, items: Iterable):
+        """ Add an iterable of items to the list
+
+        :param items: Iterable of items to add to the list
+        """
+
+        # Materialize the items, as they're iterated over more than once
+        items = list(items)
+
+        # Get the row ids of the new items
+        row_ids = range(self._next_row_id, self._next_row_id + len(items))
+
+        # Bulk load the new items into all attached lookups, before adding
+        # them to the list in case an error is raised while transforming them
+        self._update_lookups(added_row_ids=row_ids, added_items=items)
+
+        # Add the items to the list
+        self._next_row_id += len(items)
+        self._own_rows()
+        self._data.extend(items)
+        self._row_ids.extend(row_ids)
+        self._columns.clear()
+
+    def _update_lookups(self, removed_row_ids: Iterable[int] = (), removed_items: Iterable = (),
+                        added_row_ids: Iterable[int] = (), added_items: Iterable = ()):
+        """ Remove and add items in all lookups, or hold the change back inside batch()
+
+        :param removed_row_ids: Row ids of the items being removed
+        :param removed_items: Items being removed, parallel to removed_row_ids
+        :param added_row_ids: Row ids of the items being added
+        :param added_items: Items being added, parallel to added_row_ids
+        """
+
+        if self._batch is not None:
+            self._batch.pending.remove(removed_row_ids, removed_items)
+            self._batch.pending.add(added_row_ids, added_items)
+            return
+
+        self._apply_lookup_changes(removed_row_ids, removed_items, added_row_ids, added_items)
+
+    def _apply_lookup_changes(self, removed_row_ids: Iterable[int], removed_items: Iterable,
+                              added_row_ids: Iterable[int], added_items: Iterable):
+        """ Remove and add items in all lookups, walking each set of items only once
+
+        Every item is transformed before any lookup is changed, so an error raised
+        by a transformation leaves the lookups unchanged. A row id removed and
+        added under the same key, as when an item is replaced by one with the
+        same key, is left where it is.
+
+        :param removed_row_ids: Row ids of the items being removed
+        :param removed_items: Items being removed, parallel to removed_row_ids
+        :param added_row_ids: Row ids of the items being added
+        :param added_items: Items being added, parallel to added_row_ids
+        """
+
+        removed_row_ids, removed_items = list(removed_row_ids), list(removed_items)
+        added_row_ids, added_items = list(added_row_ids), list(added_items)
+
+        lookups = [lookup for lookup in self.lookups.values() if lookup.ready]
+
+        if lookups:
+            removed_groups = [{} for _ in lookups]
+            added_groups = [{} for _ in lookups]
+
+            if removed_row_ids:
+                removed_groups = _group_items(lookups, removed_row_ids, removed_items)
+
+            if added_row_ids:
+                added_groups = _group_items(lookups, added_row_ids, added_items)
+
+            for lookup, removed, added in zip(lookups, removed_groups, added_groups):
+                _cancel_unmoved(removed, added)
+
+                lookup.remove_grouped(removed)
+                lookup.add_grouped(added)
+
+        for build in self._lookup_builds:
+
+            if removed_row_ids:
+                build.changes.append((False, removed_row_ids, removed_items))
+
+            if added_row_ids:
+                build.changes.append((True, added_row_ids, added_items))
+
+    def _apply_batch(self):
+        """ Apply the changes held back inside batch() to lookups """
+
+        batch = self._batch
+        changes = batch.pending
+
+        if not changes:
+            return
+
+        self._apply_lookup_changes(
+            changes.removed.keys(),
+            changes.removed.values(),
+            changes.added.keys(),
+            changes.added.values()
+        )
+
+        batch.applied.update(changes)
+        batch.pending = _Changes()
+
+    def _roll_back_batch(self):
+        """ Restore the list and its lookups to how they were before batch() """
+
+        batch = self._batch
+        self._batch = None
+
+        changes = _Changes()
+        changes.update(batch.applied)
+        changes.update(batch.pending)
+
+        # Rows are kept in row id order, so the list can be rebuilt by taking out
+        # the rows added and putting back the rows removed
+        rows = [
+            (row_id, item)
+            for row_id, item in zip(self._row_ids, self._data)
+            if row_id not in changes.added
+        ]
+        rows.extend(changes.removed.items())
+        rows.sort(key=operator.itemgetter(0))
+
+        self._row_ids = [row_id for row_id, _ in rows]
+        self._data = [item for _, item in rows]
+        self._next_row_id = batch.next_row_id
+        self._columns.clear()
+
+        # Lookups only hold the changes applied so far, so only those are undone
+        self._apply_lookup_changes(
+            batch.applied.added.keys(),
+            batch.applied.added.values(),
+            batch.applied.removed.keys(),
+            batch.applied.removed.values()
+        )
+
+    def _replace_in_lookups(self, previous_item: object, item: object, row_id: int):
+        """ Replace an item in all lookups with another that takes over its row id
+
+        :param previous_item: Value of item being replaced
+        :param item: Value of replacement item
+        :param row_id: Row id of both items
+        """
+
+        if self._batch is not None:
+            self._batch.pending.remove((row_id,), (previous_item,))
+            self._batch.pending.add((row_id,), (item,))
+            return
+
+        # Transform the items for every lookup before changing any, so that an
+        # error raised by a transformation leaves all the lookups unchanged
+        keys = [
+            (
+                lookup,
+                lookup.pattern.match_and_transform(previous_item),
+                lookup.pattern.match_and_transform(item)
+            )
+            for lookup in self.lookups.values()
+            if lookup.ready
+        ]
+
+        for lookup, previous_key, key in keys:
+            lookup.replace_key(previous_key, key, row_id)
+
+        for build in self._lookup_builds:
+            build.changes.append((False, (row_id,), (previous_item,)))
+            build.changes.append((True, (row_id,), (item,)))
+
+    def _fill_lookups(self, lookups: Iterable["Lookup"], row_ids: List[int], items: list,
+                      workers: int = None):
+        """ Add items to several lookups, walking the items only once
+
+        :param lookups: Iterable of lookups to add items to
+        :param row_ids: Row ids of the items being added
+        :param items: Items being added, parallel to row_ids
+        :param workers: Number of processes to transform items across, or None
+            to transform them in the current process
+        """
+
+        lookups = list(lookups)
+        groups = _group_items(lookups, row_ids, items, workers)
+
+        for lookup, grouped in zip(lookups, groups):
+            lookup.add_grouped(grouped)
+
+    def _empty_lookups(self, lookups: Iterable["Lookup"], row_ids: List[int], items: list):
+        """ Remove items from several lookups, walking the items only once
+
+        :param lookups: Iterable of lookups to remove items from
+        :param row_ids: Row ids of the items being removed
+        :param items: Items being removed, parallel to row_ids
+        """
+
+        lookups = list(lookups)
+        groups = _group_items(lookups, row_ids, items)
+
+        for lookup, grouped in zip(lookups, groups):
+            lookup.remove_grouped(grouped)
+
+    def _build_lazy_lookups(self, lookups: Iterable["Lookup"]):
+        """ Fill lookups created with lazy=True from the items currently in the list
+
+        :param lookups: Iterable of lookups, any of which that are lazy and unbuilt will be built
+        """
+
+        lookups = [lookup for lookup in lookups if lookup in self._lazy_lookups]
+
+        if not lookups:
+            return
+
+        # The lookups are filled from the list as it is now, so bring the others up to date
+        if self._batch is not None:
+            self._apply_batch()
+
+        self._fill_lookups(
+            lookups=lookups,
+            row_ids=self._row_ids,
+            items=self._data
+        )
+
+        for lookup in lookups:
+            self._lazy_lookups.discard(lookup)
+            lookup.ready = True
+
+        # Plans made before the lookups were ready would only scan
+        self._plan_cache.clear()
+
+    def _finish_lookup_builds(self, wait: bool = False):
+        """ Install the results of background lookup builds that have finished
+
+        Changes made to the list since a build started are replayed against its
+        lookups before they're made available to the planner.
+
+        :param wait: If True, wait for builds that are still running
+        """
+
+        for build in list(self._lookup_builds):
+
+            if not (wait or build.future.done()):
+                continue
+
+            self._lookup_builds.remove(build)
+
+            try:
+                groups = build.future.result()
+
+                for lookup, grouped in zip(build.lookups, groups):
+                    lookup.add_grouped(grouped)
+
+                for added, row_ids, items in build.changes:
+
+                    if added:
+                        self._fill_lookups(build.lookups, row_ids, items)
+                    else:
+                        self._empty_lookups(build.lookups, row_ids, items)
+
+            except Exception:
+
+                # The lookups can't be used, so remove them as if they'd failed to be created
+                for lookup in build.lookups:
+
+                    if self.lookups.get(lookup.name) is lookup:
+                        del self.lookups[lookup.name]
+
+                raise
+
+            for lookup in build.lookups:
+                lookup.ready = True
+
+            self._plan_cache.clear()
+
+    def _prepare_lookups(self, query: ["ItemProxy", patterns.Pattern],
+                         order_by: ["ItemProxy", str] = None):
+        """ Bring lookups up to date before planning a query
+
+        Applies changes held back by a batch, installs lookups finished in the
+        background, and builds any lazy lookups the planner could use for the query.
+        On a concurrent list, the write lock is only taken if there's something to
+        do. A thread that's reading the list can't take it, so its queries are
+        planned with the lookups that are ready.
+
+        :param query: ItemProxy or Pattern representing the query to be planned
+        :param order_by: Key results will be ordered by, "index", or None
+        """
+
+        # Usually there's nothing to do. On a concurrent list these may change at any
+        # moment, but a change made after the check is no different from one made
+        # after the query is planned.
+        if self._batch is None and not self._lookup_builds and not self._lazy_lookups:
+            return
+
+        if self._lock.only_reading():
+            return
+
+        with self._lock.read():
+            to_build = self._lazy_lookups and plans.lookups_to_build(query, self.lookups, order_by)
+
+            if not (to_build or self._batch is not None
+                    or any(build.future.done() for build in self._lookup_builds)):
+                return
+
+        with self._lock.write():
+
+            if self._batch is not None:
+                self._apply_batch()
+
+            if self._lookup_builds:
+                self._finish_lookup_builds()
+
+            if to_build:
+                self._build_lazy_lookups(to_build)
+
+    def _plan(self, query: ["ItemProxy", patterns.Pattern], order_by: ["ItemProxy", str] = None,
+              descending: bool = False, limit: int = None, offset: int = 0,
+              counting: bool = False) -> plans.QueryPlan:
+        """ Construct a query plan from the lookups as they are, as described in plan()
+
+        :param query: ItemProxy or Pattern representing the query to plan
+        :param order_by: Key to order results by, "index" to order them by list
+            index, or None for no particular order
+        :param descending: If True, order results from largest to smallest
+        :param limit: Maximum number of results to return, or None for no limit
+        :param offset: Number of results to skip
+        :param counting: If True, the plan is for count() or exists(). These read
+            only the sizes of postings when lookups answer the whole query, which
+            is cheaper than a scan however many items match, so a plan answered
+            by lookups is preferred to the cheapest plan for fetching the items.
+        """
+
+        if counting and self.lookups:
+
+            # Without a row count, the planner uses lookups wherever it can
+            plan = plans.create(
+                query=query,
+                lookups=self.lookups,
+                order_by=order_by,
+                descending=descending,
+                limit=limit,
+                offset=offset
+            )
+
+            if plan.answered_by_lookups:
+                return plan
+
+        # Only split scans across processes once the list is large enough
+        # for the speedup to outweigh the cost of starting them
+        scan_workers = None
+
+        if self.parallel_scan_rows is not None and len(self._data) >= self.parallel_scan_rows:
+            scan_workers = self.scan_workers or parallel.default_workers()
+
+        return plans.create(
+            query=query,
+            lookups=self.lookups,
+            row_count=len(self._data),
+            order_by=order_by,
+            descending=descending,
+            limit=limit,
+            offset=offset,
+            scan_workers=scan_workers
+        )
+
+    def _read_results(self, run: Callable[[], Iterable[tuple]]) -> Iterable[tuple]:
+        """ Run a search under the read lock, holding it until the results have been read
+
+        On lists that aren't concurrent, the results are returned as they are.
+
+        :param run: Function planning and executing the search, returning its results
+        """
+
+        if not self.concurrent:
+            return run()
+
+        thread_id = self._lock.acquire_read()
+
+        try:
+            results = run()
+        except BaseException:
+            self._lock.release_read(thread_id)
+            raise
+
+        return locks.ReadLockedResults(results, self._lock, thread_id)
+
+    @property
+    def item(self) -> "ItemProxy":
+        """ Returns an ItemProxy suitable for constructing queries and lookup definitions """
+
+        return ItemProxy()
+
+
+class Lookup:
+    """ A lookup for quickly finding the index of items in an IndexedList
+
+    Lookups map keys to row ids rather than list indices. A row id
+    is assigned to each item when it's added to an IndexedList and stays
+    the same for as long as the item remains there, so removing an item only
+    touches that item's own entry in each lookup. The row ids under each key
+    are held in a compact posting (see postings.py) rather than a set.
+    """
+
+    # Whether keys in the mapping are kept in sorted order, allowing range seeks
+    ordered = True
+
+    def __init__(self, pattern: patterns.Pattern, name: str = None):
+        """ Construct a new Lookup
+
+        :param pattern: Pattern that dictates items in the lookup
+        :param name: Optional name, defaults to a UUID
+        """
+
+        # Mapping utilizes a SortedDict to allow for range queries (>, <, etc)
+        self.mapping = SortedDict()
+        self.pattern = pattern
+        self.name = name or str(uuid.uuid4())
+
+        # False while the lookup is waiting to be built (see create_lookup()),
+        # during which time the planner ignores it
+        self.ready = True
+
+        # Statistics used by the query planner to estimate result sizes.
+        # row_count is the number of row ids held across all keys. The
+        # histogram is only built on request (see analyze()).
+        self.row_count = 0
+        self.histogram = None
+        self._histogram_depth = 0
+        self._histogram_row_count = 0
+
+        # True while the mapping is shared with a snapshot (see snapshot()). Once it's
+        # been copied, the postings in it are still shared, so the keys whose postings
+        # have been copied since are held in _copied_keys until the next snapshot.
+        self._shared = False
+        self._copied_keys = None
+
+    def __str__(self):
+
+        return str(self.pattern)
+
+    def add_item(self, item: object, row_id: int):
+        """ Store an item and its row id in the lookup
+
+        :param item: Original item stored in an IndexedList
+        :param row_id: Row id of item in associated IndexedList
+        """
+
+        key = self.pattern.match_and_transform(item)
+
+        # Don't store the item if the lookup's pattern does not match it
+        # For example, if the pattern is item > 10, don't store 9
+        if key is not patterns.NO_MATCH:
+            self._add_index(key, row_id)
+
+    def add_items(self, rows: Iterable[Tuple[int, object]]):
+        """ Store many items and their row ids in the lookup at once
+
+        :param rows: Iterable of (row id, item) tuples
+        """
+
+        grouped, = patterns.group_matches((self.pattern,), rows)
+
+        self.add_grouped(grouped)
+
+    def add_grouped(self, grouped: dict):
+        """ Store row ids that have already been grouped by key
+
+        All items are transformed and grouped by key before the mapping is touched,
+        so the SortedDict only has to place each distinct new key once (and sorts
+        them in a single pass when the lookup is empty) rather than inserting
+        once per item.
+
+        :param grouped: Dict mapping keys to lists of row ids of items matching
+            the lookup's pattern, as built by patterns.group_matches()
+        """
+
+        self.row_count += sum(len(row_ids) for row_ids in grouped.values())
+
+        if self._shared:
+            self._unshare()
+
+        mapping = self.mapping
+        new_keys = {}
+
+        # Merge into the postings of keys already in the mapping, and collect
+        # the remaining keys so they can be added to the mapping together
+        for key, row_ids in grouped.items():
+            existing_posting = mapping.get(key) if self._copied_keys is None else self._copy_posting(key)
+
+            if existing_posting is None:
+                new_keys[key] = postings.from_row_ids(row_ids)
+            else:
+                mapping[key] = postings.merge(existing_posting, row_ids)
+
+        mapping.update(new_keys)
+
+    def remove_item(self, item: object, row_id: int):
+        """ Remove an item and its row id from the lookup
+
+        :param item: Original item stored in an IndexedList
+        :param row_id: Row id of item in associated IndexedList
+        """
+
+        key = self.pattern.match_and_transform(item)
+
+        if key is not patterns.NO_MATCH:
+            self._remove_index(key, row_id)
+
+    def remove_key(self, key: object, row_id: int):
+        """ Remove a row id from the lookup, given the key its item was transformed into
+
+        :param key: Key of the item, or NO_MATCH if it didn't match the lookup's pattern
+        :param row_id: Row id of item in associated IndexedList
+        """
+
+        if key is not patterns.NO_MATCH:
+            self._remove_index(key, row_id)
+
+    def replace_key(self, previous_key: object, key: object, row_id: int):
+        """ Move a row id to a new key, when its item is replaced by another
+
+        The mapping is left untouched when both items gave the same key (or neither
+        matched the lookup's pattern), which is common when an update changes a
+        field the lookup isn't on.
+
+        :param previous_key: Key of the item being replaced, or NO_MATCH
+        :param key: Key of the replacement item, or NO_MATCH
+        :param row_id: Row id of both items in associated IndexedList
+        """
+
+        if previous_key is key or previous_key == key:
+            return
+
+        self.remove_key(previous_key, row_id)
+
+        if key is not patterns.NO_MATCH:
+            self._add_index(key, row_id)
+
+    def remove_grouped(self, grouped: dict):
+        """ Remove row ids that have already been grouped by key
+
+        :param grouped: Dict mapping keys to lists of row ids of items matching
+            the lookup's pattern, as built by patterns.group_matches()
+        """
+
+        self.row_count -= sum(len(row_ids) for row_ids in grouped.values())
+
+        if self._shared:
+            self._unshare()
+
+        mapping = self.mapping
+
+        for key, row_ids in grouped.items():
+            posting = mapping[key] if self._copied_keys is None else self._copy_posting(key)
+            posting = postings.subtract(posting, row_ids)
+
+            if posting is None:
+                del mapping[key]
+            else:
+                mapping[key] = posting
+
+    def clear(self):
+        """ Remove every row id from the lookup """
+
+        if self._shared:
+
+            # Leave the mapping to the snapshot sharing it
+            self.mapping = self.mapping.__class__()
+            self._shared = False
+        else:
+            self.mapping.clear()
+
+        self._copied_keys = None
+        self.row_count = 0
+
+    def move_grouped(self, grouped: dict, new_row_ids: dict):
+        """ Give new row ids to items already in the lookup, which have been grouped by key
+
+        :param grouped: Dict mapping keys to lists of the current row ids of items under
+            that key, as built by patterns.group_matches()
+        :param new_row_ids: Dict mapping each current row id to its replacement
+        """
+
+        if self._shared:
+            self._unshare()
+
+        mapping = self.mapping
+
+        for key, row_ids in grouped.items():
+            posting = mapping[key] if self._copied_keys is None else self._copy_posting(key)
+            posting = postings.subtract(posting, row_ids)
+            mapping[key] = postings.merge(posting, [new_row_ids[row_id] for row_id in row_ids])
+
+    def remap_row_ids(self, new_row_ids: dict):
+        """ Replace every row id with a new one, without transforming any items
+
+        Used when the items of an IndexedList are reordered, as row ids follow list order.
+
+        :param new_row_ids: Dict mapping row ids to their replacements. Row ids not in it are kept.
+        """
+
+        if self._shared:
+            self._unshare()
+
+        mapping = self.mapping
+
+        for key, posting in list(mapping.items()):
+            mapping[key] = postings.remap(posting, new_row_ids)
+
+        # Every posting has been replaced, so none are shared any more
+        self._copied_keys = None
+
+    def snapshot(self) -> "Lookup":
+        """ Returns a read-only copy of the lookup as it is now
+
+        The copy shares the lookup's mapping and postings. Rather than copying them
+        now, the lookup copies its mapping the next time it changes, and each
+        posting the first time it changes that posting.
+        """
+
+        snapshot = copy.copy(self)
+        self._shared = True
+
+        return snapshot
+
+    def handles(self, pattern: patterns.SearchPattern) -> bool:
+        """ Determine if lookup can provide data for a particular search pattern
+
+        :param pattern: Pattern to test for compatibility
+        """
+
+        return self.pattern.handles(pattern)
+
+    def estimate_rows(self, comparator: cmps.Comparator) -> float:
+        """ Estimate how many items in the lookup match a comparator
+
+        Searches for discrete values (== and .in_) are counted exactly. Range
+        searches are estimated from the histogram if one has been built, otherwise
+        by assuming every key holds the same number of items.
+
+        :param comparator: Comparator used by a search the lookup handles
+        """
+
+        if comparator.params:
+            return self._estimate_rows_for_params(comparator)
+
+        if not isinstance(comparator, cmps.RangeComparator):
+            return sum(
+                postings.size(self.mapping[key])
+                for key in comparator.values
+                if key in self.mapping
+            )
+
+        if self.histogram is not None:
+            return self._estimate_range_from_histogram(comparator)
+
+        key_count = len(self.mapping)
+
+        if not key_count:
+            return 0
+
+        start, end = self._range_positions(self.mapping, comparator)
+
+        return self.row_count * max(end - start, 0) / key_count
+
+    def _estimate_rows_for_params(self, comparator: cmps.Comparator) -> float:
+        """ Estimate how many items match a comparator whose values aren't known yet
+
+        Used when planning prepared queries. Each discrete value is assumed to
+        match an average key, and ranges a fixed fraction of the lookup.
+
+        :param comparator: Comparator containing Params
+        """
+
+        if isinstance(comparator, cmps.RangeComparator):
+            return self.row_count * UNKNOWN_RANGE_FRACTION
+
+        key_count = len(self.mapping)
+
+        if not key_count:
+            return 0
+
+        return len(comparator.values) * self.row_count / key_count
+
+    def analyze(self, buckets: int = 100):
+        """ Build an equi-depth histogram of the lookup's keys
+
+        The histogram is a sorted list of keys chosen so that roughly the same
+        number of items falls between each pair of neighbouring keys, which lets
+        range searches be estimated accurately even when keys are skewed.
+
+        :param buckets: Number of buckets in the histogram
+        """
+
+        depth = max(self.row_count / buckets, 1)
+
+        histogram = []
+        rows_seen = 0
+        next_boundary = 0
+
+        for key, posting in self.mapping.items():
+            rows_seen += postings.size(posting)
+
+            # A key holding many items may fill several buckets at once
+            while rows_seen > next_boundary:
+                histogram.append(key)
+                next_boundary += depth
+
+        self.histogram = histogram
+        self._histogram_depth = depth
+        self._histogram_row_count = self.row_count
+
+    def _estimate_range_from_histogram(self, comparator: cmps.RangeComparator) -> float:
+        """ Estimate how many items fall within a range using the histogram
+
+        :param comparator: RangeComparator used by a search the lookup handles
+        """
+
+        if not self._histogram_row_count:
+            return 0
+
+        start, end = self._range_positions(self.histogram, comparator)
+
+        estimate = max(end - start, 0) * self._histogram_depth
+
+        # Scale the estimate by how much the lookup has changed since analyze()
+        return estimate * self.row_count / self._histogram_row_count
+
+    @staticmethod
+    def _range_positions(keys: [SortedDict, list], comparator: cmps.RangeComparator) -> tuple:
+        """ Find the start and end positions of a range within sorted keys
+
+        :param keys: SortedDict or sorted list of keys
+        :param comparator: RangeComparator describing the range
+        """
+
+        if isinstance(keys, SortedDict):
+            bisect_left, bisect_right = keys.bisect_left, keys.bisect_right
+        else:
+            bisect_left = functools.partial(bisect.bisect_left, keys)
+            bisect_right = functools.partial(bisect.bisect_right, keys)
+
+        if comparator.start_key is None:
+            start = 0
+        elif comparator.start_inclusive:
+            start = bisect_left(comparator.start_key)
+        else:
+            start = bisect_right(comparator.start_key)
+
+        if comparator.end_key is None:
+            end = len(keys)
+        elif comparator.end_inclusive:
+            end = bisect_right(comparator.end_key)
+        else:
+            end = bisect_left(comparator.end_key)
+
+        return start, end
+
+    def _add_index(self, key: object, row_id: int):
+        """ Add a row id to the posting in the Lookup mapping at key
+
+        When an item is added to an IndexedList with lookups, the item
+        is passed through pattern transformations to generate a key.
+        For example, a lookup with the definition of item['a'] would look
+        at the 'a' key of whatever item was passed in in order to generate
+        a lookup key for that item.
+
+        :param key: Key (transformed item) where row id should be added
+        :param row_id: Row id linking to an item in an IndexedList
+        """
+
+        if self._shared:
+            self._unshare()
+
+        posting = self.mapping.get(key) if self._copied_keys is None else self._copy_posting(key)
+
+        # Creates the key if it does not already exist
+        self.mapping[key] = postings.add(posting, row_id)
+        self.row_count += 1
+
+    def _remove_index(self, key: object, row_id: int):
+        """ Remove a row id from the posting in the Lookup mapping at key
+
+        :param key: Key (transformed item) where row id should be removed
+        :param row_id: Row id linking to an item in an IndexedList
+        """
+
+        if self._shared:
+            self._unshare()
+
+        posting = self.mapping[key] if self._copied_keys is None else self._copy_posting(key)
+        posting = postings.remove(posting, row_id)
+        self.row_count -= 1
+
+        # Remove the key from the mapping if no row ids remain associated with it
+        if posting is None:
+            del self.mapping[key]
+        else:
+            self.mapping[key] = posting
+
+    def _unshare(self):
+        """ Copy the mapping shared with a snapshot, so it can be changed """
+
+        self.mapping = self.mapping.copy()
+        self._shared = False
+
+        # The postings are still shared until they're copied
+        self._copied_keys = set()
+
+    def _copy_posting(self, key: object) -> Optional[postings.Posting]:
+        """ Returns the posting at a key, copying it first if it's shared with a snapshot
+
+        Only called once the mapping has been unshared, while _copied_keys is a set.
+
+        :param key: Key whose posting is about to be changed
+        """
+
+        posting = self.mapping.get(key)
+
+        if key not in self._copied_keys:
+            self._copied_keys.add(key)
+
+            if posting is not None:
+                posting = postings.copy(posting)
+                self.mapping[key] = posting
+
+        return posting
+
+
+class HashLookup(Lookup):
+    """ A lookup backed by a plain dict, usable for == and .in_ searches only
+
+    Skipping sorted key maintenance makes adding and removing items cheaper,
+    and allows indexing keys that can't be ordered against each other (such
+    as a mix of strings and numbers). Range searches (>, <, etc) can't be
+    served by a HashLookup.
+    """
+
+    ordered = False
+
+    def __init__(self, pattern: patterns.Pattern, name: str = None):
+        """ Construct a new HashLookup
+
+        :param pattern: Pattern that dictates items in the lookup
+        :param name: Optional name, defaults to a UUID
+        """
+
+        super().__init__(
+            pattern=pattern,
+            name=name
+        )
+
+        self.mapping = {}
+
+
+class Indexable:
+    """ Decorator that allows querying and indexing functions applied to an IndexedList
+
+    Consider the following example:
+
+        @Indexable
+        def double_it(x):
+            return x * 2
+
+    Using the @Indexable decorator allows us to create lookups on the results of
+    that function applied to every item in an IndexedList:
+
+        my_list.create_lookup(double_it(my_list.item))
+
+    Once such a lookup is created, the IndexedList will be able to use that lookup
+    should the function be called again in the future during a search:
+
+        my_list.search(double_it(my_list.item))
+
+    Both of these approaches would fail without the decorator, which treats an ItemProxy
+    input (mylist.item) differently than other input by using it to build a search
+    pattern, rather than evaluating it immediately.
+    """
+
+    def __init__(self, func: Callable[[object], object]):
+        """ Construct a new Indexable wrapper
+
+        :param func: Function that is being wrapped
+        """
+
+        self.func = func
+
+        # Indicates whether this function was defined by an end user
+        # to help disambiguate user-defined functions from ones included
+        # in this package
+        self.user_defined = True
+
+        # Any variables referenced by the function that are not
+        # provided as arguments to the function
+        self.embedded_args = None
+
+        # Used for generating a string description of the wrapped function
+        self.description_prefix = f"{func.__name__}("
+        self.description_suffix = ")"
+
+    def __reduce__(self):
+
+        # Patterns are pickled when sent to worker processes. Item getters are
+        # rebuilt from their arguments, while decorated functions are found by
+        # name, so they must be defined at the top level of a module.
+        if not self.user_defined:
+            return _item_getter, self.embedded_args
+
+        location = (self.func.__module__, self.func.__qualname__)
+
+        # Fail here rather than when a worker process unpickles the function
+        try:
+            found = _import_indexable(*location)
+        except (ImportError, AttributeError):
+            found = None
+
+        if found is not self:
+            raise pickle.PicklingError(f"Can't pickle {self.func.__qualname__}: it isn't defined at module level")
+
+        return _import_indexable, location
+
+    def __call__(self, item: object):
+
+        # If given an ItemProxy, register this wrapper
+        # with the ItemProxy so it knows this function
+        # needs to be called on any inputted items
+        if isinstance(item, ItemProxy):
+            item.transformations = item.transformations.chain(self)
+            return item
+        else:
+            return self.func(item)
+
+
+class TransformationCollection:
+    """ Represents a collection of functions that are applied at indexing or query time
+
+    Consider a lookup created with the following definition:
+
+        my_list.create_lookup(my_list.item['a']['b'])
+
+    This will create a TransformationCollection with two functions, one for
+    extracting 'a' and one for extracting 'b'. This functions are applied in
+    order against each item in the IndexedList to produce the proper keys
+    for the lookup.
+
+    TransformationCollections are immutable: chain() returns a new collection
+    rather than changing the existing one. This lets the signature be computed
+    once, and lets lookups be indexed by signature.
+    """
+
+    def __init__(self, functions: Iterable[Indexable] = ()):
+        """ Construct a new TransformationCollection
+
+        :param functions: Optional iterable of functions wrapped with @Indexable
+        """
+
+        self._functions = tuple(functions)
+        self._signature = None
+        self._compiled = None
+
+    def __str__(self):
+
+        description = "item"
+
+        for func in self._functions:
+            description = f"{func.description_prefix}{description}{func.description_suffix}"
+
+        return description
+
+    def __len__(self):
+
+        return len(self._functions)
+
+    def __eq__(self, other):
+
+        if not isinstance(other, TransformationCollection):
+            return NotImplemented
+
+        return self.signature == other.signature
+
+    def __hash__(self):
+
+        return self.signature
+
+    def __getstate__(self):
+
+        # String hashes differ between processes, so the signature is
+        # generated again by any process the collection is sent to
+        # The compiled function can't be pickled, so it's rebuilt when needed
+        return {"_functions": self._functions, "_signature": None, "_compiled": None}
+
+    def chain(self, func: Indexable) -> "TransformationCollection":
+        """ Return a new TransformationCollection that applies func after these functions
+
+        :param func: @Indexable wrapped function to apply last
+        """
+
+        return TransformationCollection(self._functions + (func,))
+
+    def apply(self, item: object) -> object:
+        """ Chain apply all transformations, in order, against the provided item
+
+        :param item: Initial item to transform
+        """
+
+        return self.compiled(item)
+
+    @property
+    def compiled(self) -> Callable[[object], object]:
+        """ Single function applying every transformation in order, built on first use
+
+        Calling each @Indexable in turn costs several Python calls per function, which
+        adds up when every item in a list is transformed. Instead, the chain is turned
+        into the source of one function, with consecutive item getters fused into a
+        single subscript expression (such as x['a']['b']) and user-defined functions
+        called directly. Like the item getters it replaces, the function raises
+        SkipItem if a key or index is missing.
+        """
+
+        if self._compiled is None:
+            self._compiled = _compile_transformations(self._functions)
+
+        return self._compiled
+
+    @property
+    def signature(self) -> int:
+        """ Generate a unique hash signature for this TransformationCollection
+
+        At query time, the signature of the query is compared against the signature
+        used to create a lookup to determine if the lookup can support the query.
+        If the functions in the query differ from the functions used to create the
+        lookup (or if they're applied in different orders) then the lookup cannot be used.
+
+        The collection can't change, so the signature is only generated once.
+        """
+
+        if self._signature is None:
+            signature_tuple = tuple(
+                (func.user_defined, func.func.__name__, func.embedded_args, position)
+                for position, func
+                in enumerate(self._functions)
+            )
+
+            self._signature = hash(signature_tuple)
+
+        return self._signature
+
+
+class LookupCollection(MutableMapping):
+    """ Mapping of lookups keyed by name, which also indexes lookups by signature
+
+    The planner only considers lookups whose transformations match a query's,
+    so finding them through the index keeps planning fast however many lookups
+    a list has. Lookups can be added and removed like any other dict item.
+    Every change goes through __setitem__() or __delitem__(), which keep the
+    index up to date.
+    """
+
+    def __init__(self):
+        """ Construct a new, empty LookupCollection """
 
-    def __repr__(self):
+        self._lookups = {}
 
-        return f"IndexedList({self._data})"
+        # Lists of lookups keyed by the signature of their transformations
+        self.by_signature = {}
 
-    def __delitem__(self, key):
+        # Incremented whenever a lookup is added, replaced or removed, so cached
+        # plans can tell whether the lookups they use are still the list's own
+        self.version = 0
 
-        self._remove_by_index(key)
+    def __getitem__(self, name: str) -> "Lookup":
 
-    def append(self, object: object):
-        """ Append an object to the list
+        return self._lookups[name]
 
-        :param object: Object to append
-        """
+    def __setitem__(self, name: str, lookup: "Lookup"):
 
-        self._add_items((object,))
+        if name in self._lookups:
+            self._unindex(self._lookups[name])
 
-    def create_lookup(self, definition: object = None, name: str = None):
-        """ Create a lookup for faster searching
+        self._lookups[name] = lookup
 
-        :param definition: Definition of how and which values get stored in the lookup
-            Generally, this will be either None (so create a lookup of all
-            values in the list) or an expression using the .item property,
-            like my_list.item or my_list.item["b"]. Can also be a search query
-            if you want to create filtered lookup (i.e. my_list.item > 100).
+        self.by_signature.setdefault(lookup.pattern.transformations.signature, []).append(lookup)
+        self.version += 1
 
-        :param name: Name of the index, or None for an autogenerated name
-        """
+    def __delitem__(self, name: str):
 
-        # If no definition is provided, just add all items in the list to the lookup
-        # exactly how they appear.
-        if definition is None:
-            pattern = patterns.IndexerPattern(TransformationCollection())
-        elif isinstance(definition, ItemProxy):
-            pattern = definition.pattern
-        else:
-            pattern = definition
+        self._unindex(self._lookups[name])
 
-        # Construct the new lookup
-        new_lookup = Lookup(
-            pattern=pattern,
-            name=name
-        )
+        del self._lookups[name]
+        self.version += 1
 
-        # Add all existing data to the lookup
-        self._rebuild_lookup_data(new_lookup)
+    def __iter__(self):
 
-        # Save the lookup to our dict of eligible lookups
-        self.lookups[new_lookup.name] = new_lookup
+        return iter(self._lookups)
 
-    def extend(self, iterable: Iterable):
-        """ Add all items from an iterable to the list
+    def __len__(self):
 
-        :param iterable: Iterable of items to add to the list
-        """
+        return len(self._lookups)
 
-        self._add_items(iterable)
+    def __contains__(self, name: object) -> bool:
 
-    def search(self, query: ["ItemProxy", patterns.SearchPattern]) -> Generator[tuple, None, None]:
-        """ Search for items and return their indices and values
+        return name in self._lookups
 
-        Construct queries using .item in the following manner (where my_list is your
-        IndexedList object):
+    def __repr__(self):
 
-            results = my_list.search(my_list.item == 100)
-            results = my_list.search(my_list.item > 100)
-            results = my_list.search(my_list.item.in_(1, 2, 3))
+        return f"LookupCollection({self._lookups})"
 
-        Order of items returned is not guaranteed.
+    def __ior__(self, other):
 
-        :param query: ItemProxy or SearchPattern representing the query to execute
-        """
+        self.update(other)
 
-        return self.plan(query).execute(self)
+        return self
 
-    def plan(self, query: ["ItemProxy", patterns.SearchPattern]) -> plans.QueryPlan:
-        """ Construct a query plan that dictates how the search will be conducted
+    def clear(self):
 
-        Construct queries using .item in the following manner (where my_list is your
-        IndexedList object):
+        self._lookups.clear()
+        self.by_signature.clear()
+        self.version += 1
 
-            results = my_list.search(my_list.item == 100)
-            results = my_list.search(my_list.item > 100)
-            results = my_list.search(my_list.item.in_(1, 2, 3))
+    def _unindex(self, lookup: "Lookup"):
+        """ Remove a lookup from the signature index
 
-        :param query: ItemProxy or SearchPattern representing the query to plan
+        :param lookup: Lookup being removed from the collection
         """
 
-        lookups = self.lookups.values()
+        signature = lookup.pattern.transformations.signature
+        same_signature = self.by_signature[signature]
 
-        return plans.create(
-            query=query,
-            lookups=lookups
-        )
+        same_signature.remove(lookup)
 
-    def _remove_by_index(self, index: int):
-        """ Delete an item at a given list index
+        if not same_signature:
+            del self.by_signature[signature]
 
-        :param index: Numeric index of item to delete
-        """
 
-        # Get the current value of item at that index
-        item = self._data[index]
+class _LookupBuild:
+    """ Lookups being filled in a background thread, created with create_lookups(background=True)
 
-        # Remove the item and index from all lookups
-        self._delete_from_lookups(item, index)
+    The thread only transforms and groups a copy of the items taken when the build
+    started. Its results are added to the lookups by the IndexedList's own thread,
+    along with any changes made to the list since the build started.
+    """
 
-        # Remove the item from the underlying data list
-        del self._data[index]
+    # Single thread shared by all background builds, so builds run one at a time
+    _executor = None
 
-    def _delete_from_lookups(self, item: object, index: int):
-        """ Remove an item at a position from all lookups
+    def __init__(self, lookups: List["Lookup"], row_ids: List[int], items: list,
+                 workers: int = None):
+        """ Start building lookups in the background
 
-        :param item: Value of item to remove
-        :param index: Numeric index of value to remove
+        :param lookups: Lookups to build
+        :param row_ids: Row ids of the items to add to the lookups
+        :param items: Items to add to the lookups, parallel to row_ids
+        :param workers: Number of processes to transform items across, or None
+            to transform them in the background thread
         """
 
-        for lookup in self.lookups.values():
-            lookup.remove_item(item, index)
+        if _LookupBuild._executor is None:
+            _LookupBuild._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lookup-build")
 
-    def _add_items(self, items: Iterable):
-        """ Add an iterable of items to the list
+        self.lookups = lookups
 
-        :param items: Iterable of items to add to the list
-        """
+        # (added, row ids, items) for each change made to the list while building,
+        # where added is True for items added and False for items removed
+        self.changes = []
 
-        # Get the index of the first new item
-        index = len(self._data)
+        self.future: Future = self._executor.submit(
+            _group_items, lookups, list(row_ids), list(items), workers
+        )
 
-        # Add the items to the list
-        self._data.extend(items)
 
-        # End here if there are no lookups to update
-        if not self.lookups:
-            return
+class _Changes:
+    """ The net change made to the rows of an IndexedList over a series of changes
 
-        # Add each item to all attached lookups
-        for item in items:
-            self._add_to_lookups(item, index)
+    Rows are identified by row id. A row added and then removed leaves no trace,
+    and a row removed and then added with a new item (as when an item is replaced)
+    appears in both removed and added.
+    """
 
-            index += 1
+    def __init__(self):
 
-    def _add_to_lookups(self, item: object, index: int):
-        """ Add an item to all lookups
+        # Items of rows that existed before the changes began and have been
+        # removed, and of rows that have been added since, keyed by row id
+        self.removed = {}
+        self.added = {}
 
-        :param item: Value of item to add to lookups
-        :param index: Numeric position of item in data list
-        """
+    def __bool__(self):
 
-        for lookup in self.lookups.values():
-            lookup.add_item(item, index)
+        return bool(self.removed or self.added)
 
-    def _rebuild_lookup_data(self, lookup: "Lookup"):
-        """ Rebuild a lookup from data currently in the data list
+    def add(self, row_ids: Iterable[int], items: Iterable):
+        """ Record rows being added
 
-        :param lookup: Lookup object to rebuild
+        :param row_ids: Row ids of the items being added
+        :param items: Items being added, parallel to row_ids
         """
 
-        for index, item in enumerate(self._data):
+        self.added.update(zip(row_ids, items))
 
-            try:
-                lookup.add_item(item, index)
-            except exc.SkipItem:
-                continue
+    def remove(self, row_ids: Iterable[int], items: Iterable):
+        """ Record rows being removed
 
-    @property
-    def item(self) -> "ItemProxy":
-        """ Returns an ItemProxy suitable for constructing queries and lookup definitions """
+        :param row_ids: Row ids of the items being removed
+        :param items: Items being removed, parallel to row_ids
+        """
 
-        return ItemProxy()
+        added = self.added
+        removed = self.removed
 
+        for row_id, item in zip(row_ids, items):
 
-class Lookup:
-    """ A lookup for quickly finding the index of items in an IndexedList """
+            if row_id in added:
+                del added[row_id]
+            else:
+                removed[row_id] = item
 
-    def __init__(self, pattern: patterns.Pattern, name: str = None):
-        """ Construct a new Lookup
+    def update(self, changes: "_Changes"):
+        """ Record changes made after those already recorded
 
-        :param pattern: Pattern that dictates items in the lookup
-        :param name: Optional name, defaults to a UUID
+        :param changes: Changes made since the ones recorded here
         """
 
-        # Mapping utilizes a SortedDict to allow for range queries (>, <, etc)
-        self.mapping = SortedDict()
-        self.pattern = pattern
-        self.name = name or str(uuid.uuid4())
+        self.remove(changes.removed.keys(), changes.removed.values())
+        self.add(changes.added.keys(), changes.added.values())
 
-    def __str__(self):
 
-        return str(self.pattern)
+class _Batch:
+    """ Changes made to an IndexedList inside batch()
+
+    Changes are held back from lookups in pending until the batch ends, or until
+    a search needs the lookups to be up to date, at which point they're applied
+    and moved into applied. Both are needed to roll back the batch.
+    """
 
-    def add_item(self, item: object, index: int):
-        """ Store an item and its index in the lookup
+    def __init__(self, next_row_id: int):
+        """ Start a new batch
 
-        :param item: Original item stored in an IndexedList
-        :param index: Numerical index of item in associated IndexedList
+        :param next_row_id: Row id of the next item appended to the list when the batch started
         """
 
-        # Don't store the item if the lookup's pattern does not match it
-        # For example, if the pattern is item > 10, don't store 9
-        if self.pattern.matches(item):
-            key = self.pattern.transform(item)
+        self.next_row_id = next_row_id
+        self.applied = _Changes()
+        self.pending = _Changes()
 
-            self._add_index(key, index)
 
-    def remove_item(self, item: object, index: int):
-        """ Remove an item and its index from the lookup
+class Snapshot(IndexedList):
+    """ A read-only view of an IndexedList at a point in time, returned by IndexedList.snapshot()
 
-        :param item: Original item stored in an IndexedList
-        :param index: Numerical index of item in associated IndexedList
-        """
+    Supports the same searches and read-only list methods as an IndexedList.
+    Methods that would change it raise a TypeError. As it never changes, a
+    snapshot can be searched from several threads without any locking.
+    """
 
-        if self.pattern.matches(item):
-            key = self.pattern.transform(item)
+    def __init__(self, source: IndexedList):
+        """ Construct a new Snapshot
 
-            self._remove_index(key, index)
+        :param source: IndexedList to take a snapshot of, which mustn't change until this returns
+        """
 
-    def handles(self, pattern: patterns.SearchPattern) -> bool:
-        """ Determine if lookup can provide data for a particular search pattern
+        super().__init__(parallel_scan_rows=source.parallel_scan_rows, scan_workers=source.scan_workers)
 
-        :param pattern: Pattern to test for compatibility
-        """
+        # The items and row ids are shared, and copied by the source list
+        # before it next changes them
+        self._data = source._data
+        self._row_ids = source._row_ids
+        self._next_row_id = source._next_row_id
+        source._rows_shared = True
 
-        return self.pattern.handles(pattern)
+        for name, lookup in source.lookups.items():
 
-    def _add_index(self, key: object, index: int):
-        """ Add a list index to the Lookup mapping at key
+            if lookup.ready:
+                self.lookups[name] = lookup.snapshot()
 
-        When an item is added to an IndexedList with lookups, the item
-        is passed through pattern transformations to generate a key.
-        For example, a lookup with the definition of item['a'] would look
-        at the 'a' key of whatever item was passed in in order to generate
-        a lookup key for that item.
+    def __repr__(self):
 
-        :param key: Key (transformed item) where index should be added
-        :param index: Numeric index linking to an item location in an IndexedList
-        """
+        return f"Snapshot({self._data})"
 
-        # Create the key if it does not already exist
-        self.mapping.setdefault(key, set()).add(index)
+    def snapshot(self) -> "Snapshot":
+        """ Returns the snapshot itself, which never changes """
 
-    def _remove_index(self, key: object, index: int):
-        """ Remove a list index from the Lookup mapping at key
+        return self
 
-        :param key: Key (transformed item) where index should be removed
-        :param index: Numeric index linking to an item location in an IndexedList
-        """
+    def _read_only(self, *args, **kwargs):
+        """ Stands in for the methods that would change the snapshot """
 
-        index_set = self.mapping[key]
+        raise TypeError("IndexedList snapshots are read-only")
 
-        index_set.discard(index)
+    __setitem__ = __delitem__ = __iadd__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+    batch = create_lookup = create_lookups = build_lookups = _read_only
 
-        # Remove the key from the mapping if no indices remain associated with it
-        if not index_set:
-            del self.mapping[key]
 
+class PreparedQuery:
+    """ A query planned once and run many times with different values
 
-class Indexable:
-    """ Decorator that allows querying and indexing functions applied to an IndexedList
+    Created with IndexedList.prepare(). Params in the query are replaced by the
+    values passed as keyword arguments when the query is run:
 
-    Consider the following example:
+        by_id = my_list.prepare(my_list.item['id'] == Param('id'))
+        results = by_id.run(id=5)
+    """
 
-        @Indexable
-        def double_it(x):
-            return x * 2
+    def __init__(self, data: IndexedList, query: ["ItemProxy", patterns.Pattern],
+                 order_by: ["ItemProxy", str] = None, descending: bool = False,
+                 limit: int = None, offset: int = 0):
+        """ Construct a new PreparedQuery
+
+        :param data: IndexedList the query will be run against
+        :param query: ItemProxy or Pattern representing the query, which may contain Params
+        :param order_by: Key to order results by, "index" to order them by list
+            index, or None for no particular order
+        :param descending: If True, order results from largest to smallest
+        :param limit: Maximum number of results to return, or None for no limit
+        :param offset: Number of results to skip
+        """
 
-    Using the @Indexable decorator allows us to create lookups on the results of
-    that function applied to every item in an IndexedList:
+        # ItemProxies change as they're used, so convert them to patterns now
+        self.data = data
+        self.query = patterns._to_pattern(query)
+        self.order_by = order_by if isinstance(order_by, str) else patterns._to_pattern(order_by)
+        self.descending = descending
+        self.limit = limit
+        self.offset = offset
+
+        # Names of the values that must be supplied to run the query
+        self.params = self.query.params
+
+        self._shape = plans.shape(
+            query=self.query,
+            order_by=self.order_by,
+            descending=descending,
+            limit=limit,
+            offset=offset
+        )
 
-        my_list.create_lookup(double_it(my_list.item))
+    @property
+    def plan(self) -> plans.QueryPlan:
+        """ The query plan, with Params in place of the values supplied when run """
 
-    Once such a lookup is created, the IndexedList will be able to use that lookup
-    should the function be called again in the future during a search:
+        data = self.data
 
-        my_list.search(double_it(my_list.item))
+        # Lookups finishing in the background change the lookups available
+        data._prepare_lookups(self.query, self.order_by)
 
-    Both of these approaches would fail without the decorator, which treats an ItemProxy
-    input (mylist.item) differently than other input by using it to build a search
-    pattern, rather than evaluating it immediately.
-    """
+        with data._lock.read():
+            return self._cached_plan()
 
-    def __init__(self, func: Callable[[object], object]):
-        """ Construct a new Indexable wrapper
+    def run(self, **values) -> Generator[tuple, None, None]:
+        """ Run the query, returning a generator of (index, item) tuples like search()
 
-        :param func: Function that is being wrapped
+        :param values: Value for each Param in the query, keyed by Param name
         """
 
-        self.func = func
-
-        # Indicates whether this function was defined by an end user
-        # to help disambiguate user-defined functions from ones included
-        # in this package
-        self.user_defined = True
+        data = self.data
+        data._prepare_lookups(self.query, self.order_by)
 
-        # Any variables referenced by the function that are not
-        # provided as arguments to the function
-        self.embedded_args = None
+        return data._read_results(lambda: self._bind(values).execute(data))
 
-        # Used for generating a string description of the wrapped function
-        self.description_prefix = f"{func.__name__}("
-        self.description_suffix = ")"
+    def count(self, **values) -> int:
+        """ Count the items matching the query, like IndexedList.count()
 
-    def __call__(self, item: object):
+        :param values: Value for each Param in the query, keyed by Param name
+        """
 
-        # If given an ItemProxy, register this wrapper
-        # with the ItemProxy so it knows this function
-        # needs to be called on any inputted items
-        if isinstance(item, ItemProxy):
-            item.transformations.add(self)
-            return item
-        else:
-            return self.func(item)
+        data = self.data
+        data._prepare_lookups(self.query, self.order_by)
 
+        with data._lock.read():
+            return self._bind(values, counting=True).count(data)
 
-class TransformationCollection:
-    """ Represents a collection of functions that are applied at indexing or query time
+    def exists(self, **values) -> bool:
+        """ Returns True if any items match the query, like IndexedList.exists()
 
-    Consider a lookup created with the following definition:
+        :param values: Value for each Param in the query, keyed by Param name
+        """
 
-        my_list.create_lookup(my_list.item['a']['b'])
+        data = self.data
+        data._prepare_lookups(self.query, self.order_by)
 
-    This will create a TransformationCollection with two functions, one for
-    extracting 'a' and one for extracting 'b'. This functions are applied in
-    order against each item in the IndexedList to produce the proper keys
-    for the lookup.
-    """
+        with data._lock.read():
+            return self._bind(values, counting=True).exists(data)
 
-    def __init__(self, functions: List[Indexable] = None):
-        """ Construct a new TransformationCollection
+    def first(self, **values) -> Optional[tuple]:
+        """ Returns the (index, item) tuple of the first match found, or None
 
-        :param functions: Optional list of functions wrapped with @Indexable
+        :param values: Value for each Param in the query, keyed by Param name
         """
 
-        self._functions = functions or []
+        results = self.run(**values)
 
-    def __str__(self):
+        try:
+            return next(results, None)
+        finally:
 
-        description = "item"
+            if self.data.concurrent:
+                results.close()
 
-        for func in self._functions:
-            description = f"{func.description_prefix}{description}{func.description_suffix}"
+    def _cached_plan(self, counting: bool = False) -> plans.QueryPlan:
+        """ Returns the cached plan for the query, planning it again if it's out of date
 
-        return description
+        :param counting: If True, return the plan used by count() and exists() (see IndexedList._plan())
+        """
 
-    def add(self, func: Indexable):
-        """ Add a new function to the TransformationCollection
+        data = self.data
+        lookups_version = data.lookups.version
+        row_count = len(data)
 
-        :param func: @Indexable wrapped function to add to TransformationCollection
-        """
+        # Counts may be planned differently, so their plans are cached separately
+        cache_key = (self._shape, counting)
 
-        self._functions.append(func)
+        try:
+            planned_lookups_version, planned_row_count, plan = data._plan_cache[cache_key]
+        except (KeyError, TypeError):
+            pass
+        else:
 
-    def apply(self, item: object) -> object:
-        """ Chain apply all transformations, in order, against the provided item
+            # Reuse the plan unless lookups have been added, replaced or removed,
+            # or the list has changed size enough to change the best plan
+            if (planned_lookups_version == lookups_version
+                    and row_count <= planned_row_count * 2
+                    and planned_row_count <= row_count * 2):
+                return plan
+
+        plan = data._plan(
+            query=self.query,
+            order_by=self.order_by,
+            descending=self.descending,
+            limit=self.limit,
+            offset=self.offset,
+            counting=counting
+        )
 
-        :param item: Initial item to transform
-        """
+        try:
+            data._plan_cache[cache_key] = (lookups_version, row_count, plan)
+        except TypeError:
 
-        result = item
+            # The query holds values that can't be hashed, so it can't be cached
+            return plan
 
-        # The result of each function becomes the input to the next function
-        for func in self._functions:
-            result = func(result)
+        # Discard the oldest plan once the cache is full. Several threads can
+        # plan at once on a concurrent list, so another may have discarded it.
+        if len(data._plan_cache) > PLAN_CACHE_SIZE:
+            data._plan_cache.pop(next(iter(data._plan_cache), None), None)
 
-        return result
+        return plan
 
-    @property
-    def signature(self) -> int:
-        """ Generate a unique hash signature for this TransformationCollection
+    def _bind(self, values: dict, counting: bool = False) -> plans.QueryPlan:
+        """ Return the query plan with Params replaced by the values supplied
 
-        At query time, the signature of the query is compared against the signature
-        used to create a lookup to determine if the lookup can support the query.
-        If the functions in the query differ from the functions used to create the
-        lookup (or if they're applied in different orders) then the lookup cannot be used.
+        :param values: Value for each Param in the query, keyed by Param name
+        :param counting: If True, bind the plan used by count() and exists()
         """
 
-        signature_tuple = tuple(
-            (func.user_defined, func.func.__name__, func.embedded_args, position)
-            for position, func
-            in enumerate(self._functions)
-        )
+        if values.keys() != self.params:
+            missing = ", ".join(sorted(self.params.difference(values)))
+            unexpected = ", ".join(sorted(set(values).difference(self.params)))
 
-        return hash(signature_tuple)
+            raise TypeError(f"Values do not match query params. Missing: [{missing}], "
+                            f"unexpected: [{unexpected}]")
+
+        return self._cached_plan(counting).bind(values)
 
 
 class ItemProxy:
@@ -507,24 +2622,21 @@ class ItemProxy:
 
         return self
 
-    def __getitem__(self, item):
+    def __and__(self, other):
 
-        # This function is used to retrieve by list index, dict key,
-        # or similar from an object at indexing time.
-        @Indexable
-        def _get_item(x):
+        return self.pattern & other
 
-            try:
-                return x[item]
-            except (KeyError, IndexError):
-                raise exc.SkipItem()
+    def __or__(self, other):
 
-        _get_item.user_defined = False
-        _get_item.embedded_args = (item,)
-        _get_item.description_prefix = ""
-        _get_item.description_suffix = f"[{item}]"
+        return self.pattern | other
 
-        self.transformations.add(_get_item)
+    def __invert__(self):
+
+        return ~self.pattern
+
+    def __getitem__(self, item):
+
+        self.transformations = self.transformations.chain(_item_getter(item))
 
         return self
 
@@ -535,6 +2647,13 @@ class ItemProxy:
 
         return self
 
+    def between(self, start, end):
+        """ Retrieve values from start to end, inclusive """
+
+        self.comparator = cmps.BetweenComparator(start, end)
+
+        return self
+
     @property
     def pattern(self) -> patterns.Pattern:
         """ Transform the ItemProxy into a SearchPattern or IndexerPattern """
@@ -551,3 +2670,134 @@ class ItemProxy:
                 transformations=self.transformations,
                 comparator=self.comparator
             )
+
+
+def _item_getter(item: object) -> Indexable:
+    """ Build the transformation used to retrieve by list index, dict key, or similar
+
+    :param item: Index or key to retrieve from each item
+    """
+
+    # This function is used to retrieve by list index, dict key,
+    # or similar from an object at indexing time.
+    @Indexable
+    def _get_item(x):
+
+        try:
+            return x[item]
+        except (KeyError, IndexError):
+            raise exc.SkipItem()
+
+    _get_item.user_defined = False
+    _get_item.embedded_args = (item,)
+    _get_item.description_prefix = ""
+    _get_item.description_suffix = f"[{item}]"
+
+    return _get_item
+
+
+def _group_items(lookups: List["Lookup"], row_ids: List[int], items: list,
+                 workers: int = None) -> List[dict]:
+    """ Transform items for several lookups, grouping row ids by key for each lookup
+
+    :param lookups: Lookups whose patterns items are run through
+    :param row_ids: Row ids of the items
+    :param items: Items to transform, parallel to row_ids
+    :param workers: Number of processes to transform items across, or None
+        to transform them in the current thread
+    """
+
+    lookup_patterns = [lookup.pattern for lookup in lookups]
+
+    if workers:
+        return parallel.group_matches(lookup_patterns, row_ids, items, workers)
+
+    return patterns.group_matches(lookup_patterns, zip(row_ids, items))
+
+
+def _cancel_unmoved(removed: dict, added: dict):
+    """ Drop row ids being both removed from and added to the same key of a lookup
+
+    :param removed: Dict mapping keys to lists of row ids being removed, which is changed in place
+    :param added: Dict mapping keys to lists of row ids being added, which is changed in place
+    """
+
+    for key in removed.keys() & added.keys():
+        unmoved = set(removed[key]).intersection(added[key])
+
+        if not unmoved:
+            continue
+
+        for grouped in (removed, added):
+            row_ids = [row_id for row_id in grouped[key] if row_id not in unmoved]
+
+            if row_ids:
+                grouped[key] = row_ids
+            else:
+                del grouped[key]
+
+
+def _compile_transformations(functions: Tuple[Indexable, ...]) -> Callable[[object], object]:
+    """ Build a single function applying a chain of transformations to an item
+
+    :param functions: @Indexable wrapped functions, in the order they're applied
+    """
+
+    if not functions:
+        return _identity
+
+    namespace = {"SkipItem": exc.SkipItem}
+    lines = ["def transform(x):"]
+    subscripts = ""
+
+    # Consecutive item getters are fused into one subscript expression, which is
+    # written out when a user-defined function (or the end of the chain) is reached
+    for position, func in enumerate(functions + (None,)):
+
+        if func is not None and not func.user_defined:
+            namespace[f"key_{position}"] = func.embedded_args[0]
+            subscripts += f"[key_{position}]"
+            continue
+
+        if subscripts:
+            lines.extend([
+                "    try:",
+                f"        x = x{subscripts}",
+                "    except (KeyError, IndexError):",
+                "        raise SkipItem()"
+            ])
+            subscripts = ""
+
+        if func is not None:
+            namespace[f"func_{position}"] = func.func
+            lines.append(f"    x = func_{position}(x)")
+
+    lines.append("    return x")
+
+    exec("\n".join(lines), namespace)
+
+    return namespace["transform"]
+
+
+def _identity(item: object) -> object:
+    """ Returns the item unchanged, used for an empty chain of transformations
+
+    :param item: Item to return
+    """
+
+    return item
+
+
+def _import_indexable(module_name: str, qualified_name: str) -> Indexable:
+    """ Find an @Indexable function by name, used when unpickling
+
+    :param module_name: Name of the module the function was defined in
+    :param qualified_name: Qualified name of the function within the module
+    """
+
+    found = importlib.import_module(module_name)
+
+    for name in qualified_name.split("."):
+        found = getattr(found, name)
+
+    return found
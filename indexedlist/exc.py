@@ -5,3 +5,9 @@ class SkipItem(Exception):
     """ Raised by functions to indicate an item should not be added to a Lookup """
 
     pass
+
+
+class ConcurrentModificationError(RuntimeError):
+    """ Raised when a thread tries to change a concurrent IndexedList it's reading """
+
+    pass
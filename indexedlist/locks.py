@@ -0,0 +1,250 @@
+""" Locks used by IndexedLists created with concurrent=True
+
+A ReadWriteLock lets many threads search a list at once while changes to it
+are made one at a time. Lists that aren't concurrent use NO_LOCK, which has
+the same methods but does nothing, so the list's code doesn't have to check
+which kind of lock it has.
+"""
+
+import threading
+
+from typing import Iterator, Optional
+
+from . import exc
+
+
+class ReadWriteLock:
+    """ A lock that can be held by many reading threads at once, or one writing thread
+
+    Waiting writers block new readers, so a steady stream of searches can't starve
+    a writer. Both locks are reentrant: a thread already reading can read again
+    even while a writer waits (as a search run while iterating another search's
+    results must), and the writing thread can read or write again. A thread
+    that's only reading can't start writing, as two threads doing so would
+    deadlock waiting for each other, so it raises ConcurrentModificationError.
+    """
+
+    def __init__(self):
+
+        self._condition = threading.Condition(threading.Lock())
+
+        # Number of times each reading thread holds the lock, keyed by thread id
+        self._readers = {}
+
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self) -> int:
+        """ Wait for and take the read lock, returning the id of the thread holding it """
+
+        thread_id = threading.get_ident()
+
+        with self._condition:
+
+            if thread_id not in self._readers and self._writer != thread_id:
+
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+
+            self._readers[thread_id] = self._readers.get(thread_id, 0) + 1
+
+        return thread_id
+
+    def release_read(self, thread_id: int = None):
+        """ Release the read lock
+
+        :param thread_id: Id of the thread that took the lock, which may differ from
+            the current thread when results are released by the garbage collector.
+            Defaults to the current thread.
+        """
+
+        if thread_id is None:
+            thread_id = threading.get_ident()
+
+        with self._condition:
+            depth = self._readers[thread_id] - 1
+
+            if depth:
+                self._readers[thread_id] = depth
+            else:
+                del self._readers[thread_id]
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        """ Wait for and take the write lock """
+
+        thread_id = threading.get_ident()
+
+        with self._condition:
+
+            if self._writer == thread_id:
+                self._write_depth += 1
+                return
+
+            if thread_id in self._readers:
+                raise exc.ConcurrentModificationError(
+                    "Can't change a concurrent IndexedList in a thread that's reading it, "
+                    "such as while iterating over search results. Read all the results "
+                    "(or close them) first."
+                )
+
+            self._waiting_writers += 1
+
+            try:
+
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+
+            finally:
+                self._waiting_writers -= 1
+
+            self._writer = thread_id
+            self._write_depth = 1
+
+    def release_write(self):
+        """ Release the write lock """
+
+        with self._condition:
+            self._write_depth -= 1
+
+            if not self._write_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    def only_reading(self) -> bool:
+        """ Returns True if the current thread holds the read lock but not the write lock """
+
+        thread_id = threading.get_ident()
+
+        return self._writer != thread_id and thread_id in self._readers
+
+    def read(self) -> "_Held":
+        """ Returns a context manager holding the read lock """
+
+        return _Held(self.acquire_read, self.release_read)
+
+    def write(self) -> "_Held":
+        """ Returns a context manager holding the write lock """
+
+        return _Held(self.acquire_write, self.release_write)
+
+
+class _Held:
+    """ Context manager taking a lock on entry and releasing it on exit """
+
+    __slots__ = ("_acquire", "_release")
+
+    def __init__(self, acquire, release):
+
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+
+        self._acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self._release()
+
+
+class _NoLock:
+    """ Stands in for a ReadWriteLock on lists that aren't concurrent """
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        pass
+
+    def acquire_read(self) -> Optional[int]:
+
+        return None
+
+    def release_read(self, thread_id: int = None):
+
+        pass
+
+    def acquire_write(self):
+
+        pass
+
+    def release_write(self):
+
+        pass
+
+    def only_reading(self) -> bool:
+
+        return False
+
+    def read(self) -> "_NoLock":
+
+        return self
+
+    def write(self) -> "_NoLock":
+
+        return self
+
+
+NO_LOCK = _NoLock()
+
+
+class ReadLockedResults:
+    """ Iterator over search results that holds a read lock until they're all read
+
+    The lock is released once the results are exhausted, when close() is called,
+    or when the iterator is garbage collected, whichever happens first.
+    """
+
+    def __init__(self, results: Iterator, lock: ReadWriteLock, thread_id: int):
+        """ Wrap search results
+
+        :param results: Iterator of search results, created while holding the read lock
+        :param lock: Lock to release once the results have been read
+        :param thread_id: Id of the thread holding the read lock
+        """
+
+        self._results = results
+        self._lock = lock
+        self._thread_id = thread_id
+
+    def __iter__(self):
+
+        return self
+
+    def __next__(self):
+
+        if self._results is None:
+            raise StopIteration
+
+        try:
+            return next(self._results)
+        except BaseException:
+            self.close()
+            raise
+
+    def __del__(self):
+
+        self.close()
+
+    def close(self):
+        """ Stop reading results and release the read lock """
+
+        results = self._results
+
+        if results is None:
+            return
+
+        self._results = None
+
+        try:
+            close = getattr(results, "close", None)
+
+            if close is not None:
+                close()
+
+        finally:
+            self._lock.release_read(self._thread_id)
@@ -5,7 +5,7 @@ objects. At execution time, each Operation consumes the output of the
 previous Operation step as well as a reference to the IndexedList
 being searched. The output of the final operation is returned to the
 user, and should be a generator of (item index, item) tuples. Order
-is not guaranteed.
+is not guaranteed unless the plan was created with an order_by.
 
 It's easy to convert Operation objects into descriptions, which is useful
 for the end user when they're trying to determine how data is being retrieved.
@@ -13,18 +13,31 @@ This is the primary reason an object-oriented design is used, as otherwise the
 same behavior could be gained using a list of functions instead.
 """
 
+import heapq
 import itertools
+import operator
+import time
 
-from typing import TYPE_CHECKING, Generator, Iterable, Callable
+from typing import TYPE_CHECKING, Generator, Iterable, List, Set
+
+from . import parallel
+from . import params
+from . import postings
+from . import vectorized
+from .patterns import NO_MATCH
 
 if TYPE_CHECKING:
     from .core import IndexedList, Lookup
-    from .patterns import SearchPattern
+    from .patterns import Pattern
 
 
-class Operation:
+class Operation(params.Parameterized):
     """ Generic Operation, meant for subclassing """
 
+    # Planner's estimate of the number of rows the operation reads (for scans)
+    # or finds (for lookup operations), or None if no estimate was made
+    estimated_rows = None
+
     def __call__(self, stream: object, data: "IndexedList"):
         """ Execute the operation
 
@@ -34,13 +47,50 @@ class Operation:
 
         return self.execute(stream, data)
 
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params in the Operation's attributes """
+
+        return params.find(list(vars(self).values()))
+
+    def bind(self, values: dict) -> "Operation":
+        """ Return a copy of the Operation with any Params replaced by values
+
+        Used to run a plan built for a prepared query. Params may appear in any
+        attribute, including within patterns, lists and nested operations.
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        attributes = vars(self)
+        bound_attributes = {
+            name: params.bind(value, values)
+            for name, value in attributes.items()
+        }
+
+        # Operations without Params are shared rather than copied
+        if all(bound_attributes[name] is value for name, value in attributes.items()):
+            return self
+
+        # Operations have no state beyond their attributes, so
+        # the copy doesn't need to go through __init__
+        bound = object.__new__(type(self))
+        bound.__dict__.update(bound_attributes)
+
+        return bound
+
     def describe(self) -> dict:
         """ Return a dict description of the Operation """
 
-        return {
+        description = {
             "operation": type(self).__name__
         }
 
+        if self.estimated_rows is not None:
+            description["estimated_rows"] = self.estimated_rows
+
+        return description
+
     def execute(self, stream: [object, Iterable], data: "IndexedList"):
         """ Execute the operation
 
@@ -55,16 +105,45 @@ class DataScan(Operation):
     """ Operation that reads through the entire IndexedList, yielding search pattern matches
 
     The least efficient way to search a large list, and also the default if there are
-    no Lookups present or none can be used.
+    no Lookups present or none can be used. If NumPy is installed and the values being
+    compared are numbers, the pattern is evaluated over a whole column of values at once.
+    Otherwise, if workers is given, the list is split across a pool of worker processes.
     """
 
-    def __init__(self, pattern: "SearchPattern"):
+    def __init__(self, pattern: "Pattern", reverse: bool = False, workers: int = None):
         """ Construct a new DataScan operation
 
-        :param pattern: SearchPattern used to filter out irrelevant items
+        :param pattern: Pattern used to filter out irrelevant items
+        :param reverse: If True, scan from the end of the list to the start
+        :param workers: Number of processes to split the scan across, or None
+            to scan in the current process
         """
 
         self.pattern = pattern
+        self.reverse = reverse
+        self.workers = workers
+
+    def describe(self) -> dict:
+        """ Return a dict description of the Operation """
+
+        description = super().describe()
+
+        args = {}
+
+        if self.reverse:
+            args["reverse"] = self.reverse
+
+        if self.workers:
+            args["workers"] = self.workers
+
+        if args:
+            description.update(
+                {
+                    "args": args
+                }
+            )
+
+        return description
 
     def execute(self, stream: None, data: "IndexedList") -> Generator[tuple, None, None]:
         """ Execute the DataScan against an IndexedList
@@ -73,10 +152,37 @@ class DataScan(Operation):
         :param data: IndexedList being searched
         """
 
+        items = data._data
+
+        # Building a column runs every transformation in this process, which
+        # defeats the point of a parallel scan, so only reuse existing columns
+        indices = vectorized.scan(self.pattern, data, build_columns=not self.workers)
+
+        if indices is not None:
+
+            if self.reverse:
+                indices = indices[::-1]
+
+            yield from ((index, items[index]) for index in indices.tolist())
+            return
+
+        if self.workers:
+            indices = parallel.scan(self.pattern, data, self.workers, self.reverse)
+
+            yield from ((index, items[index]) for index in indices)
+            return
+
+        matches = self.pattern.matches
+
+        if self.reverse:
+            indexed_items = zip(range(len(data) - 1, -1, -1), reversed(data))
+        else:
+            indexed_items = enumerate(data)
+
         yield from (
             (index, item)
-            for index, item in enumerate(data)
-            if self.pattern.matches(item)
+            for index, item in indexed_items
+            if matches(item)
         )
 
 
@@ -114,68 +220,92 @@ class LookupSeek(LookupOperation):
     """ Operation that seeks specific keys from a Lookup
 
     Used for both == and .in_ comparators, but not for range comparators. The generator
-    returned contains sets of list indices referencing where to find these values
+    returned contains postings of row ids referencing where to find these values
     in the IndexedList.
     """
 
-    def __init__(self, lookup: "Lookup", keys: Iterable):
+    def __init__(self, lookup: "Lookup", keys: Iterable, reverse: bool = None):
         """ Construct a new LookupSeek operation
 
         :param lookup: Lookup that will be searched
         :param keys: Iterable of keys to search for
+        :param reverse: None to seek keys in the order given, otherwise seek them
+            in sorted order, from largest to smallest if True
         """
 
         super().__init__(lookup)
 
         self.keys = keys
+        self.reverse = reverse
 
     def describe(self) -> dict:
         """ Return a dict description of the Operation """
 
         description = super().describe()
 
+        args = {"keys": self.keys}
+
+        if self.reverse is not None:
+            args["reverse"] = self.reverse
+
         description.update(
             {
-                "args": {"keys": self.keys}
+                "args": args
             }
         )
 
         return description
 
-    def execute(self, stream: None, data: "IndexedList") -> Generator[set, None, None]:
+    def execute(self, stream: None, data: "IndexedList") -> Generator[postings.Posting, None, None]:
         """ Execute the LookupSeek
 
         :param stream: Unused
         :param data: IndexedList being searched
         """
 
-        yield from (self.lookup.mapping.get(key, set()) for key in self.keys)
+        mapping = self.lookup.mapping
+
+        # Comparators drop repeated values, but Params in a prepared
+        # query may be given the same value, which is only seeked once
+        keys = dict.fromkeys(self.keys)
+
+        # Keys are sorted here rather than when planning, as a prepared
+        # query's keys aren't known until it runs
+        if self.reverse is not None:
+            keys = sorted(keys, reverse=self.reverse)
+
+        yield from (mapping[key] for key in keys if key in mapping)
 
 
 class LookupRangeSeek(LookupOperation):
     """ Operation that seeks ranges of keys from a Lookup
 
-    Used for range-based comparators such as >=, <, etc. Any key that falls
-    within the defined range and matches the match_func has its set of list
-    indices returned. If the key does not match the match_func (i.e. end of
-    range has been reached) then no further keys are evaluated.
+    Used for range-based comparators such as >=, <, .between(), etc. Both ends
+    of the range are located by bisecting the sorted keys, and the keys in between
+    are walked lazily, so no keys are copied or compared one at a time. The posting
+    of row ids for each key within the range is returned.
     """
 
-    def __init__(self, lookup: "Lookup", start_key: object, start_inclusive: bool,
-                 match_func: Callable[[object], bool]):
+    def __init__(self, lookup: "Lookup", start_key: object = None, end_key: object = None,
+                 start_inclusive: bool = False, end_inclusive: bool = False,
+                 reverse: bool = False):
         """ Construct a new LookupRangeSeek
 
         :param lookup: Lookup that will be searched
-        :param start_key: The starting key to seek to
+        :param start_key: The starting key to seek to, or None to start at the first key
+        :param end_key: The key to end the seek at, or None to end at the last key
         :param start_inclusive: Boolean indicating whether to return items from the start_key
-        :param match_func: Function returning a boolean that indicates whether the key matches
+        :param end_inclusive: Boolean indicating whether to return items from the end_key
+        :param reverse: If True, walk the keys from end_key back to start_key
         """
 
         super().__init__(lookup)
 
         self.start_key = start_key
+        self.end_key = end_key
         self.start_inclusive = start_inclusive
-        self.match_func = match_func
+        self.end_inclusive = end_inclusive
+        self.reverse = reverse
 
     def describe(self) -> dict:
         """ Return a dict description of the Operation """
@@ -186,14 +316,17 @@ class LookupRangeSeek(LookupOperation):
             {
                 "args": {
                     "start_key": self.start_key,
-                    "start_inclusive": self.start_inclusive
+                    "start_inclusive": self.start_inclusive,
+                    "end_key": self.end_key,
+                    "end_inclusive": self.end_inclusive,
+                    "reverse": self.reverse
                 }
             }
         )
 
         return description
 
-    def execute(self, stream, data: "IndexedList") -> Generator[set, None, None]:
+    def execute(self, stream, data: "IndexedList") -> Generator[postings.Posting, None, None]:
         """ Execute the LookupRangeSeek
 
         :param stream: Unused
@@ -202,55 +335,200 @@ class LookupRangeSeek(LookupOperation):
 
         mapping = self.lookup.mapping
 
-        start_position = self.start_position
+        # Keys are stored in sorted order in a SortedDict. A start
+        # or end key of None leaves that end of the range open.
+        keys = mapping.irange(
+            minimum=self.start_key,
+            maximum=self.end_key,
+            inclusive=(self.start_inclusive, self.end_inclusive),
+            reverse=self.reverse
+        )
+
+        yield from (mapping[key] for key in keys)
 
-        # Keys are stored in sorted order in a SortedDict
-        for key in mapping.keys()[start_position:]:
 
-            # If the match_func no longer matches
-            # then we've reached the end of our range
-            # and will not evaluate any more keys
-            if not self.match_func(key):
+class SetOperation(Operation):
+    """ Generic operation combining the row ids found by several operations, for subclassing
+
+    Each input operation yields postings of row ids (as a LookupOperation does). Those
+    are combined into a single set, which is yielded so a SetOperation can be used
+    anywhere a LookupOperation can, including as the input to another SetOperation.
+    """
+
+    def __init__(self, operations: List[Operation]):
+        """ Construct a new SetOperation
+
+        :param operations: Operations yielding postings of row ids to combine
+        """
+
+        self.operations = operations
+
+    def describe(self) -> dict:
+        """ Return a dict description of the Operation """
+
+        description = super().describe()
+
+        description.update(
+            {
+                "inputs": [operation.describe() for operation in self.operations]
+            }
+        )
+
+        return description
+
+    def execute(self, stream: None, data: "IndexedList") -> Generator[set, None, None]:
+        """ Execute the SetOperation
+
+        :param stream: Unused
+        :param data: IndexedList being searched
+        """
+
+        row_id_sets = [
+            self._collect(operation(None, data))
+            for operation in self.operations
+        ]
+
+        yield self.combine(row_id_sets)
+
+    def combine(self, row_id_sets: List[postings.Posting]) -> set:
+        """ Combine the row ids found by each input operation into a single set
+
+        :param row_id_sets: One posting or set of row ids per input operation
+        """
+
+        raise NotImplementedError("Not implemented in base class")
+
+    @staticmethod
+    def _collect(row_id_sets: Iterable[postings.Posting]) -> [postings.Posting, set]:
+        """ Consolidate the postings yielded by an input operation into one set
+
+        A lone posting is returned as-is rather than copied, so it must not be modified.
+
+        :param row_id_sets: Iterable of postings (or sets) of row ids
+        """
+
+        row_id_sets = list(row_id_sets)
+
+        if len(row_id_sets) == 1:
+            return row_id_sets[0]
+
+        return set().union(*(postings.iterate(row_id_set) for row_id_set in row_id_sets))
+
+
+class Intersect(SetOperation):
+    """ Operation yielding the row ids found by ALL of its input operations
+
+    Used to combine lookups for queries joined by &. Sets are intersected
+    smallest first, so the work done is bounded by the most selective input.
+    """
+
+    def combine(self, row_id_sets: List[postings.Posting]) -> set:
+        """ Intersect the row ids found by each input operation
+
+        :param row_id_sets: One posting or set of row ids per input operation
+        """
+
+        row_id_sets = sorted(row_id_sets, key=postings.size)
+
+        result = set(postings.iterate(row_id_sets[0]))
+
+        for row_id_set in row_id_sets[1:]:
+
+            # Nothing further can be added back once the result is empty
+            if not result:
                 break
 
-            yield mapping[key]
+            # Only membership of the (smaller) result is checked, rather than
+            # converting the larger posting into a set
+            result = {
+                row_id
+                for row_id in result
+                if postings.contains(row_id_set, row_id)
+            }
 
-    @property
-    def start_position(self) -> int:
-        """ Find the appropriate starting position in the SortedDict mapping """
+        return result
 
-        # Handles less than/less than equals scenarios where
-        # we have no start_key to seek to
-        if self.start_key is None:
-            return 0
 
-        mapping = self.lookup.mapping
+class Union(SetOperation):
+    """ Operation yielding the row ids found by ANY of its input operations
+
+    Used to combine lookups for queries joined by |.
+    """
+
+    def combine(self, row_id_sets: List[postings.Posting]) -> set:
+        """ Union the row ids found by each input operation
 
-        bisect_func = mapping.bisect_left if self.start_inclusive else mapping.bisect_right
+        :param row_id_sets: One posting or set of row ids per input operation
+        """
 
-        return bisect_func(self.start_key)
+        return set().union(*(postings.iterate(row_id_set) for row_id_set in row_id_sets))
 
 
 class Chain(Operation):
     """ Chain together all stream iterables into a single iterable
 
-    LookupOperation execution returns a generator that yields sets of
-    list indices. We want to consolidate these sets into a single iterable.
+    LookupOperation execution returns a generator that yields postings of
+    row ids. We want to consolidate these postings into a single iterable.
     """
 
-    def execute(self, stream: Generator[set, None, None], data: "IndexedList") -> Iterable[int]:
+    def execute(self, stream: Generator[postings.Posting, None, None],
+                data: "IndexedList") -> Iterable[int]:
         """ Execute the Chain operation
 
-        :param stream: Generator of sets of list indices of items of interest
+        :param stream: Generator of postings of row ids of items of interest
+        :param data: IndexedList being searched
+        """
+
+        return itertools.chain.from_iterable(postings.iterate(posting) for posting in stream)
+
+
+class OrderedChain(Operation):
+    """ Chain together all stream postings into a single iterable ordered by row id
+
+    Row ids are assigned in list order, so the result is in list order (or reverse
+    list order if descending). Postings are merged lazily, so no more row ids are
+    read than are consumed by later operations.
+    """
+
+    def __init__(self, descending: bool = False):
+        """ Construct a new OrderedChain operation
+
+        :param descending: If True, yield row ids from last to first
+        """
+
+        self.descending = descending
+
+    def describe(self) -> dict:
+        """ Return a dict description of the Operation """
+
+        description = super().describe()
+
+        description.update(
+            {
+                "args": {"descending": self.descending}
+            }
+        )
+
+        return description
+
+    def execute(self, stream: Generator[postings.Posting, None, None],
+                data: "IndexedList") -> Iterable[int]:
+        """ Execute the OrderedChain operation
+
+        :param stream: Generator of postings of row ids of items of interest
         :param data: IndexedList being searched
         """
 
-        return itertools.chain(*stream)
+        return heapq.merge(
+            *(postings.iterate_sorted(posting, self.descending) for posting in stream),
+            reverse=self.descending
+        )
 
 
 class FetchItemsByIndices(Operation):
-    """ Operation that fetches items from the data by their indices
+    """ Operation that fetches items from the data by the row ids stored in lookups
 
+    Row ids are translated to their current list indices as they're fetched.
     Returns a generator that yields (list index, item) tuples
     """
 
@@ -258,8 +536,266 @@ class FetchItemsByIndices(Operation):
                 data: "IndexedList") -> Generator[tuple, None, None]:
         """ Execute the fetch operation
 
-        :param stream: Generator yielding list indices of items to return
+        :param stream: Generator yielding row ids of items to return
         :param data: IndexedList being searched
         """
 
-        yield from ((index, data[index]) for index in stream)
+        position_of = data._position_of
+
+        for row_id in stream:
+            index = position_of(row_id)
+
+            yield index, data[index]
+
+
+class Filter(Operation):
+    """ Operation that drops fetched items not matching a pattern
+
+    Used when only part of a compound query could be answered by lookups. The
+    remaining (residual) conditions are checked against each fetched item.
+    """
+
+    def __init__(self, pattern: "Pattern"):
+        """ Construct a new Filter operation
+
+        :param pattern: Pattern each fetched item must match
+        """
+
+        self.pattern = pattern
+
+    def describe(self) -> dict:
+        """ Return a dict description of the Operation """
+
+        description = super().describe()
+
+        description.update(
+            {
+                "args": {"pattern": str(self.pattern)}
+            }
+        )
+
+        return description
+
+    def execute(self, stream: Generator[tuple, None, None],
+                data: "IndexedList") -> Generator[tuple, None, None]:
+        """ Execute the Filter operation
+
+        :param stream: Generator yielding (list index, item) tuples
+        :param data: IndexedList being searched
+        """
+
+        yield from (
+            (index, item)
+            for index, item in stream
+            if self.pattern.matches(item)
+        )
+
+
+class Sort(Operation):
+    """ Operation that sorts fetched items
+
+    Used to order results when no lookup can provide them in the requested
+    order. Items are sorted by a pattern's transformation of each item, or by
+    their list index if no pattern is given. Items the pattern skips are dropped.
+    """
+
+    def __init__(self, pattern: "Pattern" = None, descending: bool = False):
+        """ Construct a new Sort operation
+
+        :param pattern: Pattern whose transformation of each item gives its sort key,
+            or None to sort by list index
+        :param descending: If True, sort from largest to smallest
+        """
+
+        self.pattern = pattern
+        self.descending = descending
+
+    def describe(self) -> dict:
+        """ Return a dict description of the Operation """
+
+        description = super().describe()
+
+        description.update(
+            {
+                "args": {
+                    "key": "index" if self.pattern is None else str(self.pattern),
+                    "descending": self.descending
+                }
+            }
+        )
+
+        return description
+
+    def execute(self, stream: Generator[tuple, None, None],
+                data: "IndexedList") -> Generator[tuple, None, None]:
+        """ Execute the Sort operation
+
+        :param stream: Generator yielding (list index, item) tuples
+        :param data: IndexedList being searched
+        """
+
+        if self.pattern is None:
+            yield from sorted(stream, key=operator.itemgetter(0), reverse=self.descending)
+            return
+
+        match_and_transform = self.pattern.match_and_transform
+
+        keyed = []
+
+        for index, item in stream:
+            key = match_and_transform(item)
+
+            if key is not NO_MATCH:
+                keyed.append((key, index, item))
+
+        # Ties are broken by list index, ascending even when sorting descending
+        keyed.sort(key=operator.itemgetter(1))
+        keyed.sort(key=operator.itemgetter(0), reverse=self.descending)
+
+        yield from ((index, item) for _, index, item in keyed)
+
+
+class Slice(Operation):
+    """ Operation that skips and limits the items returned
+
+    Stops consuming the stream once enough items have been returned, so
+    earlier operations never produce more items than are needed.
+    """
+
+    def __init__(self, offset: int = 0, limit: int = None):
+        """ Construct a new Slice operation
+
+        :param offset: Number of items to skip
+        :param limit: Maximum number of items to return, or None for no limit
+        """
+
+        self.offset = offset
+        self.limit = limit
+
+    def describe(self) -> dict:
+        """ Return a dict description of the Operation """
+
+        description = super().describe()
+
+        description.update(
+            {
+                "args": {
+                    "offset": self.offset,
+                    "limit": self.limit
+                }
+            }
+        )
+
+        return description
+
+    def execute(self, stream: Generator[tuple, None, None],
+                data: "IndexedList") -> Iterable[tuple]:
+        """ Execute the Slice operation
+
+        :param stream: Generator yielding (list index, item) tuples
+        :param data: IndexedList being searched
+        """
+
+        stop = None if self.limit is None else self.offset + self.limit
+
+        return itertools.islice(stream, self.offset, stop)
+
+
+class Instrumented(Operation):
+    """ Wraps an operation to measure it as it runs, used by QueryPlan.analyze()
+
+    Operations stream their results to each other, so the time measured is the time
+    spent producing the operation's output, which includes the time spent in any
+    earlier operations it reads from. The time spent in the operation alone is
+    reported separately as self_time_ms.
+    """
+
+    def __init__(self, operation: Operation, upstream: "Instrumented" = None):
+        """ Construct a new Instrumented operation
+
+        :param operation: Operation to measure
+        :param upstream: Instrumented operation whose output this operation reads, if any
+        """
+
+        # Inputs of a SetOperation are run by the SetOperation itself, so they're
+        # swapped for instrumented copies in a copy of the SetOperation
+        if isinstance(operation, SetOperation):
+            inputs = [Instrumented(input_operation) for input_operation in operation.operations]
+
+            copied = object.__new__(type(operation))
+            copied.__dict__.update(vars(operation))
+            copied.operations = inputs
+            operation = copied
+        else:
+            inputs = []
+
+        self.operation = operation
+        self.upstream = upstream
+        self.inputs = inputs
+
+        # Measurements taken while running
+        self.time = 0.0
+        self.outputs = 0
+        self.row_ids = 0
+
+    def describe(self) -> dict:
+        """ Return a dict description of the Operation, including what was measured """
+
+        description = self.operation.describe()
+        operation = self.operation
+
+        self_time = self.time - sum(input_operation.time for input_operation in self.inputs)
+
+        if self.upstream is not None:
+            self_time -= self.upstream.time
+
+        actual = {
+            "time_ms": self.time * 1000,
+            "self_time_ms": max(self_time, 0) * 1000
+        }
+
+        # Seeks yield one posting for each key found in the lookup
+        if isinstance(operation, (LookupSeek, LookupRangeSeek)):
+            actual["keys_visited"] = self.outputs
+
+        if isinstance(operation, (LookupOperation, SetOperation)):
+            actual["postings"] = self.outputs
+            actual["row_ids"] = self.row_ids
+        elif isinstance(operation, (Chain, OrderedChain)):
+            actual["row_ids"] = self.outputs
+        else:
+            actual["rows"] = self.outputs
+
+        description["actual"] = actual
+
+        return description
+
+    def execute(self, stream: object, data: "IndexedList") -> Generator[object, None, None]:
+        """ Execute the wrapped operation, timing and counting its output
+
+        :param stream: Output from the previous operation, if any
+        :param data: IndexedList being searched
+        """
+
+        counts_row_ids = isinstance(self.operation, (LookupOperation, SetOperation))
+
+        start = time.perf_counter()
+        output = iter(self.operation(stream, data))
+        self.time += time.perf_counter() - start
+
+        while True:
+            start = time.perf_counter()
+
+            try:
+                element = next(output)
+            except StopIteration:
+                self.time += time.perf_counter() - start
+                return
+
+            self.time += time.perf_counter() - start
+            self.outputs += 1
+
+            if counts_row_ids:
+                self.row_ids += postings.size(element)
+
+            yield element
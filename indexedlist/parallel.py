@@ -0,0 +1,326 @@
+""" Evaluation of patterns across a pool of processes
+
+Transformations defined with @Indexable are ordinary Python functions, so running
+them in a single process is limited to one CPU. Instead, the list is split into
+chunks and each chunk is run through the patterns in a separate worker process.
+This is used for full list scans (where workers return only the offsets of
+matching items) and for filling new lookups (where workers return row ids
+grouped by key).
+
+Pools are started the first time they're needed and reused by later scans, with
+one pool for each number of workers. Patterns are pickled once per scan and sent
+with each chunk, but each worker only unpickles them when they change, so a
+query run repeatedly is only rebuilt once in each worker.
+
+Patterns and items must be picklable to be sent to workers, so functions decorated
+with @Indexable need to be defined at the top level of a module. If they can't
+be pickled, the chunks are processed in the current process instead. Chunks and
+results are pickled explicitly, so that errors raised by the patterns themselves
+in a worker can be told apart from pickling errors, and are raised as they are.
+"""
+
+import math
+import os
+import pickle
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Callable, Iterator, List, Sequence, Tuple
+
+from . import patterns
+
+if TYPE_CHECKING:
+    from .core import IndexedList
+    from .patterns import Pattern
+
+# Each worker is given several chunks, so that a slow chunk doesn't leave
+# the other workers idle, but chunks are never smaller than MIN_CHUNK_SIZE
+CHUNKS_PER_WORKER = 4
+MIN_CHUNK_SIZE = 1000
+
+# Errors raised by pickling objects that can't be pickled, such as functions
+# that aren't defined at the top level of a module. Only caught around pickle.dumps().
+_PICKLING_ERRORS = (pickle.PicklingError, AttributeError, TypeError)
+
+# Errors raised by unpickling objects a worker can't find, such as functions
+# added to a module after the worker process started
+_UNPICKLING_ERRORS = (pickle.UnpicklingError, AttributeError, ImportError)
+
+# Returned by a worker in place of a pickled result when it couldn't unpickle
+# the pattern or chunk it was sent, or couldn't pickle its result
+_PAYLOAD_UNPICKLABLE = "payload unpicklable"
+_RESULT_UNPICKLABLE = "result unpicklable"
+
+# Pools of worker processes keyed by number of workers, and the id of the process
+# that started them (a forked child can't use its parent's pools)
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+# Pickled pattern (or sequence of patterns) last sent to the current worker
+# process, and the unpickled pattern
+_worker_payload = None
+_worker_pattern = None
+
+
+def default_workers() -> int:
+    """ Returns the number of worker processes to use if not specified """
+
+    return os.cpu_count() or 1
+
+
+def scan(pattern: "Pattern", data: "IndexedList", workers: int,
+         reverse: bool = False) -> Iterator[int]:
+    """ Find the indices of all items matching a pattern, using a pool of processes
+
+    Indices are yielded in list order (or reverse list order).
+
+    :param pattern: Pattern items must match
+    :param data: IndexedList being searched
+    :param workers: Number of worker processes to use
+    :param reverse: If True, yield indices from the end of the list first
+    """
+
+    items = data._data
+    chunk_size = _chunk_size(len(items), workers)
+    starts = range(0, len(items), chunk_size)
+
+    if reverse:
+        starts = starts[::-1]
+
+    def chunk(start):
+        return items[start:start + chunk_size]
+
+    for start, offsets in zip(starts, _map_chunks(_match_chunk, pattern, starts, chunk, workers)):
+
+        if reverse:
+            offsets = reversed(offsets)
+
+        for offset in offsets:
+            yield start + offset
+
+
+def group_matches(lookup_patterns: Sequence["Pattern"], row_ids: Sequence[int],
+                  items: Sequence[object], workers: int) -> List[dict]:
+    """ Run items through several patterns using a pool of processes, grouping row ids by key
+
+    Returns the same result as patterns.group_matches(): one dict per pattern,
+    mapping each transformed key to a list of the row ids of matching items.
+
+    :param lookup_patterns: Sequence of patterns to match and transform items with
+    :param row_ids: Row ids of the items
+    :param items: Items to run through the patterns, parallel to row_ids
+    :param workers: Number of worker processes to use
+    """
+
+    chunk_size = _chunk_size(len(items), workers)
+    starts = range(0, len(items), chunk_size)
+
+    groups = [{} for _ in lookup_patterns]
+
+    def chunk(start):
+        return row_ids[start:start + chunk_size], items[start:start + chunk_size]
+
+    # Chunks are merged in list order, keeping the row ids under each key sorted
+    for chunk_groups in _map_chunks(_group_chunk, list(lookup_patterns), starts, chunk, workers):
+
+        for grouped, chunk_grouped in zip(groups, chunk_groups):
+
+            for key, key_row_ids in chunk_grouped.items():
+                existing_row_ids = grouped.get(key)
+
+                if existing_row_ids is None:
+                    grouped[key] = key_row_ids
+                else:
+                    existing_row_ids.extend(key_row_ids)
+
+    return groups
+
+
+def _chunk_size(row_count: int, workers: int) -> int:
+    """ Returns the number of items to send to a worker at a time
+
+    :param row_count: Number of items being processed
+    :param workers: Number of worker processes
+    """
+
+    return max(MIN_CHUNK_SIZE, math.ceil(row_count / (workers * CHUNKS_PER_WORKER)))
+
+
+def shutdown():
+    """ Stop the worker processes of every pool
+
+    Pools are started again the next time they're needed.
+    """
+
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.shutdown()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """ Returns the pool with a number of worker processes, starting it if needed
+
+    :param workers: Number of worker processes
+    """
+
+    global _pools_pid
+
+    with _pools_lock:
+
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(workers)
+
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+
+        return pool
+
+
+def _discard_pool(workers: int, pool: ProcessPoolExecutor):
+    """ Stop using a pool whose worker processes have died or are out of date
+
+    Later calls start a new pool. The old pool's processes exit once it's no
+    longer referenced, after finishing any chunks they've been given.
+
+    :param workers: Number of worker processes in the pool
+    :param pool: Pool to stop using
+    """
+
+    with _pools_lock:
+
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+
+
+def _map_chunks(func: Callable, pattern: object, starts: Sequence[int],
+                chunk: Callable[[int], object], workers: int) -> Iterator:
+    """ Apply a function to each chunk of a list across a pool of processes
+
+    Results are yielded in the order of starts. If the pattern, a chunk or its
+    result can't be pickled, a worker can't unpickle the pattern or a chunk, or
+    the pool's processes die, that chunk and the rest are processed in the
+    current process. Errors raised by func are raised as they are.
+
+    :param func: Top-level function taking the pattern and a chunk
+    :param pattern: Pattern (or sequence of patterns) passed to func
+    :param starts: Position in the list of the start of each chunk
+    :param chunk: Function returning the chunk starting at a position
+    :param workers: Number of worker processes to use
+    """
+
+    try:
+        payload = pickle.dumps(pattern, pickle.HIGHEST_PROTOCOL)
+    except _PICKLING_ERRORS:
+        yield from (func(pattern, chunk(start)) for start in starts)
+        return
+
+    pool = _get_pool(workers)
+    futures = []
+    position = 0
+
+    try:
+
+        # Chunks that can't be pickled, and those after them, aren't sent
+        try:
+
+            for start in starts:
+                chunk_payload = pickle.dumps(chunk(start), pickle.HIGHEST_PROTOCOL)
+                futures.append(pool.submit(_run_chunk, func, payload, chunk_payload))
+
+        except _PICKLING_ERRORS:
+            pass
+        except BrokenProcessPool:
+            _discard_pool(workers, pool)
+
+        for future in futures:
+
+            try:
+                result_payload = future.result()
+            except BrokenProcessPool:
+                _discard_pool(workers, pool)
+                break
+
+            # Workers started before the pattern's functions were defined can't
+            # unpickle it, so the pool is replaced for the next call
+            if result_payload == _PAYLOAD_UNPICKLABLE:
+                _discard_pool(workers, pool)
+                break
+
+            if result_payload == _RESULT_UNPICKLABLE:
+                break
+
+            yield pickle.loads(result_payload)
+            position += 1
+
+    finally:
+
+        # Stop workers processing chunks that won't be read
+        for future in futures:
+            future.cancel()
+
+    for start in starts[position:]:
+        yield func(pattern, chunk(start))
+
+
+def _run_chunk(func: Callable, payload: bytes, chunk_payload: bytes) -> bytes:
+    """ Apply a function to a chunk in a worker process
+
+    Returns the pickled result, or _PAYLOAD_UNPICKLABLE or _RESULT_UNPICKLABLE
+    if the pattern or chunk can't be unpickled, or the result can't be pickled.
+
+    :param func: Top-level function taking the pattern and a chunk
+    :param payload: Pickled pattern (or sequence of patterns)
+    :param chunk_payload: Pickled chunk of the list
+    """
+
+    global _worker_payload, _worker_pattern
+
+    try:
+
+        if payload != _worker_payload:
+            _worker_pattern = pickle.loads(payload)
+            _worker_payload = payload
+
+        chunk = pickle.loads(chunk_payload)
+
+    except _UNPICKLING_ERRORS:
+        return _PAYLOAD_UNPICKLABLE
+
+    result = func(_worker_pattern, chunk)
+
+    try:
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except _PICKLING_ERRORS:
+        return _RESULT_UNPICKLABLE
+
+
+def _match_chunk(pattern: "Pattern", items: list) -> List[int]:
+    """ Returns the offsets of items in a chunk that match a pattern
+
+    :param pattern: Pattern items must match
+    :param items: Chunk of items from the list
+    """
+
+    matches = pattern.matches
+
+    return [offset for offset, item in enumerate(items) if matches(item)]
+
+
+def _group_chunk(lookup_patterns: Sequence["Pattern"], chunk: Tuple[Sequence[int], list]) -> List[dict]:
+    """ Group the row ids in a chunk by key, for each of several patterns
+
+    :param lookup_patterns: Sequence of patterns to match and transform items with
+    :param chunk: Tuple of (row ids, items) from the list
+    """
+
+    row_ids, items = chunk
+
+    return patterns.group_matches(lookup_patterns, zip(row_ids, items))
@@ -0,0 +1,127 @@
+""" Placeholders for values supplied when a prepared query is run
+
+A prepared query is planned once, with Params standing in for the values
+it will be compared against:
+
+    by_id = my_list.prepare(my_list.item['id'] == Param('id'))
+
+Each time it's run, the Params in the plan are replaced with the values given:
+
+    results = by_id.run(id=5)
+"""
+
+from typing import Set
+
+
+class Param:
+    """ Represents a named value that will be supplied when a prepared query is run """
+
+    def __init__(self, name: str):
+        """ Construct a new Param
+
+        :param name: Name the value will be supplied under
+        """
+
+        self.name = name
+
+    def __str__(self):
+
+        return f":{self.name}"
+
+    def __repr__(self):
+
+        return f"Param({self.name!r})"
+
+    def __eq__(self, other):
+
+        if not isinstance(other, Param):
+            return NotImplemented
+
+        return self.name == other.name
+
+    def __hash__(self):
+
+        return hash((Param, self.name))
+
+
+class Parameterized:
+    """ Base for the library's objects that may contain Params
+
+    Comparators, patterns and operations subclass this so bind() and find()
+    can tell them apart from values being compared against, which may have
+    bind() methods or params attributes of their own.
+    """
+
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params in the object """
+
+        return set()
+
+    def bind(self, values: dict) -> "Parameterized":
+        """ Return a copy of the object with any Params replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        return self
+
+
+def bind(value: object, values: dict) -> object:
+    """ Replace any Params in a value with the values supplied for them
+
+    Handles Params themselves, lists and tuples that may contain Params, and
+    Parameterized objects (such as patterns and operations). Anything else
+    is a literal and is returned unchanged.
+
+    Values without Params are returned as they are, rather than copied.
+
+    :param value: Value that may be or contain Params
+    :param values: Dict mapping Param names to their values
+    """
+
+    if isinstance(value, Param):
+        return values[value.name]
+
+    if isinstance(value, (list, tuple)):
+        bound = [bind(element, values) for element in value]
+
+        if all(bound_element is element for bound_element, element in zip(bound, value)):
+            return value
+
+        return type(value)(bound)
+
+    if isinstance(value, Parameterized):
+        return value.bind(values)
+
+    return value
+
+
+def names(*values: object) -> Set[str]:
+    """ Returns the names of any Params among the values
+
+    :param values: Values to check
+    """
+
+    return {value.name for value in values if isinstance(value, Param)}
+
+
+def find(value: object) -> Set[str]:
+    """ Returns the names of any Params in a value
+
+    Searches the same places as bind(): Params themselves, lists and tuples,
+    and Parameterized objects (such as patterns and operations).
+
+    :param value: Value that may be or contain Params
+    """
+
+    if isinstance(value, Param):
+        return {value.name}
+
+    if isinstance(value, (list, tuple)):
+        return set().union(*(find(element) for element in value))
+
+    if isinstance(value, Parameterized):
+        return value.params
+
+    return set()
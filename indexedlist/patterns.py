@@ -14,21 +14,32 @@ A SearchPattern is very similar but also includes a comparison:
     my_list.item['a'] == "foo"
     do_something(my_list.item).in_(1, 5, 7)
 
+SearchPatterns can be combined into compound patterns using & (and),
+| (or) and ~ (not):
+
+    (my_list.item['a'] == "foo") & (my_list.item['b'] > 10)
+
 Patterns are used when creating lookups (at which time all elements
 are run through the pattern and transformed or filtered out as appropriate)
 and when searching.
 """
 
-from typing import TYPE_CHECKING
+import copy
+
+from typing import TYPE_CHECKING, Iterable, List, Sequence, Set, Tuple
 
 from . import exc
+from . import params
 
 if TYPE_CHECKING:
     from .core import TransformationCollection
     from .comparators import Comparator
 
+# Returned by match_and_transform() when an item does not match a pattern
+NO_MATCH = object()
 
-class Pattern:
+
+class Pattern(params.Parameterized):
     """ Represents a generic pattern, used for subclassing """
 
     def __init__(self, transformations: "TransformationCollection"):
@@ -43,13 +54,60 @@ class Pattern:
 
         return str(self.transformations)
 
+    def __and__(self, other):
+
+        return AndPattern((self, _to_pattern(other)))
+
+    def __or__(self, other):
+
+        return OrPattern((self, _to_pattern(other)))
+
+    def __invert__(self):
+
+        return NotPattern(self)
+
+    def __eq__(self, other):
+
+        if not isinstance(other, Pattern):
+            return NotImplemented
+
+        return self.key == other.key
+
+    def __hash__(self):
+
+        return hash(self.key)
+
+    @property
+    def key(self) -> tuple:
+        """ Tuple identifying the pattern's structure, transformations and values
+
+        Patterns with equal keys match the same items. The key (and so the
+        pattern) is only hashable if all of the values compared against are.
+        """
+
+        return type(self), self.transformations.signature
+
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params standing in for values the pattern compares against """
+
+        return set()
+
+    def bind(self, values: dict) -> "Pattern":
+        """ Return a copy of the pattern with any Params replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        return self
+
     def transform(self, item: object) -> object:
         """ Run an item through all transformation functions and return the altered value
 
         :param item: Item to transform according to pattern
         """
 
-        return self.transformations.apply(item)
+        return self.transformations.compiled(item)
 
     def matches(self, item: object) -> bool:
         """ Returns a boolean indicating if the item can match the provided pattern
@@ -57,6 +115,17 @@ class Pattern:
         :param item: Item to test against the pattern
         """
 
+        return self.match_and_transform(item) is not NO_MATCH
+
+    def match_and_transform(self, item: object) -> object:
+        """ Transform an item, returning NO_MATCH instead if the item doesn't match
+
+        Transformations are applied only once, so this should be preferred over
+        calling matches() followed by transform().
+
+        :param item: Item to test against the pattern and transform
+        """
+
         raise NotImplementedError("Not implemented in base class")
 
     def handles(self, pattern: "SearchPattern") -> bool:
@@ -90,20 +159,18 @@ class IndexerPattern(Pattern):
         do_something(my_list.item)
     """
 
-    def matches(self, item: object) -> bool:
-        """ Returns a boolean indicating if the item can match the provided pattern
+    def match_and_transform(self, item: object) -> object:
+        """ Transform an item, returning NO_MATCH instead if the item doesn't match
 
-        :param item: Item to test against the IndexerPattern
+        :param item: Item to test against the IndexerPattern and transform
         """
 
         # Skipped items should not be returned
         # Everything else should match the pattern
         try:
-            self.transformations.apply(item)
+            return self.transformations.compiled(item)
         except exc.SkipItem:
-            return False
-
-        return True
+            return NO_MATCH
 
     def handles(self, pattern: "SearchPattern") -> bool:
         """ Returns True if this pattern is compatible with a given SearchPattern
@@ -140,19 +207,60 @@ class SearchPattern(Pattern):
 
         return f"{super().__str__()}{str(self.comparator)}"
 
+    @property
+    def key(self) -> tuple:
+        """ Tuple identifying the pattern's transformations, comparator and values """
+
+        return type(self), self.transformations.signature, type(self.comparator), self.comparator.key
+
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params standing in for values the pattern compares against """
+
+        return self.comparator.params
+
+    def bind(self, values: dict) -> "SearchPattern":
+        """ Return a copy of the pattern with any Params replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        if not self.comparator.params:
+            return self
+
+        return SearchPattern(self.transformations, self.comparator.bind(values))
+
     def matches(self, item: object) -> bool:
         """ Returns a boolean indicating if the item can match the provided pattern
 
-        :param item: Item to test against the SearchPattern
+        Called for every item in a full list scan, so avoids match_and_transform().
+
+        :param item: Item to test against the pattern
         """
 
         try:
-            transformed_item = self.transformations.apply(item)
+            transformed_item = self.transformations.compiled(item)
         except exc.SkipItem:
             return False
 
         return self.comparator.matches(transformed_item)
 
+    def match_and_transform(self, item: object) -> object:
+        """ Transform an item, returning NO_MATCH instead if the item doesn't match
+
+        :param item: Item to test against the SearchPattern and transform
+        """
+
+        try:
+            transformed_item = self.transformations.compiled(item)
+        except exc.SkipItem:
+            return NO_MATCH
+
+        if self.comparator.matches(transformed_item):
+            return transformed_item
+
+        return NO_MATCH
+
     def handles(self, pattern: "SearchPattern") -> bool:
         """ Returns True if this pattern is compatible with a given SearchPattern
 
@@ -164,4 +272,227 @@ class SearchPattern(Pattern):
         :param pattern: SearchPattern to compare signatures and value ranges against
         """
 
+        # Values that won't be known until a prepared query runs can't be shown to be covered
+        if pattern.comparator.params:
+            return False
+
         return self._shares_signature(pattern) and self.comparator.covers(pattern.comparator)
+
+
+class CompoundPattern(Pattern):
+    """ Generic pattern combining other patterns, meant for subclassing
+
+    Compound patterns have no transformations of their own, so they
+    can be searched for but can't be used to define a Lookup.
+    """
+
+    # Symbol used to join sub-patterns when describing the pattern
+    operator = None
+
+    def __init__(self, patterns: Iterable[Pattern]):
+        """ Construct a new CompoundPattern
+
+        :param patterns: Patterns being combined
+        """
+
+        self.transformations = None
+        self.patterns = []
+
+        # Nested patterns of the same type are flattened, so that
+        # a & b & c is held as one pattern with three parts
+        for pattern in patterns:
+
+            if type(pattern) is type(self):
+                self.patterns.extend(pattern.patterns)
+            else:
+                self.patterns.append(pattern)
+
+    def __str__(self):
+
+        return f" {self.operator} ".join(f"({pattern})" for pattern in self.patterns)
+
+    @property
+    def key(self) -> tuple:
+        """ Tuple identifying the pattern's type and the keys of its sub-patterns """
+
+        return (type(self),) + tuple(pattern.key for pattern in self.patterns)
+
+    @property
+    def params(self) -> Set[str]:
+        """ Names of any Params standing in for values the sub-patterns compare against """
+
+        return set().union(*(pattern.params for pattern in self.patterns))
+
+    def bind(self, values: dict) -> "CompoundPattern":
+        """ Return a copy of the pattern with any Params replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        bound = copy.copy(self)
+        bound.patterns = [pattern.bind(values) for pattern in self.patterns]
+
+        return bound
+
+    def transform(self, item: object) -> object:
+        """ Not supported, as a compound pattern has no transformations of its own
+
+        :param item: Item to transform according to pattern
+        """
+
+        raise NotImplementedError("Compound patterns do not transform items")
+
+    def match_and_transform(self, item: object) -> object:
+        """ Not supported, as a compound pattern has no transformations of its own
+
+        :param item: Item to test against the pattern and transform
+        """
+
+        raise NotImplementedError("Compound patterns do not transform items")
+
+    def handles(self, pattern: "SearchPattern") -> bool:
+        """ Returns False, as compound patterns are never used to define lookups
+
+        :param pattern: SearchPattern to compare signatures and value ranges against
+        """
+
+        return False
+
+
+class AndPattern(CompoundPattern):
+    """ Represents a pattern matching items that match all of its sub-patterns
+
+    Created by combining patterns with &:
+
+        (my_list.item['a'] == 1) & (my_list.item['b'] > 10)
+    """
+
+    operator = "&"
+
+    def matches(self, item: object) -> bool:
+        """ Returns True if the item matches every sub-pattern
+
+        :param item: Item to test against the AndPattern
+        """
+
+        return all(pattern.matches(item) for pattern in self.patterns)
+
+
+class OrPattern(CompoundPattern):
+    """ Represents a pattern matching items that match any of its sub-patterns
+
+    Created by combining patterns with |:
+
+        (my_list.item['a'] == 1) | (my_list.item['b'] > 10)
+    """
+
+    operator = "|"
+
+    def matches(self, item: object) -> bool:
+        """ Returns True if the item matches at least one sub-pattern
+
+        :param item: Item to test against the OrPattern
+        """
+
+        return any(pattern.matches(item) for pattern in self.patterns)
+
+
+class NotPattern(CompoundPattern):
+    """ Represents a pattern matching items that do not match its sub-pattern
+
+    Created by inverting a pattern with ~. Note that items skipped by the
+    sub-pattern's transformations (such as dicts missing a key) do not
+    match the sub-pattern, and so DO match the NotPattern:
+
+        ~(my_list.item['a'] == 1)
+    """
+
+    def __init__(self, pattern: Pattern):
+        """ Construct a new NotPattern
+
+        :param pattern: Pattern being inverted
+        """
+
+        # Not flattened like other compound patterns, as ~~a is not ~a
+        self.transformations = None
+        self.patterns = [pattern]
+
+    def __str__(self):
+
+        return f"~({self.patterns[0]})"
+
+    def __invert__(self):
+
+        return self.patterns[0]
+
+    def matches(self, item: object) -> bool:
+        """ Returns True if the item does not match the sub-pattern
+
+        :param item: Item to test against the NotPattern
+        """
+
+        return not self.patterns[0].matches(item)
+
+
+def _to_pattern(query: object) -> Pattern:
+    """ Convert an ItemProxy into a pattern, passing patterns through unchanged
+
+    :param query: ItemProxy or Pattern to convert
+    """
+
+    try:
+        return query.pattern
+    except AttributeError:
+        return query
+
+
+def seekable_patterns(pattern: Pattern) -> List["SearchPattern"]:
+    """ Returns the SearchPatterns within a pattern that a lookup could serve
+
+    These are the pattern itself or the parts of AndPatterns and OrPatterns,
+    but not anything inverted by a NotPattern, as lookups only hold the items
+    that match their pattern.
+
+    :param pattern: Pattern to search within
+    """
+
+    found = []
+    remaining = [pattern]
+
+    for pattern in remaining:
+
+        if isinstance(pattern, (AndPattern, OrPattern)):
+            remaining.extend(pattern.patterns)
+        elif isinstance(pattern, SearchPattern):
+            found.append(pattern)
+
+    return found
+
+
+def group_matches(patterns: Sequence[Pattern], rows: Iterable[Tuple[int, object]]) -> List[dict]:
+    """ Run rows through several patterns in a single pass, grouping row ids by key
+
+    Returns one dict per pattern, mapping each transformed key to a list of the
+    row ids of the items that matched. Used when filling lookups, so that
+    adding items to several lookups only walks the items once.
+
+    :param patterns: Sequence of patterns to match and transform items with
+    :param rows: Iterable of (row id, item) tuples
+    """
+
+    groups = [{} for _ in patterns]
+    matchers = [
+        (pattern.match_and_transform, grouped)
+        for pattern, grouped in zip(patterns, groups)
+    ]
+
+    for row_id, item in rows:
+
+        for match_and_transform, grouped in matchers:
+            key = match_and_transform(item)
+
+            # Don't store items that the pattern does not match
+            if key is not NO_MATCH:
+                grouped.setdefault(key, []).append(row_id)
+
+    return groups
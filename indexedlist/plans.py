@@ -1,15 +1,30 @@
 """ Holds classes and functions related to query plans and their generation """
 
 import json
+import time
 
-from typing import Generator, Iterable, Callable, List, TYPE_CHECKING
+from typing import Dict, Generator, Iterable, List, Optional, Tuple, TYPE_CHECKING
 
 from . import comparators as cmps
 from . import operations as ops
+from . import patterns
+from . import postings
+
+# Pass as order_by to return results in list order
+ORDER_BY_INDEX = "index"
+
+# Relative costs used to choose between lookups and scans. Scanning costs
+# SCAN_ROW_COST per item plus one per transformation applied to the item,
+# while each item found in a lookup costs FETCH_ROW_COST to retrieve.
+SCAN_ROW_COST = 1.0
+FETCH_ROW_COST = 1.5
 
 if TYPE_CHECKING:
-    from .core import IndexedList, Lookup, ItemProxy
-    from .patterns import SearchPattern
+    from .core import IndexedList, Lookup, LookupCollection, ItemProxy
+    from .patterns import Pattern, IndexerPattern, SearchPattern, AndPattern, OrPattern
+
+# Lists of lookups keyed by the signature of their transformations
+LookupsBySignature = Dict[int, List["Lookup"]]
 
 
 class QueryPlan:
@@ -20,15 +35,18 @@ class QueryPlan:
     to fulfill a search (if any) which is useful for debugging.
     """
 
-    def __init__(self, query: "SearchPattern"):
+    def __init__(self, query: "Pattern"):
         """ Construct a new QueryPlan
 
-        :param query: SearchPattern representing the data requested by the end user
+        :param query: Pattern representing the data requested by the end user
         """
 
         self.query = query
         self.operations = []
 
+        # Positions of operations holding Params, found when first bound
+        self._param_operations = None
+
     def __str__(self):
 
         return str(self.describe())
@@ -37,6 +55,8 @@ class QueryPlan:
 
         self.operations.extend(other)
 
+        return self
+
     def append(self, operation: ops.Operation):
         """ Append an Operation to the query plan
 
@@ -60,6 +80,69 @@ class QueryPlan:
 
         return result
 
+    def count(self, data: "IndexedList") -> int:
+        """ Count the items the query plan would return, without fetching them if possible
+
+        :param data: IndexedList to execute plan against
+        """
+
+        if self.answered_by_lookups:
+            return sum(postings.size(posting) for posting in self.operations[0](None, data))
+
+        return sum(1 for _ in self.execute(data))
+
+    def exists(self, data: "IndexedList") -> bool:
+        """ Returns True if the query plan would return any items, stopping at the first
+
+        :param data: IndexedList to execute plan against
+        """
+
+        if self.answered_by_lookups:
+            return any(postings.size(posting) for posting in self.operations[0](None, data))
+
+        return next(iter(self.execute(data)), None) is not None
+
+    @property
+    def answered_by_lookups(self) -> bool:
+        """ Returns True if the row ids found in lookups are exactly the items to return
+
+        This is the case when the plan starts from lookups and has no residual
+        conditions to check against the fetched items.
+        """
+
+        if not self.operations:
+            return False
+
+        if not isinstance(self.operations[0], (ops.LookupOperation, ops.SetOperation)):
+            return False
+
+        return not any(
+            isinstance(operation, (ops.Filter, ops.Slice))
+            for operation in self.operations
+        )
+
+    def bind(self, values: dict) -> "QueryPlan":
+        """ Return a copy of the query plan with any Params in its operations replaced by values
+
+        :param values: Dict mapping Param names to their values
+        """
+
+        # Find the operations holding Params once, as a plan is usually bound many times
+        if self._param_operations is None:
+            self._param_operations = [
+                position for position, operation in enumerate(self.operations)
+                if operation.params
+            ]
+
+        # The query is only used to describe the plan, so it's left unbound
+        bound_plan = QueryPlan(self.query)
+        bound_plan += self.operations
+
+        for position in self._param_operations:
+            bound_plan.operations[position] = self.operations[position].bind(values)
+
+        return bound_plan
+
     def describe(self) -> dict:
         """ Returns a dict describing the query plan """
 
@@ -68,18 +151,86 @@ class QueryPlan:
             "operations": [operation.describe() for operation in self.operations]
         }
 
-    def pretty(self):
-        """ Print a JSON description of the query plan """
+    def analyze(self, data: "IndexedList") -> dict:
+        """ Run the query plan and describe it along with what each operation did
+
+        Returns the same structure as describe(), with an "actual" dict added to each
+        operation holding the time spent producing its output, the time spent in the
+        operation alone, and how many rows (or keys, postings and row ids, for
+        operations on lookups) it produced. All results are read and discarded.
+        Measuring adds a little overhead to every row, so times are somewhat
+        higher than when the plan is executed normally.
+
+        :param data: IndexedList to execute plan against
+        """
+
+        instrumented = []
+        result = None
+
+        with data._lock.read():
+            start = time.perf_counter()
+
+            for operation in self.operations:
+                instrumented.append(ops.Instrumented(operation, instrumented[-1] if instrumented else None))
+                result = instrumented[-1](result, data)
+
+            rows_returned = sum(1 for _ in result)
+
+            elapsed = time.perf_counter() - start
+
+        return {
+            "query": str(self.query),
+            "operations": [operation.describe() for operation in instrumented],
+            "actual": {
+                "time_ms": elapsed * 1000,
+                "rows": rows_returned
+            }
+        }
+
+    def pretty(self, data: "IndexedList" = None):
+        """ Print a JSON description of the query plan
+
+        :param data: If given, run the plan against this IndexedList and include
+            what each operation did, as described in analyze()
+        """
 
         description = json.dumps(
-            self.describe(),
-            indent=2
+            self.describe() if data is None else self.analyze(data),
+            indent=2,
+            default=str
         )
 
         print(description)
 
 
-def create(query: ["ItemProxy", "SearchPattern"], lookups: Iterable["Lookup"]):
+def shape(query: "Pattern", order_by: ["IndexerPattern", str] = None, descending: bool = False,
+          limit: int = None, offset: int = 0) -> tuple:
+    """ Returns a key identifying queries that would be given the same plan
+
+    Queries with the same transformations, comparators, values (or Params in
+    place of values) and ordering share a shape. The key is only hashable if
+    all of the values are.
+
+    :param query: Pattern representing the query
+    :param order_by: IndexerPattern giving the key to order results by,
+        ORDER_BY_INDEX, or None for no particular order
+    :param descending: If True, order results from largest to smallest
+    :param limit: Maximum number of results to return, or None for no limit
+    :param offset: Number of results to skip
+    """
+
+    if order_by is None or isinstance(order_by, str):
+        order_shape = order_by
+    else:
+        order_shape = order_by.key
+
+    return query.key, order_shape, descending, limit, offset
+
+
+def create(query: ["ItemProxy", "Pattern"], lookups: [Iterable["Lookup"], "LookupCollection"],
+           row_count: int = None, order_by: ["ItemProxy", "Pattern", str] = None,
+           descending: bool = False, limit: int = None, offset: int = 0,
+           scan_workers: int = None):
     """ Construct a query plan that dictates how the search will be conducted
 
         Construct queries using .item in the following manner (where my_list is your
@@ -89,136 +240,626 @@ def create(query: ["ItemProxy", "SearchPattern"], lookups: Iterable["Lookup"]):
             results = my_list.search(my_list.item > 100)
             results = my_list.search(my_list.item.in_(1, 2, 3))
 
-        :param query: ItemProxy or SearchPattern representing the query to plan
-        :param lookups: Iterable of lookups to consider when designing plan
+        :param query: ItemProxy or Pattern representing the query to plan
+        :param lookups: LookupCollection or iterable of lookups to consider when designing plan
+        :param row_count: Number of items in the list, or None to always prefer lookups
+        :param order_by: ItemProxy or IndexerPattern giving the key to order results by,
+            ORDER_BY_INDEX to order them by list index, or None for no particular order
+        :param descending: If True, order results from largest to smallest
+        :param limit: Maximum number of results to return, or None for no limit
+        :param offset: Number of results to skip
+        :param scan_workers: Number of processes to split a full list scan across,
+            or None to scan in the current process
         """
 
     # We need to construct a SearchPattern if we've been provided an
     # ItemProxy
-    try:
-        query = query.pattern
-    except AttributeError:
-        pass
+    query = patterns._to_pattern(query)
+
+    # Only lookups sharing a query's transformations can serve it,
+    # so lookups are found by the signature of their transformations
+    lookups = _lookups_by_signature(lookups)
 
     # Construct the query plan
     query_plan = QueryPlan(query)
 
-    # Find a lookup that can support the search
-    lookup = _find_lookup_for_search(
-        query=query,
-        lookups=lookups
-    )
+    if order_by is None:
+        _add_unordered_operations_to_plan(
+            query_plan=query_plan,
+            lookups=lookups,
+            row_count=row_count
+        )
+    elif isinstance(order_by, str):
 
-    # Choose either a seek or a scan, depending on
-    # whether a lookup was found
-    if lookup is not None:
-        _add_lookup_operations_to_plan(
+        # Comparing an ItemProxy with == would build a query, so only compare strings
+        if order_by != ORDER_BY_INDEX:
+            raise ValueError(f"Unknown order: {order_by}")
+
+        _add_index_ordered_operations_to_plan(
             query_plan=query_plan,
-            lookup=lookup
+            lookups=lookups,
+            row_count=row_count,
+            descending=descending
         )
     else:
-        _add_data_scan_to_plan(query_plan)
+        order_by = patterns._to_pattern(order_by)
+
+        if not isinstance(order_by, patterns.IndexerPattern):
+            raise ValueError(f"Cannot order results by a comparison: {order_by}")
+
+        _add_key_ordered_operations_to_plan(
+            query_plan=query_plan,
+            lookups=lookups,
+            row_count=row_count,
+            order_by=order_by,
+            descending=descending,
+            limit=limit,
+            offset=offset
+        )
+
+    # Split a full list scan across worker processes
+    first_operation = query_plan.operations[0]
+
+    if scan_workers and scan_workers > 1 and isinstance(first_operation, ops.DataScan):
+        first_operation.workers = scan_workers
+
+    # Stop retrieving results once enough have been found
+    if limit is not None or offset:
+        query_plan.append(ops.Slice(offset, limit))
 
     return query_plan
 
 
-def _find_lookup_for_search(query: "SearchPattern", lookups: Iterable["Lookup"]) -> "Lookup":
-    """ Find a lookup that can fulfill a query
+def _lookups_by_signature(lookups: [Iterable["Lookup"], "LookupCollection"]) -> LookupsBySignature:
+    """ Returns lists of lookups keyed by the signature of their transformations
 
-    :param query: SearchPattern defining what data to search for
-    :param lookups: Iterable of lookups to search through
+    A LookupCollection keeps this index up to date, so it's used as it is.
+
+    :param lookups: LookupCollection or iterable of lookups
     """
 
-    # Interrogate lookups until one responds it can handle the
-    # provided query
+    by_signature = getattr(lookups, "by_signature", None)
+
+    if by_signature is not None:
+        return by_signature
+
+    by_signature = {}
+
     for lookup in lookups:
+        by_signature.setdefault(lookup.pattern.transformations.signature, []).append(lookup)
+
+    return by_signature
+
+
+def lookups_to_build(query: ["ItemProxy", "Pattern"], lookups: [Iterable["Lookup"], "LookupCollection"],
+                     order_by: ["ItemProxy", "Pattern", str] = None) -> List["Lookup"]:
+    """ Find lookups that aren't ready yet which the planner could use for a query
+
+    These are the lookups able to serve a comparison in the query that isn't
+    inverted by a NotPattern, and sorted lookups on the ordering key.
+
+    :param query: ItemProxy or Pattern representing the query
+    :param lookups: LookupCollection or iterable of lookups to consider
+    :param order_by: ItemProxy or IndexerPattern giving the key to order results by,
+        ORDER_BY_INDEX, or None for no particular order
+    """
+
+    lookups = _lookups_by_signature(lookups)
+    found = []
+
+    for pattern in patterns.seekable_patterns(patterns._to_pattern(query)):
+
+        discrete_query = isinstance(pattern.comparator, (cmps.EqualsComparator, cmps.InComparator))
+
+        found.extend(
+            lookup for lookup in lookups.get(pattern.transformations.signature, ())
+            if not lookup.ready and (lookup.ordered or discrete_query) and lookup.handles(pattern)
+        )
+
+    if order_by is not None and not isinstance(order_by, str):
+        order_by = patterns._to_pattern(order_by)
 
-        if lookup.handles(query):
-            return lookup
+        found.extend(
+            lookup for lookup in lookups.get(order_by.transformations.signature, ())
+            if not lookup.ready and lookup.ordered
+        )
 
+    return found
 
-def _add_lookup_operations_to_plan(query_plan: "QueryPlan", lookup: "Lookup"):
-    """ Request a lookup to generate operations for retrieving the desired data
+
+def _add_unordered_operations_to_plan(query_plan: "QueryPlan", lookups: LookupsBySignature,
+                                      row_count: int = None):
+    """ Add operations retrieving the query's results in no particular order
 
     :param query_plan: QueryPlan object operations will be appended to
-    :param lookup: Lookup to use for retrieving data
+    :param lookups: Lists of lookups to consider, keyed by transformation signature
+    :param row_count: Number of items in the list, or None to always prefer lookups
     """
 
-    comparator = query_plan.query.comparator
+    # Find lookups that can support all or part of the search
+    seek, residual = _create_seek_for_pattern(
+        pattern=query_plan.query,
+        lookups=lookups,
+        row_count=row_count
+    )
 
-    # Determine whether we're seeking to specific items or
-    # seeking across a range (>, <, etc queries)
-    if isinstance(comparator, cmps.RangeComparator):
-        _add_range_seek_to_plan(
-            lookup=lookup,
+    # Choose either a seek or a scan, depending on
+    # whether any lookups were found
+    if seek is not None:
+        _add_lookup_operations_to_plan(
             query_plan=query_plan,
-            match_func=comparator.matches,
-            start_key=comparator.start_key,
-            start_inclusive=comparator.start_inclusive
+            seek=seek,
+            residual=residual
         )
     else:
-        _add_lookup_seek_to_plan(
-            lookup=lookup,
+        _add_data_scan_to_plan(
             query_plan=query_plan,
-            keys=comparator.values
+            row_count=row_count
         )
 
-    # These operations transform sets of list indices into our final output:
-    # A generator that yields (list index, item) tuples
-    fetch_operations = [
-        ops.Chain(),
-        ops.FetchItemsByIndices()
+
+def _add_index_ordered_operations_to_plan(query_plan: "QueryPlan", lookups: LookupsBySignature,
+                                          row_count: int = None, descending: bool = False):
+    """ Add operations retrieving the query's results in list order
+
+    Row ids are assigned in list order, so results from lookups are put in
+    order by lazily merging their postings, and scans simply walk the list
+    in the requested direction.
+
+    :param query_plan: QueryPlan object operations will be appended to
+    :param lookups: Lists of lookups to consider, keyed by transformation signature
+    :param row_count: Number of items in the list, or None to always prefer lookups
+    :param descending: If True, return results from the end of the list first
+    """
+
+    seek, residual = _create_seek_for_pattern(
+        pattern=query_plan.query,
+        lookups=lookups,
+        row_count=row_count
+    )
+
+    if seek is not None:
+        _add_lookup_operations_to_plan(
+            query_plan=query_plan,
+            seek=seek,
+            residual=residual,
+            chain=ops.OrderedChain(descending)
+        )
+    else:
+        _add_data_scan_to_plan(
+            query_plan=query_plan,
+            row_count=row_count,
+            reverse=descending
+        )
+
+
+def _add_key_ordered_operations_to_plan(query_plan: "QueryPlan", lookups: LookupsBySignature,
+                                        order_by: "IndexerPattern", row_count: int = None,
+                                        descending: bool = False, limit: int = None,
+                                        offset: int = 0):
+    """ Add operations retrieving the query's results ordered by a key
+
+    Where possible, results are streamed in order from a sorted lookup on the
+    ordering key, either by seeking the part of the query it handles or by walking
+    every key and filtering. Otherwise the results are found as usual and sorted.
+
+    :param query_plan: QueryPlan object operations will be appended to
+    :param lookups: Lists of lookups to consider, keyed by transformation signature
+    :param order_by: IndexerPattern giving the key to order results by
+    :param row_count: Number of items in the list, or None to always prefer lookups
+    :param descending: If True, order results from largest to smallest
+    :param limit: Maximum number of results that will be returned, or None for no limit
+    :param offset: Number of results that will be skipped
+    """
+
+    query = query_plan.query
+
+    order_lookups = [
+        lookup for lookup in lookups.get(order_by.transformations.signature, ())
+        if lookup.ordered and lookup.ready
     ]
 
-    query_plan += fetch_operations
+    # Best case: a lookup on the ordering key handles (part of) the query, so
+    # seeking it returns the matching items already in order
+    for lookup in order_lookups:
+        sub_pattern, residual = _split_pattern_for_lookup(query, lookup)
+
+        if sub_pattern is None:
+            continue
+
+        seek = _create_lookup_seek(sub_pattern, lookup, in_key_order=True, reverse=descending)
+        seek.estimated_rows = lookup.estimate_rows(sub_pattern.comparator)
+
+        _add_lookup_operations_to_plan(
+            query_plan=query_plan,
+            seek=seek,
+            residual=residual
+        )
+
+        return
+
+    seek, residual = _create_seek_for_pattern(
+        pattern=query,
+        lookups=lookups,
+        row_count=row_count
+    )
+
+    # Otherwise a lookup holding every item can be walked in order, checking each
+    # item against the query, if that's expected to be cheaper than sorting
+    for lookup in order_lookups:
+
+        if not isinstance(lookup.pattern, patterns.IndexerPattern):
+            continue
 
+        if not _ordered_walk_is_cheaper(seek, row_count, limit, offset):
+            break
 
-def _add_lookup_seek_to_plan(lookup: "Lookup", query_plan: "QueryPlan", keys: List[object]):
-    """ Add an operation for looking up specific items to a query plan
+        walk = ops.LookupRangeSeek(lookup, reverse=descending)
+        walk.estimated_rows = lookup.row_count
 
-    :param lookup: Lookup being searched
-    :param query_plan: Query plan to append operation to
-    :param keys: List of keys to search for in lookup
+        _add_lookup_operations_to_plan(
+            query_plan=query_plan,
+            seek=walk,
+            residual=query
+        )
+
+        return
+
+    if seek is not None:
+        _add_lookup_operations_to_plan(
+            query_plan=query_plan,
+            seek=seek,
+            residual=residual
+        )
+    else:
+        _add_data_scan_to_plan(
+            query_plan=query_plan,
+            row_count=row_count
+        )
+
+    query_plan.append(ops.Sort(order_by, descending))
+
+
+def _split_pattern_for_lookup(pattern: "Pattern", lookup: "Lookup") -> Tuple[Optional["SearchPattern"],
+                                                                           Optional["Pattern"]]:
+    """ Find the part of a pattern a lookup can seek, returning it and the remaining pattern
+
+    Returns (None, None) if the lookup can't handle the pattern or any part of it.
+
+    :param pattern: Pattern defining what data to search for
+    :param lookup: Lookup to seek
     """
 
-    operation = ops.LookupSeek(
-        lookup=lookup,
-        keys=keys
+    if isinstance(pattern, patterns.SearchPattern) and lookup.handles(pattern):
+        return pattern, None
+
+    if not isinstance(pattern, patterns.AndPattern):
+        return None, None
+
+    for position, sub_pattern in enumerate(pattern.patterns):
+
+        if isinstance(sub_pattern, patterns.SearchPattern) and lookup.handles(sub_pattern):
+            remaining = pattern.patterns[:position] + pattern.patterns[position + 1:]
+            residual = remaining[0] if len(remaining) == 1 else patterns.AndPattern(remaining)
+
+            return sub_pattern, residual
+
+    return None, None
+
+
+def _ordered_walk_is_cheaper(seek: Optional[ops.Operation], row_count: int = None,
+                             limit: int = None, offset: int = 0) -> bool:
+    """ Returns True if walking a lookup in order should be cheaper than finding and sorting
+
+    :param seek: Operation that would otherwise find the results, or None for a scan
+    :param row_count: Number of items in the list, or None if not known
+    :param limit: Maximum number of results that will be returned, or None for no limit
+    :param offset: Number of results that will be skipped
+    """
+
+    # Walking reads no more than a scan would, and avoids the sort
+    if seek is None:
+        return True
+
+    if limit is None or row_count is None:
+        return False
+
+    # Assuming matches are spread evenly across the ordering key, this
+    # is how many items will be walked before enough results are found
+    walked_rows = (offset + limit) * row_count / max(seek.estimated_rows, 1)
+
+    return walked_rows < seek.estimated_rows
+
+
+def _create_seek_for_pattern(pattern: "Pattern", lookups: LookupsBySignature,
+                             row_count: int = None) -> Tuple[Optional[ops.Operation],
+                                                             Optional["Pattern"]]:
+    """ Create an operation finding the row ids of items that may match a pattern
+
+    Returns a tuple of (operation, residual pattern). The operation yields sets of
+    row ids, or is None if lookups can't be used for the pattern (or a scan would be
+    cheaper). The residual pattern holds any conditions the operation doesn't account
+    for, which must be checked against the fetched items, or is None if the
+    operation's results are exact.
+
+    :param pattern: Pattern defining what data to search for
+    :param lookups: Lists of lookups to search through, keyed by transformation signature
+    :param row_count: Number of items in the list, or None to always prefer lookups
+    """
+
+    if isinstance(pattern, patterns.AndPattern):
+        return _create_seek_for_and(pattern, lookups, row_count)
+
+    if isinstance(pattern, patterns.OrPattern):
+        return _create_seek_for_or(pattern, lookups, row_count)
+
+    # Lookups only hold the items that match their pattern, so they
+    # can't find the items that don't match a NotPattern, and a query
+    # without a comparator has nothing to seek to
+    if not isinstance(pattern, patterns.SearchPattern):
+        return None, pattern
+
+    lookup, estimated_rows = _find_lookup_for_search(
+        query=pattern,
+        lookups=lookups
     )
 
-    query_plan.append(operation)
+    if lookup is None or not _seek_is_cheaper(pattern, estimated_rows, row_count):
+        return None, pattern
+
+    seek = _create_lookup_seek(pattern, lookup)
+    seek.estimated_rows = estimated_rows
+
+    return seek, None
 
 
-def _add_range_seek_to_plan(lookup: "Lookup", query_plan: QueryPlan,
-                            match_func: Callable[[object], bool], start_key: object = None,
-                            start_inclusive: bool = True):
-    """ Construct an operation for looking up a continuous range of items
+def _create_seek_for_and(pattern: "AndPattern", lookups: LookupsBySignature,
+                         row_count: int = None) -> Tuple[Optional[ops.Operation],
+                                                         Optional["Pattern"]]:
+    """ Create an operation intersecting the lookups usable by each part of an AndPattern
 
-    :param lookup: Lookup being searched
-    :param query_plan: Query plan to append operation to
-    :param match_func: Function returning a bool indicating whether item should be returned
-    :param start_key: Initial key to search for
-    :param start_inclusive: If True, return all items at start_key
+    Parts that no lookup can help with are returned in the residual pattern.
+
+    :param pattern: AndPattern defining what data to search for
+    :param lookups: Lists of lookups to search through, keyed by transformation signature
+    :param row_count: Number of items in the list, or None to always prefer lookups
     """
 
-    operation = ops.LookupRangeSeek(
-        lookup=lookup,
-        start_key=start_key,
-        start_inclusive=start_inclusive,
-        match_func=match_func
+    seeks = []
+    residuals = []
+
+    for sub_pattern in pattern.patterns:
+        seek, residual = _create_seek_for_pattern(sub_pattern, lookups, row_count)
+
+        if seek is not None:
+            seeks.append(seek)
+
+        if residual is not None:
+            residuals.append(residual)
+
+    if not seeks:
+        return None, pattern
+
+    if len(seeks) == 1:
+        seek = seeks[0]
+    else:
+        seek = ops.Intersect(seeks)
+        seek.estimated_rows = _estimate_intersection(seeks, row_count)
+
+    if not residuals:
+        residual = None
+    elif len(residuals) == 1:
+        residual = residuals[0]
+    else:
+        residual = patterns.AndPattern(residuals)
+
+    return seek, residual
+
+
+def _create_seek_for_or(pattern: "OrPattern", lookups: LookupsBySignature,
+                        row_count: int = None) -> Tuple[Optional[ops.Operation],
+                                                        Optional["Pattern"]]:
+    """ Create an operation combining the lookups usable by each part of an OrPattern
+
+    Lookups can only be used if every part of the OrPattern can be served by one,
+    otherwise items matching only the unserved part would be missed.
+
+    :param pattern: OrPattern defining what data to search for
+    :param lookups: Lists of lookups to search through, keyed by transformation signature
+    :param row_count: Number of items in the list, or None to always prefer lookups
+    """
+
+    seeks = []
+    inexact = False
+
+    for sub_pattern in pattern.patterns:
+        seek, residual = _create_seek_for_pattern(sub_pattern, lookups, row_count)
+
+        if seek is None:
+            return None, pattern
+
+        seeks.append(seek)
+        inexact = inexact or residual is not None
+
+    estimated_rows = sum(seek.estimated_rows for seek in seeks)
+
+    if row_count is not None:
+        estimated_rows = min(estimated_rows, row_count)
+
+    # The parts may each be cheap while the union as a whole is not
+    if not _seek_is_cheaper(pattern, estimated_rows, row_count):
+        return None, pattern
+
+    seek = ops.Union(seeks)
+    seek.estimated_rows = estimated_rows
+
+    # If any part returns extra items, the whole OrPattern must be
+    # rechecked, as the items may have been found by a different part
+    return seek, (pattern if inexact else None)
+
+
+def _estimate_intersection(seeks: List[ops.Operation], row_count: int = None) -> float:
+    """ Estimate how many rows are found by all of the provided seeks
+
+    Assumes the conditions behind each seek are independent of each other,
+    in which case the fraction of rows found by the intersection is the product
+    of the fractions found by each seek.
+
+    :param seeks: Operations being intersected
+    :param row_count: Number of items in the list, or None if not known
+    """
+
+    smallest = min(seek.estimated_rows for seek in seeks)
+
+    if not row_count:
+        return smallest
+
+    estimated_rows = row_count
+
+    for seek in seeks:
+        estimated_rows *= seek.estimated_rows / row_count
+
+    return min(estimated_rows, smallest)
+
+
+def _seek_is_cheaper(pattern: "Pattern", estimated_rows: float, row_count: int = None) -> bool:
+    """ Returns True if fetching the estimated rows is cheaper than scanning the list
+
+    :param pattern: Pattern the seek or scan would be fetching items for
+    :param estimated_rows: Estimated number of rows the seek would find
+    :param row_count: Number of items in the list, or None to always prefer lookups
+    """
+
+    if row_count is None:
+        return True
+
+    return estimated_rows * FETCH_ROW_COST < row_count * _scan_row_cost(pattern)
+
+
+def _scan_row_cost(pattern: "Pattern") -> float:
+    """ Estimate the relative cost of checking a single item against a pattern
+
+    :param pattern: Pattern items would be checked against
+    """
+
+    if isinstance(pattern, patterns.CompoundPattern):
+        return sum(_scan_row_cost(sub_pattern) for sub_pattern in pattern.patterns)
+
+    return SCAN_ROW_COST + len(pattern.transformations)
+
+
+def _find_lookup_for_search(query: "SearchPattern",
+                            lookups: LookupsBySignature) -> Tuple[Optional["Lookup"], float]:
+    """ Find the lookup that can fulfill a query with the fewest estimated rows
+
+    Returns a tuple of (lookup, estimated rows), or (None, None) if no lookup
+    can fulfill the query.
+
+    :param query: SearchPattern defining what data to search for
+    :param lookups: Lists of lookups to search through, keyed by transformation signature
+    """
+
+    # Lookups without sorted keys can only serve searches for discrete values
+    discrete_query = isinstance(
+        query.comparator,
+        (cmps.EqualsComparator, cmps.InComparator)
     )
 
-    query_plan.append(operation)
+    best_lookup = None
+    best_estimate = None
+
+    # Interrogate every lookup sharing the query's transformations that
+    # can handle it, keeping the one expected to find the fewest rows
+    for lookup in lookups.get(query.transformations.signature, ()):
+
+        if not lookup.ready:
+            continue
+
+        if not (lookup.ordered or discrete_query):
+            continue
+
+        if not lookup.handles(query):
+            continue
+
+        estimate = lookup.estimate_rows(query.comparator)
+
+        if best_estimate is None or estimate < best_estimate:
+            best_lookup = lookup
+            best_estimate = estimate
+
+    return best_lookup, best_estimate
+
+
+def _add_lookup_operations_to_plan(query_plan: "QueryPlan", seek: ops.Operation,
+                                   residual: Optional["Pattern"], chain: ops.Operation = None):
+    """ Add operations that retrieve the desired data using lookups
+
+    :param query_plan: QueryPlan object operations will be appended to
+    :param seek: Operation yielding postings of row ids from lookups
+    :param residual: Pattern fetched items must also match, if any
+    :param chain: Operation consolidating the postings, defaulting to a Chain
+    """
+
+    query_plan.append(seek)
+
+    # These operations transform postings of row ids into our final output:
+    # A generator that yields (list index, item) tuples
+    fetch_operations = [
+        chain or ops.Chain(),
+        ops.FetchItemsByIndices()
+    ]
+
+    query_plan += fetch_operations
+
+    # Check any conditions the lookups couldn't account for
+    if residual is not None:
+        query_plan.append(ops.Filter(residual))
+
+
+def _create_lookup_seek(query: "SearchPattern", lookup: "Lookup", in_key_order: bool = False,
+                        reverse: bool = False) -> ops.LookupOperation:
+    """ Request a lookup to generate an operation for retrieving the desired data
+
+    :param query: SearchPattern defining what data to search for
+    :param lookup: Lookup to use for retrieving data
+    :param in_key_order: If True, the seek must return keys in sorted order
+    :param reverse: If True and in_key_order is True, return keys from largest to smallest
+    """
+
+    comparator = query.comparator
+
+    # Determine whether we're seeking to specific items or
+    # seeking across a range (>, <, etc queries)
+    if isinstance(comparator, cmps.RangeComparator):
+        return ops.LookupRangeSeek(
+            lookup=lookup,
+            start_key=comparator.start_key,
+            end_key=comparator.end_key,
+            start_inclusive=comparator.start_inclusive,
+            end_inclusive=comparator.end_inclusive,
+            reverse=in_key_order and reverse
+        )
+
+    return ops.LookupSeek(
+        lookup=lookup,
+        keys=comparator.values,
+        reverse=reverse if in_key_order else None
+    )
 
 
-def _add_data_scan_to_plan(query_plan: "QueryPlan"):
+def _add_data_scan_to_plan(query_plan: "QueryPlan", row_count: int = None,
+                           reverse: bool = False):
     """ Construct operations for retrieving data from the underlying _data list
 
     :param query_plan: QueryPlan object operations will be appended to
+    :param row_count: Number of items in the list, if known
+    :param reverse: If True, scan from the end of the list to the start
     """
 
     operation = ops.DataScan(
-        pattern=query_plan.query
+        pattern=query_plan.query,
+        reverse=reverse
     )
+    operation.estimated_rows = row_count
 
     query_plan.append(operation)
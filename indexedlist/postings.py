@@ -0,0 +1,485 @@
+""" Compact storage for the row ids held under each key of a Lookup
+
+A Lookup maps every key to the row ids of the items that produced that key.
+Holding these in a Python set costs hundreds of bytes per key plus a boxed int
+per row id, so they're instead stored in one of three forms, chosen by size:
+
+    int          - A single row id, stored inline
+    array('q')   - A sorted array of row ids
+    Bitmap       - One bit per row id in the range spanned, for dense row ids
+
+The functions in this module accept any of these forms. Those that modify a
+posting return the result, which may be a different object (or form) than the
+one passed in. A posting is never empty; functions return None instead.
+
+Postings shared with a snapshot (see Lookup.snapshot()) must be copied with
+copy() before being passed to a function that modifies them.
+
+For convenience, the read-only functions (size, iterate, iterate_sorted and contains) also
+accept plain sets, which is how SetOperations hold combined results.
+"""
+
+import bisect
+import heapq
+
+from array import array
+from typing import Iterable, Iterator, Optional, Union
+
+ARRAY_TYPECODE = "q"
+
+# Postings holding at least this many row ids can be stored as a bitmap
+MIN_BITMAP_SIZE = 64
+
+# A bitmap is used when at least 1 in BITMAP_DENSITY of the row ids it spans are
+# present, and converted back to an array once fewer than 1 in SPARSE_DENSITY are.
+# An array uses 64 bits per row id, so the break-even point is 1 in 64.
+BITMAP_DENSITY = 32
+SPARSE_DENSITY = 128
+
+# The offsets of the set bits in every possible byte value
+_BYTE_BITS = tuple(
+    tuple(bit for bit in range(8) if value >> bit & 1)
+    for value in range(256)
+)
+
+
+class Bitmap:
+    """ A set of row ids stored as one bit per row id in the range spanned
+
+    The range always starts at a multiple of 8 so that growing it in either
+    direction only requires adding whole bytes.
+    """
+
+    __slots__ = ("base", "bits", "count")
+
+    def __init__(self, row_ids: Iterable[int]):
+        """ Construct a new Bitmap
+
+        :param row_ids: Non-empty, sorted iterable of row ids to store
+        """
+
+        row_ids = list(row_ids)
+
+        self.base = row_ids[0] - row_ids[0] % 8
+        self.bits = bytearray((row_ids[-1] - self.base) // 8 + 1)
+        self.count = 0
+
+        for row_id in row_ids:
+            self.add(row_id)
+
+    def __contains__(self, row_id: int) -> bool:
+
+        offset = row_id - self.base
+
+        if offset < 0 or offset >= len(self.bits) * 8:
+            return False
+
+        return bool(self.bits[offset >> 3] >> (offset & 7) & 1)
+
+    def __iter__(self) -> Iterator[int]:
+
+        base = self.base
+
+        for byte_index, value in enumerate(self.bits):
+
+            if value:
+                byte_base = base + byte_index * 8
+
+                for bit in _BYTE_BITS[value]:
+                    yield byte_base + bit
+
+    def __len__(self) -> int:
+
+        return self.count
+
+    def __reversed__(self) -> Iterator[int]:
+
+        base = self.base
+        bits = self.bits
+
+        for byte_index in range(len(bits) - 1, -1, -1):
+            value = bits[byte_index]
+
+            if value:
+                byte_base = base + byte_index * 8
+
+                for bit in reversed(_BYTE_BITS[value]):
+                    yield byte_base + bit
+
+    @property
+    def span(self) -> int:
+        """ Number of row ids covered by the bitmap, whether present or not """
+
+        return len(self.bits) * 8
+
+    def add(self, row_id: int):
+        """ Add a row id to the bitmap, growing it if needed
+
+        :param row_id: Row id to add
+        """
+
+        offset = row_id - self.base
+
+        # Grow the bitmap downwards, keeping the base a multiple of 8
+        if offset < 0:
+            new_base = row_id - row_id % 8
+            self.bits[0:0] = bytes((self.base - new_base) // 8)
+            self.base = new_base
+            offset = row_id - new_base
+
+        byte_index = offset >> 3
+
+        if byte_index >= len(self.bits):
+            self.bits.extend(bytes(byte_index - len(self.bits) + 1))
+
+        mask = 1 << (offset & 7)
+
+        if not self.bits[byte_index] & mask:
+            self.bits[byte_index] |= mask
+            self.count += 1
+
+    def copy(self) -> "Bitmap":
+        """ Returns a copy of the bitmap """
+
+        bitmap = Bitmap.__new__(Bitmap)
+        bitmap.base = self.base
+        bitmap.bits = bytearray(self.bits)
+        bitmap.count = self.count
+
+        return bitmap
+
+    def discard(self, row_id: int):
+        """ Remove a row id from the bitmap if present
+
+        :param row_id: Row id to remove
+        """
+
+        if row_id not in self:
+            return
+
+        offset = row_id - self.base
+
+        self.bits[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+        self.count -= 1
+
+
+Posting = Union[int, array, Bitmap]
+
+
+def from_row_ids(row_ids: Iterable[int]) -> Optional[Posting]:
+    """ Build a posting in the most compact form for the given row ids
+
+    :param row_ids: Iterable of distinct row ids
+    """
+
+    row_ids = sorted(row_ids)
+
+    if not row_ids:
+        return None
+
+    if len(row_ids) == 1:
+        return row_ids[0]
+
+    if _is_dense(len(row_ids), row_ids[-1] - row_ids[0] + 1):
+        return Bitmap(row_ids)
+
+    return array(ARRAY_TYPECODE, row_ids)
+
+
+def add(posting: Optional[Posting], row_id: int) -> Posting:
+    """ Add a row id to a posting, returning the updated posting
+
+    :param posting: Posting to add to, or None to start a new posting
+    :param row_id: Row id to add
+    """
+
+    if posting is None:
+        return row_id
+
+    if type(posting) is int:
+
+        if posting == row_id:
+            return posting
+
+        return array(ARRAY_TYPECODE, sorted((posting, row_id)))
+
+    if type(posting) is Bitmap:
+        span = max(posting.base + posting.span, row_id + 1) - min(posting.base, row_id)
+
+        if not _is_sparse(len(posting) + 1, span):
+            posting.add(row_id)
+            return posting
+
+        posting = array(ARRAY_TYPECODE, posting)
+
+    # Row ids are usually added in increasing order, so check the end first
+    if not posting or row_id > posting[-1]:
+        posting.append(row_id)
+    else:
+        position = bisect.bisect_left(posting, row_id)
+
+        if position < len(posting) and posting[position] == row_id:
+            return posting
+
+        posting.insert(position, row_id)
+
+    if _is_dense(len(posting), posting[-1] - posting[0] + 1):
+        return Bitmap(posting)
+
+    return posting
+
+
+def merge(posting: Optional[Posting], row_ids: Iterable[int]) -> Posting:
+    """ Add many row ids to a posting at once, returning the updated posting
+
+    :param posting: Posting to add to, or None to start a new posting
+    :param row_ids: Iterable of row ids to add
+    """
+
+    row_ids = list(row_ids)
+
+    if posting is None:
+        return from_row_ids(set(row_ids))
+
+    # A handful of row ids are added one at a time
+    if len(row_ids) < 8:
+
+        for row_id in row_ids:
+            posting = add(posting, row_id)
+
+        return posting
+
+    row_ids = sorted(set(row_ids))
+
+    if type(posting) is int:
+        return from_row_ids(set(row_ids).union((posting,)))
+
+    if type(posting) is Bitmap:
+        span = max(posting.base + posting.span, row_ids[-1] + 1) - min(posting.base, row_ids[0])
+
+        if not _is_sparse(len(posting) + len(row_ids), span):
+
+            for row_id in row_ids:
+                posting.add(row_id)
+
+            return posting
+
+        posting = array(ARRAY_TYPECODE, posting)
+
+    # Only the part of the posting after the first new row id is rewritten,
+    # so row ids added at the end (as when extending the list) are appended
+    position = bisect.bisect_left(posting, row_ids[0])
+
+    if position == len(posting):
+        posting.extend(row_ids)
+    else:
+        posting[position:] = array(ARRAY_TYPECODE, _merge_sorted(posting[position:], row_ids))
+
+    if _is_dense(len(posting), posting[-1] - posting[0] + 1):
+        return Bitmap(posting)
+
+    return posting
+
+
+def remove(posting: Posting, row_id: int) -> Optional[Posting]:
+    """ Remove a row id from a posting, returning the updated posting or None if empty
+
+    :param posting: Posting to remove from
+    :param row_id: Row id to remove
+    """
+
+    if type(posting) is int:
+        return None if posting == row_id else posting
+
+    if type(posting) is Bitmap:
+        posting.discard(row_id)
+
+        if len(posting) >= MIN_BITMAP_SIZE // 2 and not _is_sparse(len(posting), posting.span):
+            return posting
+
+        return from_row_ids(posting)
+
+    position = bisect.bisect_left(posting, row_id)
+
+    if position < len(posting) and posting[position] == row_id:
+        del posting[position]
+
+    if len(posting) == 1:
+        return posting[0]
+
+    return posting
+
+
+def subtract(posting: Posting, row_ids: Iterable[int]) -> Optional[Posting]:
+    """ Remove many row ids from a posting at once, returning the updated posting or None if empty
+
+    :param posting: Posting to remove from
+    :param row_ids: Iterable of row ids to remove
+    """
+
+    row_ids = list(row_ids)
+
+    # A handful of row ids are removed one at a time
+    if len(row_ids) < 8:
+
+        for row_id in row_ids:
+            posting = remove(posting, row_id)
+
+            if posting is None:
+                return None
+
+        return posting
+
+    if type(posting) is int:
+        return None if posting in row_ids else posting
+
+    if type(posting) is Bitmap:
+
+        for row_id in row_ids:
+            posting.discard(row_id)
+
+        if len(posting) >= MIN_BITMAP_SIZE // 2 and not _is_sparse(len(posting), posting.span):
+            return posting
+
+        return from_row_ids(posting)
+
+    # Only the part of the posting after the first removed row id is rewritten
+    removed = set(row_ids)
+    position = bisect.bisect_left(posting, min(removed))
+
+    posting[position:] = array(
+        ARRAY_TYPECODE, (row_id for row_id in posting[position:] if row_id not in removed)
+    )
+
+    if not posting:
+        return None
+
+    if len(posting) == 1:
+        return posting[0]
+
+    return posting
+
+
+def remap(posting: Posting, new_row_ids: dict) -> Posting:
+    """ Replace every row id in a posting with a new one, returning the new posting
+
+    :param posting: Posting to remap
+    :param new_row_ids: Dict mapping row ids to their replacements. Row ids not in it are kept.
+    """
+
+    if type(posting) is int:
+        return new_row_ids.get(posting, posting)
+
+    return from_row_ids(new_row_ids.get(row_id, row_id) for row_id in posting)
+
+
+def _merge_sorted(first: Iterable[int], second: Iterable[int]) -> Iterator[int]:
+    """ Merge two ascending sequences of row ids, dropping row ids found in both
+
+    :param first: Ascending row ids without duplicates
+    :param second: Ascending row ids without duplicates
+    """
+
+    previous = None
+
+    for row_id in heapq.merge(first, second):
+
+        if row_id != previous:
+            yield row_id
+            previous = row_id
+
+
+def copy(posting: Posting) -> Posting:
+    """ Returns a copy of a posting that can be modified without changing the original
+
+    :param posting: Posting to copy
+    """
+
+    if type(posting) is int:
+        return posting
+
+    if type(posting) is Bitmap:
+        return posting.copy()
+
+    return posting[:]
+
+
+def size(posting: Union[Posting, set]) -> int:
+    """ Returns the number of row ids in a posting
+
+    :param posting: Posting (or set) to count
+    """
+
+    if type(posting) is int:
+        return 1
+
+    return len(posting)
+
+
+def iterate(posting: Union[Posting, set]) -> Iterable[int]:
+    """ Returns an iterable of the row ids in a posting, in ascending order for postings
+
+    :param posting: Posting (or set) to iterate over
+    """
+
+    if type(posting) is int:
+        return posting,
+
+    return posting
+
+
+def iterate_sorted(posting: Union[Posting, set], reverse: bool = False) -> Iterable[int]:
+    """ Returns an iterable of the row ids in a posting, in ascending or descending order
+
+    :param posting: Posting (or set) to iterate over
+    :param reverse: If True, iterate in descending order
+    """
+
+    if type(posting) is int:
+        return posting,
+
+    if type(posting) is set:
+        return sorted(posting, reverse=reverse)
+
+    if reverse:
+        return reversed(posting)
+
+    return posting
+
+
+def contains(posting: Union[Posting, set], row_id: int) -> bool:
+    """ Returns True if the posting holds a row id
+
+    :param posting: Posting (or set) to check
+    :param row_id: Row id to look for
+    """
+
+    if type(posting) is int:
+        return posting == row_id
+
+    if type(posting) is array:
+        position = bisect.bisect_left(posting, row_id)
+
+        return position < len(posting) and posting[position] == row_id
+
+    return row_id in posting
+
+
+def _is_dense(count: int, span: int) -> bool:
+    """ Returns True if row ids are packed closely enough to store as a bitmap
+
+    :param count: Number of row ids
+    :param span: Size of the range of row ids covered
+    """
+
+    return count >= MIN_BITMAP_SIZE and span <= count * BITMAP_DENSITY
+
+
+def _is_sparse(count: int, span: int) -> bool:
+    """ Returns True if row ids are spread too thinly to keep as a bitmap
+
+    :param count: Number of row ids
+    :param span: Size of the range of row ids covered
+    """
+
+    return span > count * SPARSE_DENSITY
@@ -0,0 +1,341 @@
+""" Optional NumPy-backed evaluation of queries during full list scans
+
+Checking every item against a query one at a time is the slowest part of a
+DataScan. When NumPy is installed and the values a query compares are numbers
+(either the items themselves, or numbers taken from each item such as
+my_list.item['a']), the values are copied into a NumPy array once and the
+comparison is evaluated over the whole array at a time.
+
+These arrays (columns) are cached on the IndexedList, keyed by the signature of
+the transformations used to produce them, and discarded whenever the list changes.
+Queries that can't be evaluated this way fall back to checking items one at a time.
+Building a column from transformed values stops at the first one that isn't a
+number, and a column of the items themselves is only attempted if the first item
+is a number, so they cost little more than they would without NumPy.
+"""
+
+from typing import TYPE_CHECKING, Optional
+
+from . import comparators as cmps
+from . import exc
+from . import patterns
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if TYPE_CHECKING:
+    from .core import IndexedList, TransformationCollection
+
+# Lists shorter than this are scanned one item at a time, as
+# building a column costs more than it saves on small lists
+MIN_ROWS = 512
+
+# NumPy kinds of column that can be compared: bools, signed integers and floats
+NUMERIC_KINDS = "bif"
+
+# Integers at least this large in magnitude may not be represented exactly as
+# floats (2 ** 53 + 1 becomes 2 ** 53), so they're never mixed with floats
+MAX_EXACT_FLOAT_INT = 2 ** 53
+
+# Maximum number of columns (or markers for non-numeric values) cached on each
+# list, after which the oldest is discarded. Each column holds a value per item.
+MAX_COLUMNS = 8
+
+# Cached in place of a column when the values aren't numeric
+_NOT_NUMERIC = object()
+
+# Types of value a column can hold. Other numeric types (such as NumPy's own
+# scalars) are checked with isinstance(), which is slower.
+_NUMERIC_TYPES = frozenset((bool, int, float))
+
+
+class Column:
+    """ The values produced by one set of transformations over every item in a list """
+
+    __slots__ = ("values", "valid", "_exact_as_float")
+
+    def __init__(self, values: "numpy.ndarray", valid: Optional["numpy.ndarray"] = None):
+        """ Construct a new Column
+
+        :param values: One dimensional numeric array of transformed values
+        :param valid: Boolean array that is False for items the transformations
+            skipped, or None if no items were skipped
+        """
+
+        self.values = values
+        self.valid = valid
+        self._exact_as_float = None
+
+    @property
+    def exact_as_float(self) -> bool:
+        """ True if every value can be converted to a float without losing precision """
+
+        if self._exact_as_float is None:
+
+            if self.values.dtype.kind == "f" or not len(self.values):
+                self._exact_as_float = True
+            else:
+                self._exact_as_float = bool(numpy.abs(self.values).max() < MAX_EXACT_FLOAT_INT)
+
+        return self._exact_as_float
+
+
+def available() -> bool:
+    """ Returns True if NumPy is installed """
+
+    return numpy is not None
+
+
+def scan(pattern: patterns.Pattern, data: "IndexedList",
+         build_columns: bool = True) -> Optional["numpy.ndarray"]:
+    """ Find the indices of all items matching a pattern, using NumPy
+
+    Returns an ascending array of list indices, or None if the pattern
+    can't be evaluated this way and items must be checked one at a time.
+
+    :param pattern: Pattern items must match
+    :param data: IndexedList being searched
+    :param build_columns: If False, only use columns that are already cached or
+        that hold the items themselves, rather than transforming every item
+    """
+
+    if numpy is None or len(data) < MIN_ROWS:
+        return None
+
+    mask = _match_mask(pattern, data, build_columns)
+
+    if mask is None:
+        return None
+
+    return numpy.flatnonzero(mask)
+
+
+def _match_mask(pattern: patterns.Pattern, data: "IndexedList",
+                build_columns: bool = True) -> Optional["numpy.ndarray"]:
+    """ Returns a boolean array that is True for items matching a pattern, or None
+
+    :param pattern: Pattern items must match
+    :param data: IndexedList being searched
+    :param build_columns: If False, don't build columns that require transforming items
+    """
+
+    if isinstance(pattern, patterns.CompoundPattern):
+        masks = [
+            _match_mask(sub_pattern, data, build_columns)
+            for sub_pattern in pattern.patterns
+        ]
+
+        if any(mask is None for mask in masks):
+            return None
+
+        if isinstance(pattern, patterns.NotPattern):
+            return ~masks[0]
+
+        if isinstance(pattern, patterns.AndPattern):
+            return numpy.logical_and.reduce(masks)
+
+        if isinstance(pattern, patterns.OrPattern):
+            return numpy.logical_or.reduce(masks)
+
+        return None
+
+    column = _get_column(pattern.transformations, data, build_columns)
+
+    if column is None:
+        return None
+
+    if isinstance(pattern, patterns.SearchPattern):
+        mask = _compare(column, pattern.comparator)
+    else:
+        mask = numpy.ones(len(column.values), dtype=bool)
+
+    if mask is None:
+        return None
+
+    # Items skipped by the transformations never match
+    if column.valid is not None:
+        mask &= column.valid
+
+    return mask
+
+
+def _compare(column: Column, comparator: cmps.Comparator) -> Optional["numpy.ndarray"]:
+    """ Evaluate a comparator against every value in a column
+
+    Returns a boolean array, or None if the comparator's values can't be
+    compared exactly against the column.
+
+    :param column: Column of values to compare
+    :param comparator: Comparator to evaluate
+    """
+
+    values = column.values
+
+    if isinstance(comparator, (cmps.EqualsComparator, cmps.InComparator)):
+        keys = list(comparator.values)
+
+        if not all(_is_comparable(column, key) for key in keys):
+            return None
+
+        if len(keys) == 1:
+            return values == keys[0]
+
+        return numpy.isin(values, keys)
+
+    if isinstance(comparator, cmps.RangeComparator):
+        mask = numpy.ones(len(values), dtype=bool)
+
+        if comparator.start_key is not None:
+
+            if not _is_comparable(column, comparator.start_key):
+                return None
+
+            if comparator.start_inclusive:
+                mask &= values >= comparator.start_key
+            else:
+                mask &= values > comparator.start_key
+
+        if comparator.end_key is not None:
+
+            if not _is_comparable(column, comparator.end_key):
+                return None
+
+            if comparator.end_inclusive:
+                mask &= values <= comparator.end_key
+            else:
+                mask &= values < comparator.end_key
+
+        return mask
+
+    return None
+
+
+def _is_comparable(column: Column, key: object) -> bool:
+    """ Returns True if NumPy will compare a key against a column exactly as Python would
+
+    :param column: Column the key will be compared against
+    :param key: Value from a comparator
+    """
+
+    if type(key) is float:
+        return column.exact_as_float
+
+    if type(key) is int:
+
+        if column.values.dtype.kind == "f":
+            return abs(key) < MAX_EXACT_FLOAT_INT
+
+        return -2 ** 63 <= key < 2 ** 63
+
+    return type(key) is bool
+
+
+def _get_column(transformations: "TransformationCollection", data: "IndexedList",
+                build_columns: bool = True) -> Optional[Column]:
+    """ Return the cached column for a set of transformations, building it if needed
+
+    Returns None if the transformed values aren't all numbers.
+
+    :param transformations: TransformationCollection applied to each item
+    :param data: IndexedList being searched
+    :param build_columns: If False, return None rather than build a column
+        that requires transforming items
+    """
+
+    signature = transformations.signature
+
+    try:
+        column = data._columns[signature]
+    except KeyError:
+
+        if not build_columns and len(transformations):
+            return None
+
+        column = _build_column(transformations, data)
+
+        # Discard the oldest column once the cache is full. Several threads can
+        # scan a concurrent list at once, so another may have discarded it.
+        if len(data._columns) >= MAX_COLUMNS:
+            data._columns.pop(next(iter(data._columns), None), None)
+
+        data._columns[signature] = column
+
+    if column is _NOT_NUMERIC:
+        return None
+
+    return column
+
+
+def _build_column(transformations: "TransformationCollection", data: "IndexedList") -> object:
+    """ Apply transformations to every item in a list and store the results in an array
+
+    Returns _NOT_NUMERIC if the results aren't all numbers.
+
+    :param transformations: TransformationCollection applied to each item
+    :param data: IndexedList being searched
+    """
+
+    items = data._data
+    skipped = []
+
+    if not len(transformations):
+        transformed = items
+
+        # Lists usually hold one type of item, so check the first before copying them all
+        if items and not _is_numeric(items[0]):
+            return _NOT_NUMERIC
+    else:
+        apply = transformations.compiled
+        transformed = []
+
+        # Check each value as it's transformed, so lists of other values (like
+        # strings) stop after one item, and mixed values stop at the first that
+        # isn't a number rather than after transforming the whole list
+        for position, item in enumerate(items):
+
+            try:
+                value = apply(item)
+            except exc.SkipItem:
+                skipped.append(position)
+                transformed.append(0)
+                continue
+
+            if not _is_numeric(value):
+                return _NOT_NUMERIC
+
+            transformed.append(value)
+
+    try:
+        values = numpy.array(transformed)
+    except (ValueError, TypeError, OverflowError):
+        return _NOT_NUMERIC
+
+    # Anything else (strings, objects, nested sequences) is compared one item at a time
+    if values.ndim != 1 or values.dtype.kind not in NUMERIC_KINDS:
+        return _NOT_NUMERIC
+
+    # Mixing large integers with floats produces floats that no longer equal the integers
+    if values.dtype.kind == "f":
+        large = numpy.flatnonzero(numpy.abs(values) >= MAX_EXACT_FLOAT_INT)
+
+        if any(type(transformed[position]) is not float for position in large.tolist()):
+            return _NOT_NUMERIC
+
+    valid = None
+
+    if skipped:
+        valid = numpy.ones(len(items), dtype=bool)
+        valid[skipped] = False
+
+    return Column(values, valid)
+
+
+def _is_numeric(value: object) -> bool:
+    """ Returns True if a value may be stored in a column
+
+    :param value: Item or transformed value
+    """
+
+    return type(value) in _NUMERIC_TYPES or isinstance(value, (numpy.number, numpy.bool_))
@@ -12,5 +12,8 @@ setup(
     python_requires='>=3.6',
     install_requires=[
         'sortedcontainers>=2.1.0'
-    ]
+    ],
+    extras_require={
+        'numpy': ['numpy>=1.17']
+    }
 )
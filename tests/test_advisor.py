@@ -0,0 +1,116 @@
+""" Holds tests on recording queries and recommending lookups """
+
+import pytest
+
+from indexedlist import IndexedList
+
+
+@pytest.fixture()
+def dicts():
+    """ IndexedList of dicts with a lookup on 'id' """
+
+    ilist = IndexedList({"id": i, "group": i % 10, "score": i % 7} for i in range(0, 1000))
+    ilist.create_lookup(ilist.item["id"], name="id")
+
+    return ilist
+
+
+def test_not_recording(dicts):
+    """ Test queries aren't recorded, and advise() refuses, until recording starts """
+
+    list(dicts.search(dicts.item["group"] == 1))
+
+    assert dicts.workload is None, "Workload was recorded"
+
+    with pytest.raises(ValueError):
+        dicts.advise()
+
+
+def test_records(dicts):
+    """ Test searches and counts are recorded with the rows examined and returned """
+
+    dicts.record_workload()
+
+    list(dicts.search(dicts.item["group"] == 1))
+    dicts.count(dicts.item["id"] == 5)
+
+    expected = [
+        {
+            "query": "item[group] == 1",
+            "comparators": ["EqualsComparator"],
+            "scanned": True,
+            "rows_examined": 1000,
+            "rows_returned": 100
+        },
+        {
+            "query": "item[id] == 5",
+            "comparators": ["EqualsComparator"],
+            "scanned": False,
+            "rows_examined": 1,
+            "rows_returned": 1
+        }
+    ]
+    found = [record.describe() for record in dicts.workload.records]
+
+    assert expected == found, "Records did not match"
+
+
+def test_stop_recording(dicts):
+    """ Test stopping recording keeps the queries recorded so far """
+
+    dicts.record_workload()
+    list(dicts.search(dicts.item["group"] == 1))
+    dicts.record_workload(False)
+    list(dicts.search(dicts.item["group"] == 2))
+
+    assert 1 == len(dicts.workload), "Records did not match"
+
+
+def test_partially_read_search(dicts):
+    """ Test a search whose results aren't all read records the results that were """
+
+    dicts.record_workload()
+
+    results = dicts.search(dicts.item["group"] == 1)
+    next(results)
+    results.close()
+
+    assert 1 == dicts.workload.records[0].rows_returned, "Rows returned did not match"
+
+
+def test_advise(dicts):
+    """ Test recommendations are ranked, and skip comparisons lookups already serve """
+
+    dicts.record_workload()
+
+    for group in range(0, 5):
+        list(dicts.search((dicts.item["group"] == group) & (dicts.item["id"] > 10)))
+
+    list(dicts.search(dicts.item["score"] > 5))
+
+    expected = [("item[group]", True, 5), ("item[score]", False, 1)]
+    found = [
+        (str(recommendation.definition), recommendation.hashed, recommendation.queries)
+        for recommendation in dicts.advise()
+    ]
+
+    assert expected == found, "Recommendations did not match"
+
+
+def test_advise_creates_lookups(dicts):
+    """ Test advise() creates lookups scoring above the threshold """
+
+    dicts.record_workload()
+
+    for group in range(0, 5):
+        list(dicts.search(dicts.item["group"] == group))
+
+    list(dicts.search(dicts.item["score"] > 5))
+
+    recommendations = dicts.advise(create_above=3)
+
+    assert [True, False] == [recommendation.created for recommendation in recommendations], \
+        "Lookups created did not match"
+    assert 2 == len(dicts.lookups), "Lookup was not created"
+    assert ["item[score]"] == [str(recommendation.definition) for recommendation in dicts.advise()], \
+        "Created lookup still recommended"
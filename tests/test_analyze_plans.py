@@ -0,0 +1,86 @@
+""" Holds tests on running query plans with instrumentation """
+
+import pytest
+
+from indexedlist import IndexedList
+
+
+@pytest.fixture(scope="module")
+def dicts():
+    """ IndexedList of dicts indexed by 'a' and 'b' """
+
+    ilist = IndexedList({"a": i % 10, "b": i} for i in range(0, 100))
+    ilist.create_lookup(ilist.item["a"], name="a")
+    ilist.create_lookup(ilist.item["b"], name="b")
+
+    return ilist
+
+
+def _counts(description):
+    """ Returns the operation names and measurements of a description, leaving out times """
+
+    return [
+        (
+            operation["operation"],
+            {key: value for key, value in operation["actual"].items() if "time" not in key},
+            _counts({"operations": operation.get("inputs", [])})
+        )
+        for operation in description["operations"]
+    ]
+
+
+def test_scan(dicts):
+    """ Test measurements of a full list scan """
+
+    description = dicts.plan(dicts.item["c"] == 1).analyze(dicts)
+
+    assert [("DataScan", {"rows": 0}, [])] == _counts(description), "Measurements did not match"
+    assert 0 == description["actual"]["rows"], "Rows returned did not match"
+
+
+def test_seek(dicts):
+    """ Test measurements of a lookup seek and fetch, where only keys found are visited """
+
+    description = dicts.plan(dicts.item["a"].in_(1, 2, 99)).analyze(dicts)
+
+    expected = [
+        ("LookupSeek", {"keys_visited": 2, "postings": 2, "row_ids": 20}, []),
+        ("Chain", {"row_ids": 20}, []),
+        ("FetchItemsByIndices", {"rows": 20}, [])
+    ]
+
+    assert expected == _counts(description), "Measurements did not match"
+
+
+def test_set_operation_inputs(dicts):
+    """ Test the inputs of a set operation are measured, and limits stop reading early """
+
+    description = dicts.plan((dicts.item["a"] == 1) & (dicts.item["b"] < 50), limit=2).analyze(dicts)
+
+    expected = [
+        (
+            "Intersect",
+            {"postings": 1, "row_ids": 5},
+            [
+                ("LookupSeek", {"keys_visited": 1, "postings": 1, "row_ids": 10}, []),
+                ("LookupRangeSeek", {"keys_visited": 50, "postings": 50, "row_ids": 50}, [])
+            ]
+        ),
+        ("Chain", {"row_ids": 2}, []),
+        ("FetchItemsByIndices", {"rows": 2}, []),
+        ("Slice", {"rows": 2}, [])
+    ]
+
+    assert expected == _counts(description), "Measurements did not match"
+    assert 2 == description["actual"]["rows"], "Rows returned did not match"
+
+
+def test_times(dicts):
+    """ Test times are reported, and an operation's time includes the operations it reads from """
+
+    description = dicts.plan(dicts.item["a"] == 1).analyze(dicts)
+    times = [operation["actual"]["time_ms"] for operation in description["operations"]]
+
+    assert times == sorted(times), "Times were not cumulative"
+    assert all(operation["actual"]["self_time_ms"] >= 0 for operation in description["operations"]), \
+        "Negative time in operation"
@@ -0,0 +1,183 @@
+""" Holds tests on batches of changes with deferred lookup updates and rollback """
+
+import pytest
+
+from indexedlist import IndexedList, Indexable, postings
+
+
+@Indexable
+def checked(x):
+    if x < 0:
+        raise ValueError("Negative item")
+    return x
+
+
+@pytest.fixture()
+def numbers():
+    """ IndexedList of numbers with sorted and hashed lookups """
+
+    ilist = IndexedList(range(0, 10))
+    ilist.create_lookup(name="sorted")
+    ilist.create_lookup(ilist.item > 5, name="filtered", hashed=True)
+
+    return ilist
+
+
+def lookup_positions(ilist):
+    """ Returns the contents of each lookup, with row ids translated to list positions """
+
+    return {
+        name: {
+            key: sorted(ilist._position_of(row_id) for row_id in postings.iterate(posting))
+            for key, posting in lookup.mapping.items()
+        }
+        for name, lookup in ilist.lookups.items()
+    }
+
+
+def lookup_row_ids(ilist):
+    """ Returns the contents of each lookup as stored """
+
+    return {
+        name: {key: list(postings.iterate(posting)) for key, posting in lookup.mapping.items()}
+        for name, lookup in ilist.lookups.items()
+    }
+
+
+def rebuilt_positions(ilist):
+    """ Returns the contents lookup_positions() should give, by rebuilding the lookups """
+
+    rebuilt = IndexedList(ilist)
+
+    for name, lookup in ilist.lookups.items():
+        rebuilt.create_lookup(lookup.pattern, name=name, hashed=not lookup.ordered)
+
+    return lookup_positions(rebuilt)
+
+
+def test_commit(numbers):
+    """ Test lookups are only updated when the batch ends """
+
+    before = lookup_row_ids(numbers)
+
+    with numbers.batch():
+        numbers.extend([10, 11])
+        numbers[0] = 100
+        del numbers[1]
+        numbers.insert(2, 50)
+
+        assert before == lookup_row_ids(numbers), "Lookups changed inside the batch"
+
+    assert [100, 2, 50, 3, 4, 5, 6, 7, 8, 9, 10, 11] == list(numbers), "Items do not match"
+    assert rebuilt_positions(numbers) == lookup_positions(numbers), "Lookups do not match"
+
+
+def test_search_inside_batch(numbers):
+    """ Test searches inside a batch see the changes made so far """
+
+    with numbers.batch():
+        numbers.append(20)
+        del numbers[0]
+
+        assert [(9, 20)] == list(numbers.search(numbers.item == 20)), "Search results do not match"
+        assert 0 == numbers.count(numbers.item == 0), "Count does not match"
+
+        numbers.append(21)
+
+    assert rebuilt_positions(numbers) == lookup_positions(numbers), "Lookups do not match"
+
+
+def test_rollback(numbers):
+    """ Test an error inside a batch restores the list and lookups """
+
+    before_items = list(numbers)
+    before = lookup_positions(numbers)
+
+    with pytest.raises(RuntimeError):
+
+        with numbers.batch():
+            numbers.extend(range(100, 110))
+            numbers[3] = 1000
+            del numbers[0:2]
+
+            # Applies the changes so far to lookups
+            list(numbers.search(numbers.item > 5))
+
+            numbers.insert(4, 60)
+            numbers.sort(key=lambda x: -x)
+            numbers.pop()
+
+            raise RuntimeError("Stop")
+
+    assert before_items == list(numbers), "Items were not restored"
+    assert before == lookup_positions(numbers), "Lookups were not restored"
+
+    numbers.append(10)
+
+    assert [(10, 10)] == list(numbers.search(numbers.item == 10)), "Search results do not match"
+
+
+def test_error_applying_batch_rolls_back():
+    """ Test an error raised by a lookup definition when the batch ends rolls it back """
+
+    ilist = IndexedList(range(0, 5))
+    ilist.create_lookup(checked(ilist.item), name="checked")
+
+    with pytest.raises(ValueError):
+
+        with ilist.batch():
+            ilist.append(5)
+            ilist.append(-1)
+
+    assert [0, 1, 2, 3, 4] == list(ilist), "Items were not restored"
+    assert [0, 1, 2, 3, 4] == list(ilist.lookups["checked"].mapping.keys()), "Lookup was not restored"
+
+
+def test_nested_batch(numbers):
+    """ Test a nested batch is part of the enclosing one """
+
+    with numbers.batch():
+        numbers.append(10)
+
+        with numbers.batch():
+            numbers.append(11)
+
+        assert 10 == len(numbers.lookups["sorted"].mapping), "Lookups changed inside the batch"
+
+    assert rebuilt_positions(numbers) == lookup_positions(numbers), "Lookups do not match"
+
+
+def test_replacement_with_same_key_skipped(numbers):
+    """ Test items replaced by equal items inside a batch leave lookups untouched """
+
+    changed = []
+
+    for lookup in numbers.lookups.values():
+        lookup.remove_grouped = lambda grouped, name=lookup.name: changed.append((name, grouped))
+
+    with numbers.batch():
+
+        for position in range(0, len(numbers)):
+            numbers[position] = numbers[position]
+
+    assert all(not grouped for _, grouped in changed), "Lookups were changed"
+
+
+def test_setitem_error_leaves_lookups_unchanged():
+    """ Test an error raised by a lookup definition when replacing an item changes nothing """
+
+    ilist = IndexedList(range(0, 5))
+    ilist.create_lookup(name="plain")
+    ilist.create_lookup(checked(ilist.item), name="checked")
+
+    with pytest.raises(ValueError):
+        ilist[2] = -1
+
+    assert [0, 1, 2, 3, 4] == list(ilist), "Items changed"
+    assert [0, 1, 2, 3, 4] == list(ilist.lookups["plain"].mapping.keys()), "Lookup changed"
+
+    with pytest.raises(ValueError):
+        ilist.extend([5, -1])
+
+    assert [0, 1, 2, 3, 4] == list(ilist), "Items changed"
+    assert [0, 1, 2, 3, 4] == list(ilist.lookups["plain"].mapping.keys()), "Lookup changed"
@@ -0,0 +1,29 @@
+""" Holds smoke tests on the benchmark suite, so it keeps working as the package changes """
+
+import json
+
+from benchmarks import compare, run
+
+
+def test_run_and_compare(tmp_path):
+    """ Test running a tiny benchmark suite and comparing its results with themselves """
+
+    results_path = tmp_path / "results.json"
+
+    run.main(["--sizes", "200", "--cardinalities", "5", "--repeats", "1", "--output", str(results_path)])
+
+    report = json.loads(results_path.read_text())
+    benchmarks = {result["benchmark"] for result in report["results"]}
+
+    expected = {
+        "extend", "create_lookup", "lookup_memory", "lookup_seek",
+        "lookup_range_seek", "data_scan", "churn"
+    }
+
+    assert expected == benchmarks, "Benchmarks did not match"
+
+    results = compare.load(str(results_path))
+    comparisons = compare.compare(results, results)
+
+    assert comparisons, "Nothing was compared"
+    assert not any(comparison["regression"] for comparison in comparisons), "Regression found"
@@ -0,0 +1,195 @@
+""" Holds tests on searching an IndexedList with compound (&, |, ~) queries """
+
+import itertools
+
+import pytest
+
+import indexedlist.operations as ops
+
+from indexedlist import IndexedList
+
+
+def _dicts():
+
+    a_values = itertools.cycle([1, 2, 3])
+    b_values = itertools.cycle([3, 4, 5, 6])
+
+    return [
+        {
+            "a": next(a_values),
+            "b": next(b_values)
+        }
+        for _ in range(0, 12)
+    ]
+
+
+@pytest.fixture(scope="module")
+def unindexed_dicts():
+    """ IndexedList of dicts without lookups """
+
+    return IndexedList(_dicts())
+
+
+@pytest.fixture(scope="module")
+def indexed_dicts():
+    """ IndexedList of dicts indexed by both 'a' and 'b' """
+
+    ilist = IndexedList(_dicts())
+    ilist.create_lookup(ilist.item["a"])
+    ilist.create_lookup(ilist.item["b"])
+
+    return ilist
+
+
+@pytest.fixture(scope="module")
+def partially_indexed_dicts():
+    """ IndexedList of dicts indexed by 'a' only """
+
+    ilist = IndexedList(_dicts())
+    ilist.create_lookup(ilist.item["a"])
+
+    return ilist
+
+
+class TestPlans:
+    """ Tests plan creation for compound searches """
+
+    def test_and_intersects_lookups(self, indexed_dicts):
+        """ Test an & across two indexed keys intersects both lookups """
+
+        query = (indexed_dicts.item["a"] == 1) & (indexed_dicts.item["b"] > 4)
+
+        plan = indexed_dicts.plan(query)
+
+        expected = [ops.Intersect, ops.Chain, ops.FetchItemsByIndices]
+        found = [type(operation) for operation in plan.operations]
+
+        assert expected == found, "Classes in plan do not match"
+
+    def test_and_with_residual(self, partially_indexed_dicts):
+        """ Test an & across an indexed and unindexed key filters after fetching """
+
+        ilist = partially_indexed_dicts
+        query = (ilist.item["a"] == 1) & (ilist.item["b"] > 4)
+
+        plan = ilist.plan(query)
+
+        expected = [ops.LookupSeek, ops.Chain, ops.FetchItemsByIndices, ops.Filter]
+        found = [type(operation) for operation in plan.operations]
+
+        assert expected == found, "Classes in plan do not match"
+
+    def test_or_unions_lookups(self, indexed_dicts):
+        """ Test an | across two indexed keys unions both lookups """
+
+        query = (indexed_dicts.item["a"] == 1) | (indexed_dicts.item["b"] == 4)
+
+        plan = indexed_dicts.plan(query)
+
+        expected = [ops.Union, ops.Chain, ops.FetchItemsByIndices]
+        found = [type(operation) for operation in plan.operations]
+
+        assert expected == found, "Classes in plan do not match"
+
+    def test_or_with_unindexed_part_scans(self, partially_indexed_dicts):
+        """ Test an | with a part no lookup covers falls back to a scan """
+
+        ilist = partially_indexed_dicts
+        query = (ilist.item["a"] == 1) | (ilist.item["b"] == 4)
+
+        plan = ilist.plan(query)
+
+        expected = [ops.DataScan]
+        found = [type(operation) for operation in plan.operations]
+
+        assert expected == found, "Classes in plan do not match"
+
+    def test_not_scans(self, indexed_dicts):
+        """ Test a ~ query falls back to a scan """
+
+        plan = indexed_dicts.plan(~(indexed_dicts.item["a"] == 1))
+
+        expected = [ops.DataScan]
+        found = [type(operation) for operation in plan.operations]
+
+        assert expected == found, "Classes in plan do not match"
+
+    def test_describe(self, indexed_dicts):
+        """ Test the description of a compound query """
+
+        query = (indexed_dicts.item["a"] == 1) & (indexed_dicts.item["b"] > 4)
+
+        expected = "(item[a] == 1) & (item[b] > 4)"
+        found = indexed_dicts.plan(query).describe()["query"]
+
+        assert expected == found, "Descriptions do not match"
+
+
+class TestResults:
+    """ Tests results of compound searches, with and without lookups """
+
+    @pytest.fixture(params=["unindexed_dicts", "indexed_dicts", "partially_indexed_dicts"])
+    def dicts(self, request):
+
+        return request.getfixturevalue(request.param)
+
+    def test_and(self, dicts):
+        """ Test results of an & query """
+
+        query = (dicts.item["a"] == 1) & (dicts.item["b"] < 6)
+
+        expected = [0, 6, 9]
+        found = sorted(index for index, _ in dicts.search(query))
+
+        assert expected == found, "Results did not match"
+
+    def test_three_way_and(self, dicts):
+        """ Test results of an & query with three parts """
+
+        query = (dicts.item["a"] == 1) & (dicts.item["b"] < 6) & (dicts.item["b"] > 3)
+
+        expected = [6, 9]
+        found = sorted(index for index, _ in dicts.search(query))
+
+        assert expected == found, "Results did not match"
+
+    def test_or(self, dicts):
+        """ Test results of an | query """
+
+        query = (dicts.item["a"] == 1) | (dicts.item["b"] == 6)
+
+        expected = [0, 3, 6, 7, 9, 11]
+        found = sorted(index for index, _ in dicts.search(query))
+
+        assert expected == found, "Results did not match"
+
+    def test_or_of_ands(self, dicts):
+        """ Test results of an | query combining & queries """
+
+        first = (dicts.item["a"] == 1) & (dicts.item["b"] == 3)
+        second = (dicts.item["a"] == 2) & (dicts.item["b"] == 4)
+
+        query = first | second
+
+        expected = [0, 1]
+        found = sorted(index for index, _ in dicts.search(query))
+
+        assert expected == found, "Results did not match"
+
+    def test_and_not(self, dicts):
+        """ Test results of an & query with a ~ part """
+
+        query = (dicts.item["a"] == 1) & ~(dicts.item["b"] < 6)
+
+        expected = [3]
+        found = sorted(index for index, _ in dicts.search(query))
+
+        assert expected == found, "Results did not match"
+
+    def test_not(self, dicts):
+        """ Test results of a ~ query """
+
+        expected = [1, 2, 4, 5, 7, 8, 10, 11]
+        found = sorted(index for index, _ in dicts.search(~(dicts.item["a"] == 1)))
+
+        assert expected == found, "Results did not match"
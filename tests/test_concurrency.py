@@ -0,0 +1,266 @@
+""" Holds tests on concurrent IndexedLists and their read-write lock """
+
+import threading
+
+import pytest
+
+from indexedlist import IndexedList, Param, exc
+from indexedlist.locks import ReadWriteLock
+
+
+def run_in_thread(func):
+    """ Start a daemon thread running a function, returning the thread """
+
+    thread = threading.Thread(target=func, daemon=True)
+    thread.start()
+
+    return thread
+
+
+def test_readers_share_lock():
+    """ Test several threads can hold the read lock at once """
+
+    lock = ReadWriteLock()
+    lock.acquire_read()
+
+    acquired = threading.Event()
+
+    def read():
+        with lock.read():
+            acquired.set()
+
+    run_in_thread(read).join(5)
+
+    assert acquired.is_set()
+
+    lock.release_read()
+
+
+def test_writer_waits_for_readers():
+    """ Test the write lock isn't taken until readers release it, and blocks new readers """
+
+    lock = ReadWriteLock()
+    lock.acquire_read()
+
+    written = threading.Event()
+
+    def write():
+        with lock.write():
+            written.set()
+
+    writer = run_in_thread(write)
+
+    assert not written.wait(0.1)
+
+    # The waiting writer blocks readers in other threads, but not this one
+    read_in_thread = threading.Event()
+
+    def read():
+        with lock.read():
+            read_in_thread.set()
+
+    reader = run_in_thread(read)
+
+    with lock.read():
+        assert not read_in_thread.wait(0.1)
+
+    lock.release_read()
+    writer.join(5)
+    reader.join(5)
+
+    assert written.is_set()
+    assert read_in_thread.is_set()
+
+
+def test_writer_reentrant():
+    """ Test the writing thread can read and write again """
+
+    lock = ReadWriteLock()
+
+    with lock.write():
+
+        with lock.write():
+
+            with lock.read():
+                assert not lock.only_reading()
+
+    # Fully released, so another thread can write
+    written = threading.Event()
+
+    def write():
+        with lock.write():
+            written.set()
+
+    run_in_thread(write).join(5)
+
+    assert written.is_set()
+
+
+def test_upgrade_fails_fast():
+    """ Test a thread holding only the read lock can't take the write lock """
+
+    lock = ReadWriteLock()
+
+    with lock.read():
+
+        with pytest.raises(exc.ConcurrentModificationError):
+            lock.acquire_write()
+
+
+def test_change_while_reading_results():
+    """ Test changing a concurrent list while reading its search results raises """
+
+    ilist = IndexedList(range(0, 10), concurrent=True)
+    ilist.create_lookup()
+
+    results = ilist.search(ilist.item > 5)
+    next(results)
+
+    with pytest.raises(exc.ConcurrentModificationError):
+        ilist.append(10)
+
+    # Searches can still be run while reading
+    assert ilist.count(ilist.item == 2) == 1
+
+    results.close()
+    ilist.append(10)
+
+    assert len(ilist) == 11
+
+
+def test_advise_while_reading_results():
+    """ Test recommendations can be made while reading search results, but not created """
+
+    ilist = IndexedList(range(0, 10), concurrent=True)
+    ilist.record_workload()
+    list(ilist.search(ilist.item > 5))
+
+    results = ilist.search(ilist.item > 5)
+    next(results)
+
+    assert len(ilist.advise()) == 1
+
+    with pytest.raises(exc.ConcurrentModificationError):
+        ilist.advise(create_above=0)
+
+    results.close()
+    ilist.advise(create_above=0)
+
+    assert len(ilist.lookups) == 1
+
+
+def test_results_release_lock():
+    """ Test exhausting, closing or discarding results releases the read lock """
+
+    ilist = IndexedList(range(0, 10), concurrent=True)
+    prepared = ilist.prepare(ilist.item == Param("value"))
+
+    assert list(ilist.search(ilist.item > 5)) == [(6, 6), (7, 7), (8, 8), (9, 9)]
+    ilist.append(10)
+
+    results = prepared.run(value=2)
+    results.close()
+    ilist.append(11)
+
+    assert ilist.first(ilist.item > 5) is not None
+    assert prepared.first(value=3) == (3, 3)
+    assert prepared.count(value=4) == 1
+    ilist.append(12)
+
+    next(ilist.search(ilist.item > 5))
+    ilist.append(13)
+
+    assert not ilist._lock._readers
+
+
+def test_consistent_results():
+    """ Test a writer waits for a search's results to be read before changing the list """
+
+    ilist = IndexedList(range(0, 100), concurrent=True)
+    ilist.create_lookup()
+
+    results = ilist.search(ilist.item < 50, order_by="index")
+    first = next(results)
+
+    writer = run_in_thread(lambda: ilist.extend(range(0, 100)))
+    writer.join(0.1)
+
+    assert writer.is_alive()
+    assert [first] + list(results) == [(i, i) for i in range(0, 50)]
+
+    writer.join(5)
+
+    assert ilist.count(ilist.item < 50) == 100
+
+
+def test_batch_holds_lock():
+    """ Test other threads don't see a batch's changes until it ends """
+
+    ilist = IndexedList(range(0, 10), concurrent=True)
+    ilist.create_lookup()
+
+    counts = []
+
+    with ilist.batch():
+        ilist.extend(range(0, 10))
+
+        reader = run_in_thread(lambda: counts.append(ilist.count(ilist.item == 3)))
+        reader.join(0.1)
+
+        assert reader.is_alive()
+
+        # The batch's own thread sees its changes
+        assert ilist.count(ilist.item == 3) == 2
+
+    reader.join(5)
+
+    assert counts == [2]
+
+
+def test_readers_and_writer():
+    """ Test searches from several threads give consistent results while another thread writes """
+
+    ilist = IndexedList(concurrent=True)
+    ilist.create_lookup(ilist.item["group"], name="group")
+    ilist.create_lookup(ilist.item["value"], name="value", lazy=True)
+
+    # Items are added in pairs, so each group always has an even count
+    errors = []
+    done = threading.Event()
+
+    def write():
+        for i in range(0, 500):
+            with ilist.batch():
+                ilist.append({"group": i % 5, "value": i})
+                ilist.append({"group": i % 5, "value": -i})
+
+            if i % 50 == 0:
+                del ilist[0:2]
+
+        done.set()
+
+    def read():
+        prepared = ilist.prepare(ilist.item["group"] == Param("group"))
+
+        while not done.is_set():
+            counts = [ilist.count(ilist.item["group"] == group) for group in range(0, 5)]
+            matches = list(prepared.run(group=1))
+
+            if any(count % 2 for count in counts) or len(matches) % 2:
+                errors.append((counts, len(matches)))
+
+            for index, item in ilist.search(ilist.item["value"] >= 0):
+                if ilist[index] is not item:
+                    errors.append((index, item))
+
+    readers = [run_in_thread(read) for _ in range(0, 3)]
+    writer = run_in_thread(write)
+
+    writer.join(30)
+
+    for reader in readers:
+        reader.join(30)
+
+    assert done.is_set()
+    assert not errors
+    assert len(ilist) == 980
@@ -4,7 +4,7 @@ import itertools
 
 import pytest
 
-from indexedlist import IndexedList, Indexable
+from indexedlist import IndexedList, Indexable, parallel, postings
 
 
 @pytest.fixture()
@@ -64,7 +64,7 @@ def test_create_lookup_basic(small_indexed_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in small_indexed_list.lookups["sample"].mapping.items()
     ]
@@ -85,7 +85,7 @@ def test_create_equals_filtered_lookup(small_indexed_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in small_indexed_list.lookups["sample"].mapping.items()
     ]
@@ -107,7 +107,7 @@ def test_create_in_filtered_lookup(small_indexed_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in small_indexed_list.lookups["sample"].mapping.items()
     ]
@@ -128,7 +128,7 @@ def test_create_gt_filtered_lookup(small_indexed_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in small_indexed_list.lookups["sample"].mapping.items()
     ]
@@ -150,7 +150,7 @@ def test_create_gte_filtered_lookup(small_indexed_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in small_indexed_list.lookups["sample"].mapping.items()
     ]
@@ -172,7 +172,7 @@ def test_create_lt_filtered_lookup(small_indexed_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in small_indexed_list.lookups["sample"].mapping.items()
     ]
@@ -195,7 +195,7 @@ def test_create_lte_filtered_lookup(small_indexed_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in small_indexed_list.lookups["sample"].mapping.items()
     ]
@@ -221,7 +221,7 @@ def test_create_function_lookup(unique_integer_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in unique_integer_list.lookups["sample"].mapping.items()
     ]
@@ -246,7 +246,7 @@ def test_create_dict_lookup(simple_dicts_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in simple_dicts_list.lookups["sample"].mapping.items()
     ]
@@ -269,7 +269,7 @@ def test_create_dict_lookup_missing_keys(inconsistent_dicts_list):
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in inconsistent_dicts_list.lookups["sample"].mapping.items()
     ]
@@ -293,9 +293,121 @@ def test_create_lookup_before_data():
     ]
 
     found = [
-        (key, sorted(value))
+        (key, sorted(postings.iterate(value)))
         for key, value
         in indexed_list.lookups["sample"].mapping.items()
     ]
 
     assert expected == found, "Data in mapping is not as expected"
+
+
+def test_extend_merges_into_existing_keys(small_indexed_list):
+    """ Test extending a list merges new items into keys already in a lookup """
+
+    small_indexed_list.create_lookup(name="sample")
+
+    small_indexed_list.extend([1, 4, 4])
+
+    expected = [
+        (1, [0, 3, 6, 9, 12, 15]),
+        (2, [1, 4, 7, 10, 13]),
+        (3, [2, 5, 8, 11, 14]),
+        (4, [16, 17])
+    ]
+
+    found = [
+        (key, sorted(postings.iterate(value)))
+        for key, value
+        in small_indexed_list.lookups["sample"].mapping.items()
+    ]
+
+    assert expected == found, "Data in mapping is not as expected"
+
+
+def test_lookup_transforms_each_item_once(unique_integer_list):
+    """ Test building and updating a filtered lookup applies functions once per item """
+
+    calls = []
+
+    @Indexable
+    def record_call(x):
+
+        calls.append(x)
+
+        return x
+
+    unique_integer_list.create_lookup(record_call(unique_integer_list.item) > 4)
+    unique_integer_list.append(10)
+    del unique_integer_list[0]
+
+    expected = list(range(0, 11)) + [0]
+    found = calls
+
+    assert expected == found, "Functions were not applied exactly once per item"
+
+
+def _mapping_contents(lookup):
+
+    return [(key, sorted(postings.iterate(value))) for key, value in lookup.mapping.items()]
+
+
+def test_create_lookups(inconsistent_dicts_list):
+    """ Test creating several lookups at once matches creating them one by one """
+
+    ilist = inconsistent_dicts_list
+
+    ilist.create_lookups([
+        ilist.item["a"],
+        {"definition": ilist.item["b"] > 2, "name": "b", "hashed": True}
+    ])
+
+    separate = IndexedList(ilist)
+    separate.create_lookup(separate.item["a"], name="a")
+    separate.create_lookup(separate.item["b"] > 2, name="b", hashed=True)
+
+    batch_a = next(lookup for name, lookup in ilist.lookups.items() if name != "b")
+
+    assert _mapping_contents(separate.lookups["a"]) == _mapping_contents(batch_a), \
+        "Data in mapping is not as expected"
+    assert _mapping_contents(separate.lookups["b"]) == _mapping_contents(ilist.lookups["b"]), \
+        "Data in mapping is not as expected"
+    assert 3 == ilist.lookups["b"].row_count, "Row count is not as expected"
+
+
+def test_create_lookups_walks_list_once(unique_integer_list):
+    """ Test each item is read once however many lookups are created """
+
+    calls = []
+
+    @Indexable
+    def record_call(x):
+
+        calls.append(x)
+
+        return x
+
+    # Each pattern applies its own transformations, so shared
+    # functions run once per lookup but the list is walked once
+    unique_integer_list.create_lookups([
+        record_call(unique_integer_list.item),
+        unique_integer_list.item > 4
+    ])
+
+    assert list(range(0, 10)) == calls, "Items were not walked once"
+
+
+def test_create_lookups_with_workers(small_indexed_list, monkeypatch):
+    """ Test lookups filled by worker processes match lookups filled in this process """
+
+    monkeypatch.setattr(parallel, "MIN_CHUNK_SIZE", 4)
+
+    del small_indexed_list[1]
+
+    small_indexed_list.create_lookups([{"name": "serial"}])
+    small_indexed_list.create_lookups([{"name": "parallel"}, small_indexed_list.item > 1], workers=2)
+
+    expected = _mapping_contents(small_indexed_list.lookups["serial"])
+    found = _mapping_contents(small_indexed_list.lookups["parallel"])
+
+    assert expected == found, "Data in mapping is not as expected"
+    assert 14 == small_indexed_list.lookups["parallel"].row_count, "Row count is not as expected"
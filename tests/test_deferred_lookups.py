@@ -0,0 +1,208 @@
+""" Holds tests on lookups built lazily or in a background thread """
+
+import threading
+
+import pytest
+
+import indexedlist.operations as ops
+
+from indexedlist import IndexedList, Indexable, postings
+
+# Set to let background builds using slow() finish
+release_build = threading.Event()
+
+
+@Indexable
+def slow(x):
+    release_build.wait(timeout=10)
+    return x
+
+
+@Indexable
+def slow_positive(x):
+    release_build.wait(timeout=10)
+
+    if x < 0:
+        raise ValueError("Cannot transform")
+
+    return x
+
+
+@Indexable
+def broken(x):
+    raise ValueError("Cannot transform")
+
+
+@Indexable
+def negate(x):
+    return -x
+
+
+def _mapping_contents(lookup):
+
+    return {key: sorted(postings.iterate(value)) for key, value in lookup.mapping.items()}
+
+
+@pytest.fixture()
+def numbers():
+
+    return IndexedList(range(0, 20))
+
+
+class TestLazy:
+    """ Test lookups that are only built when a query could use them """
+
+    def test_not_built(self, numbers):
+        """ Test a lazy lookup is empty and unused until needed """
+
+        numbers.create_lookup(name="lazy", lazy=True)
+        lookup = numbers.lookups["lazy"]
+
+        assert not lookup.ready, "Lookup was ready"
+        assert 0 == len(lookup.mapping), "Lookup was built"
+
+    def test_built_on_first_use(self, numbers):
+        """ Test a lazy lookup is built and used by the first query it can serve """
+
+        numbers.create_lookup(name="lazy", lazy=True)
+
+        plan = numbers.plan(numbers.item == 5)
+
+        assert numbers.lookups["lazy"].ready, "Lookup was not built"
+        assert isinstance(plan.operations[0], ops.LookupSeek), "Lookup not used"
+        assert [(5, 5)] == list(numbers.search(numbers.item == 5)), "Results did not match"
+
+    def test_not_built_for_other_queries(self, numbers):
+        """ Test queries the lookup can't serve don't build it """
+
+        numbers.create_lookup(numbers.item > 10, name="lazy", lazy=True)
+        numbers.create_lookup(name="hashed", hashed=True, lazy=True)
+
+        list(numbers.search(numbers.item < 5))
+        list(numbers.search(~(numbers.item == 15)))
+
+        assert not numbers.lookups["lazy"].ready, "Filtered lookup was built"
+        assert not numbers.lookups["hashed"].ready, "Hashed lookup was built"
+
+        list(numbers.search(numbers.item == 3))
+
+        assert not numbers.lookups["lazy"].ready, "Filtered lookup was built"
+        assert numbers.lookups["hashed"].ready, "Hashed lookup was not built"
+
+    def test_built_for_order(self, numbers):
+        """ Test ordering by a lazy lookup's key builds it """
+
+        numbers.create_lookup(name="lazy", lazy=True)
+
+        found = numbers.first(negate(numbers.item) < -10, order_by=numbers.item)
+
+        assert numbers.lookups["lazy"].ready, "Lookup was not built"
+        assert (11, 11) == found, "Result did not match"
+
+    def test_changes_before_build(self, numbers):
+        """ Test a lazy lookup built after the list changes holds the current items """
+
+        numbers.create_lookup(name="lazy", lazy=True)
+
+        numbers.append(50)
+        del numbers[0]
+        numbers[0] = 100
+
+        numbers.build_lookups()
+
+        expected = {value: [row_id] for value, row_id in zip(numbers, numbers._row_ids)}
+        found = _mapping_contents(numbers.lookups["lazy"])
+
+        assert expected == found, "Lookup contents do not match"
+
+
+class TestBackground:
+    """ Test lookups built in a background thread """
+
+    def test_changes_during_build(self, numbers):
+        """ Test changes made while a lookup is being built are replayed into it """
+
+        release_build.clear()
+        numbers.create_lookup(slow(numbers.item), name="background", background=True)
+
+        plan = numbers.plan(slow(numbers.item) == 5)
+        assert isinstance(plan.operations[0], ops.DataScan), "Lookup used before it was built"
+
+        release_build.set()
+
+        numbers.extend([50, 51])
+        del numbers[0]
+        numbers[3] = 100
+        numbers.append(52)
+
+        numbers.build_lookups()
+
+        expected = {value: [row_id] for value, row_id in zip(numbers, numbers._row_ids)}
+        found = _mapping_contents(numbers.lookups["background"])
+
+        assert expected == found, "Lookup contents do not match"
+
+        plan = numbers.plan(slow(numbers.item) == 100)
+
+        assert isinstance(plan.operations[0], ops.LookupSeek), "Lookup not used"
+        assert [(3, 100)] == list(plan.execute(numbers)), "Results did not match"
+
+    def test_moves_during_build(self, numbers):
+        """ Test sorting, reversing and inserting don't wait for a build, and are replayed into it """
+
+        release_build.clear()
+        numbers.create_lookup(name="plain")
+        numbers.create_lookup(slow(numbers.item), name="background", background=True)
+
+        def move():
+            numbers.sort(key=lambda x: x % 3)
+            numbers.reverse()
+            numbers.insert(5, 100)
+            numbers[7:7] = [101, 102]
+
+        mover = threading.Thread(target=move, daemon=True)
+        mover.start()
+        mover.join(5)
+
+        moved = not mover.is_alive()
+        release_build.set()
+        mover.join(10)
+
+        assert moved, "Changes waited for the build"
+
+        numbers.build_lookups()
+
+        expected = {value: [row_id] for value, row_id in zip(numbers, numbers._row_ids)}
+
+        assert expected == _mapping_contents(numbers.lookups["background"]), "Lookup contents do not match"
+        assert expected == _mapping_contents(numbers.lookups["plain"]), "Lookup contents do not match"
+
+    def test_failed_build(self, numbers):
+        """ Test a lookup whose build fails is removed and its error raised """
+
+        numbers.create_lookup(broken(numbers.item), name="broken", background=True)
+
+        with pytest.raises(ValueError):
+            numbers.build_lookups()
+
+        assert "broken" not in numbers.lookups, "Lookup was not removed"
+
+    def test_failed_replay(self, numbers):
+        """ Test a lookup that fails to replay changes made during its build is removed """
+
+        release_build.clear()
+        numbers.create_lookup(slow_positive(numbers.item), name="background", background=True)
+
+        numbers.append(-1)
+        release_build.set()
+
+        with pytest.raises(ValueError):
+            numbers.build_lookups()
+
+        assert "background" not in numbers.lookups, "Lookup was not removed"
+
+    def test_lazy_and_background(self, numbers):
+        """ Test a lookup can't be both lazy and built in the background """
+
+        with pytest.raises(ValueError):
+            numbers.create_lookup(lazy=True, background=True)
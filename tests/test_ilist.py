@@ -130,3 +130,74 @@ class TestIndexedList:
         found = sorted(list_with_lookups.lookups["basic"].mapping.keys())
 
         assert expected == found
+
+    def test_search_after_del(self, list_with_lookups):
+        """ Test that lookups return correct positions after an earlier item is deleted """
+
+        del list_with_lookups[0]
+
+        expected = [(2, 98), (3, 99)]
+        found = sorted(list_with_lookups.search(list_with_lookups.item > 97))
+
+        assert expected == found
+
+    def test_search_after_repeated_del(self, list_with_lookups):
+        """ Test that lookups stay consistent across several deletions """
+
+        del list_with_lookups[3]
+        del list_with_lookups[0]
+        del list_with_lookups[-1]
+
+        expected = [(1, 97)]
+        found = list(list_with_lookups.search(list_with_lookups.item == 97))
+
+        assert expected == found
+
+    def test_setitem_same_key_on_lookup(self, list_with_lookups):
+        """ Test that replacing an item with an equal value keeps it in lookups """
+
+        list_with_lookups[3] = 98
+
+        expected = [(3, 98)]
+        found = sorted(list_with_lookups.search(list_with_lookups.item == 98))
+
+        assert expected == found
+
+    def test_extend_with_generator_on_lookup(self, list_with_lookups):
+        """ Test that a generator passed to extend is added to lookups """
+
+        list_with_lookups.extend(i for i in (100, 101))
+
+        expected = [(5, 100), (6, 101)]
+        found = sorted(list_with_lookups.search(list_with_lookups.item >= 100))
+
+        assert expected == found
+
+    def test_setitem_unchanged_key_skips_lookup(self):
+        """ Test replacing an item leaves lookups whose key didn't change untouched """
+
+        ilist = IndexedList({"id": i, "status": "new"} for i in range(0, 5))
+        ilist.create_lookup(ilist.item["id"], name="id")
+        ilist.create_lookup(ilist.item["status"], name="status")
+
+        changed = []
+
+        for lookup in ilist.lookups.values():
+            lookup._add_index = lambda key, row_id, name=lookup.name: changed.append(name)
+
+        ilist[2] = {"id": 2, "status": "done"}
+
+        assert ["status"] == changed, "Lookups changed did not match"
+        assert [2] == [index for index, _ in ilist.search(ilist.item["id"] == 2)], \
+            "Search results do not match"
+
+    def test_setitem_into_and_out_of_filter(self, list_with_lookups):
+        """ Test replacing items that move into and out of a filtered lookup """
+
+        list_with_lookups[0] = 1000
+        list_with_lookups[4] = 0
+
+        expected = [98, 1000]
+        found = list(list_with_lookups.lookups["filtered"].mapping.keys())
+
+        assert expected == found
@@ -0,0 +1,262 @@
+""" Holds tests on list methods that insert, remove and reorder items in place """
+
+import random
+
+import pytest
+
+from indexedlist import IndexedList, postings
+
+
+@pytest.fixture()
+def dicts():
+    """ IndexedList of dicts with sorted, hashed and filtered lookups """
+
+    ilist = IndexedList({"id": i, "group": i % 3} for i in range(0, 10))
+
+    ilist.create_lookup(ilist.item["id"], name="id")
+    ilist.create_lookup(ilist.item["group"], name="group", hashed=True)
+    ilist.create_lookup(ilist.item["id"] > 5, name="filtered")
+
+    return ilist
+
+
+def assert_consistent(ilist):
+    """ Assert lookups and row ids agree with the items in the list """
+
+    assert ilist._row_ids == sorted(set(ilist._row_ids)), "Row ids are not ascending"
+    assert len(ilist._row_ids) == len(ilist._data), "Row ids do not match items"
+
+    for lookup in ilist.lookups.values():
+
+        rebuilt = IndexedList(ilist._data)
+        rebuilt.create_lookup(lookup.pattern, hashed=not lookup.ordered)
+        rebuilt_lookup = next(iter(rebuilt.lookups.values()))
+
+        position_of = dict(zip(ilist._row_ids, range(0, len(ilist._row_ids))))
+
+        found = {
+            key: sorted(position_of[row_id] for row_id in postings.iterate(posting))
+            for key, posting in lookup.mapping.items()
+        }
+        expected = {
+            key: sorted(postings.iterate(posting))
+            for key, posting in rebuilt_lookup.mapping.items()
+        }
+
+        assert expected == found, f"Lookup {lookup.name} does not match items"
+        assert rebuilt_lookup.row_count == lookup.row_count, f"Row count of {lookup.name} does not match"
+
+
+def ids(ilist):
+
+    return [item["id"] for item in ilist]
+
+
+def test_insert(dicts):
+    """ Test inserting items at the start, middle and end of the list """
+
+    dicts.insert(0, {"id": 100, "group": 0})
+    dicts.insert(5, {"id": 101, "group": 1})
+    dicts.insert(-1, {"id": 102, "group": 2})
+    dicts.insert(1000, {"id": 103, "group": 0})
+
+    assert [100, 0, 1, 2, 3, 101, 4, 5, 6, 7, 8, 102, 9, 103] == ids(dicts), "Items do not match"
+    assert [(5, {"id": 101, "group": 1})] == list(dicts.search(dicts.item["id"] == 101)), \
+        "Search results do not match"
+
+    assert_consistent(dicts)
+
+
+def test_repeated_insert_relabels_row_ids(dicts):
+    """ Test repeatedly inserting at the same index once the gap in row ids runs out """
+
+    for i in range(0, 50):
+        dicts.insert(3, {"id": 100 + i, "group": 0})
+
+    assert [0, 1, 2] + list(range(149, 99, -1)) + list(range(3, 10)) == ids(dicts), "Items do not match"
+    assert [(59, {"id": 9, "group": 0})] == list(dicts.search(dicts.item["id"] == 9)), \
+        "Search results do not match"
+
+    assert_consistent(dicts)
+
+
+def test_pop_and_remove(dicts):
+    """ Test popping and removing items """
+
+    assert {"id": 9, "group": 0} == dicts.pop(), "Popped item does not match"
+    assert {"id": 2, "group": 2} == dicts.pop(2), "Popped item does not match"
+
+    dicts.remove({"id": 5, "group": 2})
+
+    assert [0, 1, 3, 4, 6, 7, 8] == ids(dicts), "Items do not match"
+
+    with pytest.raises(ValueError):
+        dicts.remove({"id": 5, "group": 2})
+
+    with pytest.raises(IndexError):
+        IndexedList().pop()
+
+    assert_consistent(dicts)
+
+
+def test_sort_and_reverse(dicts):
+    """ Test sorting and reversing remaps lookups to the new positions """
+
+    dicts.sort(key=lambda item: (item["group"], -item["id"]))
+
+    assert [9, 6, 3, 0, 7, 4, 1, 8, 5, 2] == ids(dicts), "Sorted items do not match"
+    assert [(0, {"id": 9, "group": 0})] == list(dicts.search(dicts.item["id"] == 9)), \
+        "Search results do not match"
+
+    assert_consistent(dicts)
+
+    dicts.reverse()
+
+    assert [2, 5, 8, 1, 4, 7, 0, 3, 6, 9] == ids(dicts), "Reversed items do not match"
+    assert_consistent(dicts)
+
+
+def test_sort_is_stable():
+    """ Test sorting keeps equal items in order, including when reversed """
+
+    ilist = IndexedList([(1, "a"), (0, "b"), (1, "c"), (0, "d")])
+    ilist.create_lookup(ilist.item[0])
+
+    ilist.sort(key=lambda item: item[0], reverse=True)
+
+    assert [(1, "a"), (1, "c"), (0, "b"), (0, "d")] == list(ilist), "Sorted items do not match"
+    assert_consistent(ilist)
+
+
+def test_slice_assignment(dicts):
+    """ Test replacing slices with more, fewer and the same number of items """
+
+    dicts[2:4] = [{"id": 100 + i, "group": i % 3} for i in range(0, 5)]
+    dicts[0:3] = []
+    dicts[::2] = [{"id": 200 + i, "group": 1} for i in range(0, 5)]
+
+    assert [200, 102, 201, 104, 202, 5, 203, 7, 204, 9] == ids(dicts), "Items do not match"
+    assert_consistent(dicts)
+
+    with pytest.raises(ValueError):
+        dicts[::2] = []
+
+
+def test_failed_slice_assignment(dicts):
+    """ Test a slice assignment that fails while updating lookups leaves the list unchanged """
+
+    before = list(dicts)
+
+    # Making room may give nearby items new row ids, but lookups are kept consistent
+    for key in (slice(0, 2), slice(3, 4), slice(8, 10), slice(5, 5)):
+
+        with pytest.raises(TypeError):
+            dicts[key] = [{"id": 50, "group": 1}, 5, {"id": 51, "group": 2}]
+
+        assert before == list(dicts), "Items changed"
+        assert_consistent(dicts)
+
+    # Items added at the end are given new row ids, after those of any items replaced
+    dicts[8:] = [{"id": 50 + i, "group": i % 3} for i in range(0, 4)]
+
+    assert [0, 1, 2, 3, 4, 5, 6, 7, 50, 51, 52, 53] == ids(dicts), "Items do not match"
+    assert_consistent(dicts)
+
+
+def test_slice_deletion(dicts):
+    """ Test deleting slices, with and without a step """
+
+    del dicts[1:3]
+    del dicts[::3]
+
+    assert [3, 4, 6, 7, 9] == ids(dicts), "Items do not match"
+    assert_consistent(dicts)
+
+
+def test_clear_and_iadd(dicts):
+    """ Test clearing the list empties its lookups, and += extends it """
+
+    dicts.clear()
+
+    assert [] == list(dicts), "List not cleared"
+    assert_consistent(dicts)
+
+    dicts += [{"id": 1, "group": 1}]
+
+    assert [(0, {"id": 1, "group": 1})] == list(dicts.search(dicts.item["id"] == 1)), \
+        "Search results do not match"
+
+
+def test_index():
+    """ Test finding the index of an item """
+
+    ilist = IndexedList([1, 2, 3, 2])
+
+    assert 1 == ilist.index(2), "Index does not match"
+    assert 3 == ilist.index(2, 2), "Index does not match"
+
+
+def test_random_changes_match_list(dicts):
+    """ Test a random mix of changes leaves the list and lookups matching a plain list """
+
+    randomizer = random.Random(0)
+    expected = list(dicts)
+    next_id = 100
+
+    for _ in range(0, 300):
+        operation = randomizer.choice(["insert", "pop", "slice", "sort", "reverse", "setitem"])
+        index = randomizer.randint(-len(expected) - 1, len(expected) + 1)
+        item = {"id": next_id, "group": next_id % 3}
+        next_id += 1
+
+        if not expected and operation in ("pop", "setitem"):
+            continue
+
+        for target in (expected, dicts):
+
+            if operation == "insert":
+                target.insert(index, item)
+            elif operation == "pop":
+                target.pop(index % len(target))
+            elif operation == "slice":
+                target[index:index + 2] = [item, dict(item, id=item["id"] + 10000)]
+            elif operation == "sort":
+                target.sort(key=lambda value: value["group"])
+            elif operation == "reverse":
+                target.reverse()
+            else:
+                target[index % len(target)] = item
+
+    assert expected == list(dicts), "Items do not match"
+    assert_consistent(dicts)
+
+
+def test_many_inserts_match_list():
+    """ Test inserting many items at random, clustered and sequential positions """
+
+    randomizer = random.Random(1)
+
+    ilist = IndexedList(range(0, 200))
+    ilist.create_lookup(name="sorted")
+    ilist.create_lookup(hashed=True, name="hashed")
+
+    expected = list(ilist)
+
+    for value in range(1000, 1600):
+        pattern = value % 3
+
+        if pattern == 0:
+            index = randomizer.randrange(0, len(expected))
+        elif pattern == 1:
+            index = 100
+        else:
+            index = 150 + value % 50
+
+        expected.insert(index, value)
+        ilist.insert(index, value)
+
+    assert expected == list(ilist), "Items do not match"
+    assert [(expected.index(1300), 1300)] == list(ilist.search(ilist.item == 1300)), \
+        "Search results do not match"
+
+    assert_consistent(ilist)
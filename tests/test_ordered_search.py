@@ -0,0 +1,191 @@
+""" Holds tests on ordering, limiting and offsetting search results """
+
+import pytest
+
+import indexedlist.operations as ops
+
+from indexedlist import IndexedList
+
+
+def _dicts():
+
+    return [
+        {
+            "a": i % 5,
+            "b": (i * 7) % 20
+        }
+        for i in range(0, 20)
+    ]
+
+
+@pytest.fixture(scope="module")
+def unindexed_dicts():
+    """ IndexedList of dicts without lookups """
+
+    return IndexedList(_dicts())
+
+
+@pytest.fixture(scope="module")
+def indexed_dicts():
+    """ IndexedList of dicts indexed by both 'a' and 'b' """
+
+    ilist = IndexedList(_dicts())
+    ilist.create_lookup(ilist.item["a"])
+    ilist.create_lookup(ilist.item["b"])
+
+    return ilist
+
+
+@pytest.fixture(scope="module")
+def hash_indexed_dicts():
+    """ IndexedList of dicts with hashed lookups on both 'a' and 'b' """
+
+    ilist = IndexedList(_dicts())
+    ilist.create_lookup(ilist.item["a"], hashed=True)
+    ilist.create_lookup(ilist.item["b"], hashed=True)
+
+    return ilist
+
+
+def _operation_types(plan):
+
+    return [type(operation) for operation in plan.operations]
+
+
+class TestPlans:
+    """ Tests plan creation for ordered and limited searches """
+
+    def test_index_order_merges_postings(self, indexed_dicts):
+        """ Test ordering lookup results by index merges postings in row id order """
+
+        plan = indexed_dicts.plan(indexed_dicts.item["a"].in_(1, 2), order_by="index")
+
+        expected = [ops.LookupSeek, ops.OrderedChain, ops.FetchItemsByIndices]
+
+        assert expected == _operation_types(plan), "Classes in plan do not match"
+
+    def test_index_order_scan(self, unindexed_dicts):
+        """ Test ordering by index in reverse scans the list backwards """
+
+        plan = unindexed_dicts.plan(unindexed_dicts.item["a"] == 1, order_by="index", descending=True)
+
+        assert [ops.DataScan] == _operation_types(plan), "Classes in plan do not match"
+        assert plan.operations[0].reverse, "Scan is not reversed"
+
+    def test_key_order_seeks_in_order(self, indexed_dicts):
+        """ Test ordering by the key being searched seeks the lookup in key order """
+
+        ilist = indexed_dicts
+
+        plan = ilist.plan(ilist.item["b"] > 5, order_by=ilist.item["b"], descending=True)
+
+        expected = [ops.LookupRangeSeek, ops.Chain, ops.FetchItemsByIndices]
+
+        assert expected == _operation_types(plan), "Classes in plan do not match"
+        assert plan.operations[0].reverse, "Seek is not reversed"
+
+    def test_key_order_walks_lookup_for_limit(self, indexed_dicts):
+        """ Test a small limit walks the ordering lookup instead of sorting every match """
+
+        ilist = indexed_dicts
+
+        plan = ilist.plan(ilist.item["a"] < 4, order_by=ilist.item["b"], limit=2)
+
+        expected = [ops.LookupRangeSeek, ops.Chain, ops.FetchItemsByIndices, ops.Filter, ops.Slice]
+
+        assert expected == _operation_types(plan), "Classes in plan do not match"
+
+    def test_key_order_sorts_without_lookup(self, hash_indexed_dicts):
+        """ Test results are sorted when no sorted lookup holds the ordering key """
+
+        ilist = hash_indexed_dicts
+
+        plan = ilist.plan(ilist.item["a"] == 1, order_by=ilist.item["b"])
+
+        expected = [ops.LookupSeek, ops.Chain, ops.FetchItemsByIndices, ops.Sort]
+
+        assert expected == _operation_types(plan), "Classes in plan do not match"
+
+    def test_order_by_comparison_invalid(self, indexed_dicts):
+        """ Test ordering by a comparison is rejected """
+
+        with pytest.raises(ValueError):
+            indexed_dicts.plan(indexed_dicts.item["a"] == 1, order_by=indexed_dicts.item["b"] > 1)
+
+    def test_limit_not_answered_by_lookups(self, indexed_dicts):
+        """ Test a limited plan isn't counted from lookups alone """
+
+        plan = indexed_dicts.plan(indexed_dicts.item["a"] == 1, limit=2)
+
+        assert not plan.answered_by_lookups, "Limited plan answered by lookups"
+
+
+class TestResults:
+    """ Tests results of ordered and limited searches, with and without lookups """
+
+    @pytest.fixture(params=["unindexed_dicts", "indexed_dicts", "hash_indexed_dicts"])
+    def dicts(self, request):
+
+        return request.getfixturevalue(request.param)
+
+    def test_index_order(self, dicts):
+        """ Test results ordered by list index """
+
+        expected = [1, 2, 6, 7, 11, 12, 16, 17]
+        found = [index for index, _ in dicts.search(dicts.item["a"].in_(1, 2), order_by="index")]
+
+        assert expected == found, "Results did not match"
+
+    def test_index_order_descending(self, dicts):
+        """ Test results ordered by list index, last first """
+
+        expected = [17, 16, 12, 11, 7, 6, 2, 1]
+        found = [
+            index for index, _
+            in dicts.search(dicts.item["a"].in_(1, 2), order_by="index", descending=True)
+        ]
+
+        assert expected == found, "Results did not match"
+
+    def test_key_order(self, dicts):
+        """ Test results ordered by a different key than the one searched """
+
+        expected = [0, 1, 2, 4, 5, 6, 7, 9, 10, 11, 12, 14, 15, 16, 17, 19]
+        found = [
+            item["b"] for _, item
+            in dicts.search(dicts.item["a"] < 4, order_by=dicts.item["b"])
+        ]
+
+        assert expected == found, "Results did not match"
+
+    def test_key_order_descending_with_limit(self, dicts):
+        """ Test the largest keys are returned first and limited """
+
+        expected = [(17, {"a": 2, "b": 19}), (14, {"a": 4, "b": 18})]
+        found = list(dicts.search(dicts.item["b"] > 5, order_by=dicts.item["b"], descending=True, limit=2))
+
+        assert expected == found, "Results did not match"
+
+    def test_offset_and_limit(self, dicts):
+        """ Test skipping then limiting ordered results """
+
+        expected = [6, 11]
+        found = [
+            index for index, _
+            in dicts.search(dicts.item["a"] == 1, order_by="index", offset=1, limit=2)
+        ]
+
+        assert expected == found, "Results did not match"
+
+    def test_first_ordered(self, dicts):
+        """ Test first() returns the smallest key when ordered """
+
+        expected = (0, {"a": 0, "b": 0})
+        found = dicts.first(dicts.item["a"] == 0, order_by=dicts.item["b"])
+
+        assert expected == found, "Results did not match"
+
+    def test_count_with_limit(self, dicts):
+        """ Test count() respects a limit """
+
+        assert 2 == dicts.plan(dicts.item["a"] == 1, limit=2).count(dicts), "Count did not match"
@@ -0,0 +1,183 @@
+""" Holds tests on splitting full list scans across worker processes """
+
+import pickle
+import sys
+
+import pytest
+
+import indexedlist.operations as ops
+
+from indexedlist import IndexedList, Indexable, parallel
+
+
+@Indexable
+def shout(x):
+    return x.upper()
+
+
+# Number of times strict_shout() has been called in the current process
+strict_calls = 0
+
+
+@Indexable
+def strict_shout(x):
+    global strict_calls
+    strict_calls += 1
+
+    if not isinstance(x, str):
+        raise TypeError("Not a string")
+
+    return x.upper()
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    """ Split even small lists into several chunks """
+
+    monkeypatch.setattr(parallel, "MIN_CHUNK_SIZE", 3)
+
+
+@pytest.fixture(scope="module")
+def words():
+    """ IndexedList of strings scanned in parallel """
+
+    items = ["apple", "banana", "cherry", "date", "elder", "fig", "grape"] * 3
+
+    return IndexedList(items, parallel_scan_rows=10, scan_workers=2)
+
+
+def test_plan_shows_workers(words):
+    """ Test the plan shows a scan split across workers """
+
+    plan = words.plan(words.item == "fig")
+
+    assert [ops.DataScan] == [type(operation) for operation in plan.operations], "Classes do not match"
+    assert 2 == plan.describe()["operations"][0]["args"]["workers"], "Workers not described"
+
+
+def test_small_list_not_parallel():
+    """ Test lists below the threshold are scanned in the current process """
+
+    ilist = IndexedList(["a", "b"], parallel_scan_rows=10, scan_workers=2)
+
+    assert ilist.plan(ilist.item == "a").operations[0].workers is None, "Small scan split across workers"
+
+
+def test_results(words):
+    """ Test results of a parallel scan using a decorated function """
+
+    expected = [(5, "fig"), (12, "fig"), (19, "fig")]
+    found = list(words.search(shout(words.item) == "FIG"))
+
+    assert expected == found, "Results did not match"
+
+
+def test_reverse_results(words):
+    """ Test results of a parallel scan in reverse list order """
+
+    expected = [20, 17, 13, 10]
+    found = [
+        index for index, _
+        in words.search(words.item.in_("date", "grape"), order_by="index", descending=True, limit=4)
+    ]
+
+    assert expected == found, "Results did not match"
+
+
+def test_patterns_pickle():
+    """ Test patterns using item getters and decorated functions survive pickling """
+
+    ilist = IndexedList()
+    pattern = shout(ilist.item["name"]) == "FIG"
+
+    unpickled = pickle.loads(pickle.dumps(pattern.pattern))
+
+    assert unpickled.matches({"name": "fig"}), "Unpickled pattern did not match"
+    assert not unpickled.matches({}), "Unpickled pattern matched skipped item"
+    assert pattern.pattern.transformations.signature == unpickled.transformations.signature, \
+        "Signatures do not match"
+
+
+def test_pool_reused(words):
+    """ Test scans with the same number of workers share a pool """
+
+    list(words.search(words.item == "fig"))
+    pool = parallel._pools[2]
+
+    assert [(5, "fig"), (12, "fig"), (19, "fig")] == list(words.search(words.item == "fig"))
+    assert [(0, "apple"), (7, "apple"), (14, "apple")] == list(words.search(words.item == "apple"))
+    assert parallel._pools[2] is pool, "Pool was not reused"
+
+
+def test_function_defined_after_pool_started(words, monkeypatch):
+    """ Test a function workers can't find, as it was defined after they started, is run locally """
+
+    list(words.search(words.item == "fig"))
+    pool = parallel._pools[2]
+
+    def late_shout(x):
+        return x.upper()
+
+    # Defined at module level as far as pickling is concerned, but only now
+    late_shout.__qualname__ = "late_shout"
+    late = Indexable(late_shout)
+    monkeypatch.setattr(sys.modules[__name__], "late_shout", late, raising=False)
+
+    expected = [(5, "fig"), (12, "fig"), (19, "fig")]
+    found = list(words.search(late(words.item) == "FIG"))
+
+    assert expected == found, "Results did not match"
+    assert parallel._pools.get(2) is not pool, "Out of date pool was reused"
+
+
+def test_unpicklable_pattern_scanned_locally(words):
+    """ Test a scan using a function that can't be pickled runs in the current process """
+
+    @Indexable
+    def whisper(x):
+        return x.lower()
+
+    expected = [(5, "fig"), (12, "fig"), (19, "fig")]
+    found = list(words.search(whisper(words.item) == "fig"))
+
+    assert expected == found, "Results did not match"
+
+
+def test_unpicklable_items_scanned_locally():
+    """ Test a scan of items that can't be pickled runs in the current process """
+
+    items = [{"name": name, "callback": lambda: name} for name in ["apple", "fig", "grape"] * 5]
+    ilist = IndexedList(items, parallel_scan_rows=10, scan_workers=2)
+
+    expected = [1, 4, 7, 10, 13]
+    found = [index for index, _ in ilist.search(ilist.item["name"] == "fig")]
+
+    assert expected == found, "Results did not match"
+
+
+def test_unpicklable_lookups_built_locally(words):
+    """ Test lookups using a function that can't be pickled are built in the current process """
+
+    @Indexable
+    def whisper(x):
+        return x.lower()
+
+    ilist = IndexedList(words)
+    ilist.create_lookups([whisper(ilist.item)], workers=2)
+
+    assert ilist.count(whisper(ilist.item) == "fig") == 3
+    assert ilist.plan(whisper(ilist.item) == "fig").operations[0].lookup is not None
+
+
+def test_worker_errors_raised():
+    """ Test an error raised by a transformation in a worker is raised, not retried locally """
+
+    global strict_calls
+    strict_calls = 0
+
+    ilist = IndexedList(["apple", "fig", "grape"] * 5 + [None], parallel_scan_rows=10, scan_workers=2)
+
+    with pytest.raises(TypeError):
+        list(ilist.search(strict_shout(ilist.item) == "FIG"))
+
+    assert 0 == strict_calls, "Chunks were scanned again in the current process"
@@ -0,0 +1,178 @@
+""" Holds tests on the compact postings used to store row ids in lookups """
+
+import random
+
+from array import array
+
+from indexedlist import IndexedList, postings
+
+
+def test_single_row_id_inline():
+    """ Test a posting with one row id is stored as a plain int """
+
+    found = postings.add(None, 5)
+
+    assert 5 == found, "Single row id not stored inline"
+
+
+def test_small_posting_array():
+    """ Test a small posting is stored as a sorted array """
+
+    posting = postings.add(None, 5)
+    posting = postings.add(posting, 2)
+    posting = postings.add(posting, 9)
+
+    assert isinstance(posting, array), "Small posting not stored as an array"
+    assert [2, 5, 9] == list(posting), "Array is not sorted"
+
+
+def test_dense_posting_bitmap():
+    """ Test a large, dense posting is stored as a bitmap """
+
+    posting = postings.from_row_ids(range(0, 1000, 2))
+
+    assert isinstance(posting, postings.Bitmap), "Dense posting not stored as a bitmap"
+    assert list(range(0, 1000, 2)) == list(postings.iterate(posting)), "Row ids do not match"
+
+
+def test_sparse_posting_array():
+    """ Test a large, sparse posting is stored as an array """
+
+    posting = postings.from_row_ids(range(0, 100000, 1000))
+
+    assert isinstance(posting, array), "Sparse posting not stored as an array"
+
+
+def test_bitmap_grows_downwards():
+    """ Test adding a row id below a bitmap's range """
+
+    posting = postings.from_row_ids(range(100, 200))
+    posting = postings.add(posting, 50)
+
+    assert isinstance(posting, postings.Bitmap), "Posting is no longer a bitmap"
+    assert [50] + list(range(100, 200)) == list(posting), "Row ids do not match"
+
+
+def test_bitmap_to_array_when_sparse():
+    """ Test a bitmap is converted back to an array once most row ids are removed """
+
+    posting = postings.from_row_ids(range(0, 100))
+
+    for row_id in range(1, 99):
+        posting = postings.remove(posting, row_id)
+
+    assert isinstance(posting, array), "Sparse posting not converted to an array"
+    assert [0, 99] == list(posting), "Row ids do not match"
+
+
+def test_remove_to_inline_and_empty():
+    """ Test removing row ids shrinks a posting to an int, then None """
+
+    posting = postings.from_row_ids([3, 4])
+
+    posting = postings.remove(posting, 3)
+    assert 4 == posting, "Posting not shrunk to an int"
+
+    posting = postings.remove(posting, 4)
+    assert posting is None, "Empty posting not returned as None"
+
+
+def test_contains():
+    """ Test checking membership of each form of posting """
+
+    for posting in (7, postings.from_row_ids([1, 7]), postings.from_row_ids(range(0, 100))):
+        assert postings.contains(posting, 7), "Row id not found"
+        assert not postings.contains(posting, 1000), "Missing row id found"
+
+
+def test_lookup_uses_compact_postings():
+    """ Test a lookup stores unique keys inline and repeated keys in arrays or bitmaps """
+
+    ilist = IndexedList([i % 2 for i in range(0, 200)] + [5])
+    ilist.create_lookup(name="sample")
+
+    mapping = ilist.lookups["sample"].mapping
+
+    assert isinstance(mapping[0], postings.Bitmap), "Dense key not stored as a bitmap"
+    assert 200 == mapping[5], "Unique key not stored inline"
+
+    expected = [(199, 1), (200, 5)]
+    found = sorted(ilist.search(ilist.item.in_(1, 5)))[-2:]
+
+    assert expected == found, "Results did not match"
+
+
+def test_subtract():
+    """ Test removing many row ids from postings of each form """
+
+    for row_ids in ([5], [1, 4, 9], list(range(0, 200))):
+        posting = postings.from_row_ids(row_ids)
+        removed = row_ids[::2]
+
+        remaining = postings.subtract(posting, removed)
+        expected = row_ids[1::2] or None
+
+        found = None if remaining is None else list(postings.iterate(remaining))
+
+        assert expected == found, "Row ids do not match"
+
+
+def test_merge_and_subtract_match_sets():
+    """ Test adding and removing many row ids at once matches doing so with sets """
+
+    rng = random.Random(0)
+
+    for spread in (1, 10, 1000):
+        posting = None
+        expected = set()
+
+        for _ in range(0, 200):
+            row_ids = rng.sample(range(0, 500 * spread, spread), rng.randrange(1, 40))
+
+            if rng.random() < 0.6 or posting is None:
+                posting = postings.merge(posting, row_ids)
+                expected.update(row_ids)
+            else:
+                posting = postings.subtract(posting, row_ids)
+                expected.difference_update(row_ids)
+
+            found = [] if posting is None else list(postings.iterate(posting))
+
+            assert sorted(expected) == found, "Row ids do not match"
+
+
+def test_merge_appends_in_place():
+    """ Test row ids added after the end of a posting are appended, not rebuilt """
+
+    for spread in (1, 1000):
+        posting = postings.from_row_ids(range(0, 1000 * spread, spread))
+        merged = postings.merge(posting, range(1000 * spread, 1040 * spread, spread))
+
+        assert merged is posting, "Posting was rebuilt"
+        assert 1040 == postings.size(merged), "Row ids not added"
+
+
+def test_remap():
+    """ Test replacing row ids in postings of each form """
+
+    new_row_ids = {row_id: 1000 - row_id for row_id in range(0, 200, 3)}
+
+    for row_ids in ([3], [4], [1, 3, 6], list(range(0, 200))):
+        posting = postings.from_row_ids(row_ids)
+
+        expected = sorted(new_row_ids.get(row_id, row_id) for row_id in row_ids)
+        found = list(postings.iterate(postings.remap(posting, new_row_ids)))
+
+        assert expected == found, "Row ids do not match"
+
+
+def test_copy():
+    """ Test changing a copy of a posting leaves the original unchanged """
+
+    for row_ids in ([3], [1, 3, 6], list(range(0, 200))):
+        posting = postings.from_row_ids(row_ids)
+        copied = postings.add(postings.copy(posting), 500)
+        copied = postings.remove(copied, row_ids[0])
+
+        assert list(postings.iterate(posting)) == row_ids, "Original posting changed"
+        assert list(postings.iterate(copied)) == row_ids[1:] + [500], "Row ids do not match"
@@ -0,0 +1,240 @@
+""" Holds tests on prepared queries and the plans cached for them """
+
+import pytest
+
+import indexedlist.operations as ops
+
+from indexedlist import IndexedList, Param
+
+
+def _dicts():
+
+    return [{"id": i, "group": i % 4} for i in range(0, 40)]
+
+
+@pytest.fixture
+def indexed_dicts():
+    """ IndexedList of dicts indexed by 'id' and 'group' """
+
+    ilist = IndexedList(_dicts())
+    ilist.create_lookup(ilist.item["id"], name="id")
+    ilist.create_lookup(ilist.item["group"], name="group", hashed=True)
+
+    return ilist
+
+
+@pytest.fixture(params=[True, False], ids=["indexed", "unindexed"])
+def dicts(request):
+    """ IndexedList of dicts, with and without lookups """
+
+    ilist = IndexedList(_dicts())
+
+    if request.param:
+        ilist.create_lookup(ilist.item["id"])
+        ilist.create_lookup(ilist.item["group"])
+
+    return ilist
+
+
+class TestResults:
+    """ Tests results of prepared queries match the equivalent searches """
+
+    @pytest.mark.parametrize(
+        "build_query,values",
+        [
+            (lambda x: x.item["id"] == Param("id"), {"id": 7}),
+            (lambda x: x.item["id"].in_(Param("a"), Param("b")), {"a": 3, "b": 30}),
+            (lambda x: x.item["id"] > Param("id"), {"id": 35}),
+            (lambda x: x.item["id"].between(Param("low"), Param("high")), {"low": 5, "high": 9}),
+            (
+                lambda x: (x.item["group"] == Param("group")) & (x.item["id"] < Param("id")),
+                {"group": 1, "id": 20}
+            ),
+            (lambda x: (x.item["group"] == 2) | (x.item["id"] <= Param("id")), {"id": 3})
+        ]
+    )
+    def test_matches_search(self, dicts, build_query, values):
+        """ Test a prepared query returns the same results as a search with the values filled in """
+
+        prepared = dicts.prepare(build_query(dicts))
+
+        for _ in range(0, 2):
+            expected = sorted(dicts.search(prepared.query.bind(values)))
+            found = sorted(prepared.run(**values))
+
+            assert expected == found, "Results did not match"
+
+    def test_different_values(self, dicts):
+        """ Test running a prepared query again with new values """
+
+        prepared = dicts.prepare(dicts.item["id"] == Param("id"))
+
+        assert [(1, {"id": 1, "group": 1})] == list(prepared.run(id=1)), "Results did not match"
+        assert [(2, {"id": 2, "group": 2})] == list(prepared.run(id=2)), "Results did not match"
+
+    def test_ordered_and_limited(self, dicts):
+        """ Test a prepared query with ordering and a limit """
+
+        prepared = dicts.prepare(
+            dicts.item["group"] == Param("group"),
+            order_by=dicts.item["id"],
+            descending=True,
+            limit=2
+        )
+
+        expected = [39, 35]
+        found = [index for index, _ in prepared.run(group=3)]
+
+        assert expected == found, "Results did not match"
+
+    def test_count_exists_first(self, dicts):
+        """ Test counting, checking and fetching the first result of a prepared query """
+
+        prepared = dicts.prepare(dicts.item["group"] == Param("group"))
+
+        assert 10 == prepared.count(group=1), "Count did not match"
+        assert prepared.exists(group=1), "Results not found"
+        assert not prepared.exists(group=7), "Results found"
+        assert prepared.first(group=7) is None, "Result found"
+
+    def test_missing_values(self, dicts):
+        """ Test running a prepared query without all of its values is rejected """
+
+        prepared = dicts.prepare(dicts.item["id"].between(Param("low"), Param("high")))
+
+        with pytest.raises(TypeError):
+            prepared.run(low=1)
+
+        with pytest.raises(TypeError):
+            prepared.run(low=1, high=2, other=3)
+
+
+    def test_values_with_bind_and_params(self, dicts):
+        """ Test values with their own bind() and params aren't mistaken for patterns """
+
+        class Key:
+
+            def __init__(self, value):
+                self.value = value
+
+            def __eq__(self, other):
+                return isinstance(other, Key) and self.value == other.value
+
+            def __lt__(self, other):
+                return self.value < other.value
+
+            def __hash__(self):
+                return hash(self.value)
+
+            def params(self):
+                return ["unrelated"]
+
+            def bind(self, values):
+                raise AssertionError("Key.bind() called")
+
+        keyed = IndexedList({"key": Key(i % 4), "id": i} for i in range(0, 40))
+
+        if dicts.lookups:
+            keyed.create_lookup(keyed.item["key"])
+
+        prepared = keyed.prepare((keyed.item["key"] == Key(1)) & (keyed.item["id"] == Param("id")))
+
+        assert [5] == [index for index, _ in prepared.run(id=5)], "Results did not match"
+
+        prepared = keyed.prepare(keyed.item["key"].in_(Key(1), Param("key")))
+
+        assert 20 == prepared.count(key=Key(2)), "Count did not match"
+
+
+class TestPlanCache:
+    """ Tests plans for prepared queries are cached and rebuilt when needed """
+
+    def test_plan_uses_lookup(self, indexed_dicts):
+        """ Test a prepared query's plan seeks a lookup for its Param """
+
+        prepared = indexed_dicts.prepare(indexed_dicts.item["id"] == Param("id"))
+
+        expected = [ops.LookupSeek, ops.Chain, ops.FetchItemsByIndices]
+        found = [type(operation) for operation in prepared.plan.operations]
+
+        assert expected == found, "Classes in plan do not match"
+
+    def test_same_shape_shares_plan(self, indexed_dicts):
+        """ Test preparing a query of the same shape reuses the cached plan """
+
+        first = indexed_dicts.prepare(indexed_dicts.item["id"] == Param("id"))
+        second = indexed_dicts.prepare(indexed_dicts.item["id"] == Param("id"))
+        other = indexed_dicts.prepare(indexed_dicts.item["id"] > Param("id"))
+
+        assert first.plan is second.plan, "Plan was not shared"
+        assert first.plan is not other.plan, "Plan was shared with a different query"
+
+    def test_rebuilt_when_lookups_change(self, indexed_dicts):
+        """ Test the cached plan is rebuilt when lookups are added or removed """
+
+        prepared = indexed_dicts.prepare(indexed_dicts.item["group"] > Param("group"))
+
+        assert isinstance(prepared.plan.operations[0], ops.DataScan), "Hashed lookup used for range"
+
+        indexed_dicts.create_lookup(indexed_dicts.item["group"], name="sorted_group")
+
+        assert isinstance(prepared.plan.operations[0], ops.LookupRangeSeek), "Plan was not rebuilt"
+
+        del indexed_dicts.lookups["sorted_group"]
+
+        assert isinstance(prepared.plan.operations[0], ops.DataScan), "Plan was not rebuilt"
+        assert [(39, {"id": 39, "group": 3})] == list(prepared.run(group=2))[-1:], \
+            "Results did not match"
+
+    def test_rebuilt_when_lookup_replaced(self):
+        """ Test the cached plan is rebuilt when a lookup is replaced under the same name """
+
+        ilist = IndexedList({"v": i % 10} for i in range(0, 30))
+        ilist.create_lookup(ilist.item["v"], name="x")
+
+        prepared = ilist.prepare(ilist.item["v"] == Param("v"))
+        assert 3 == len(list(prepared.run(v=5))), "Results did not match"
+
+        ilist.create_lookup(ilist.item["v"], name="x")
+        ilist.append({"v": 5})
+
+        assert 4 == len(list(prepared.run(v=5))), "Plan used the replaced lookup"
+
+        del ilist.lookups["x"]
+        ilist.create_lookup(ilist.item["v"], name="x")
+        ilist.append({"v": 5})
+
+        assert 5 == len(list(prepared.run(v=5))), "Plan used the removed lookup"
+        assert prepared.plan.operations[0].lookup is ilist.lookups["x"], "Plan was not rebuilt"
+
+    def test_rebuilt_when_list_grows(self):
+        """ Test a plan made for an empty list is rebuilt once the list has grown """
+
+        ilist = IndexedList()
+        ilist.create_lookup(name="sample")
+
+        prepared = ilist.prepare(ilist.item == Param("value"))
+        assert isinstance(prepared.plan.operations[0], ops.DataScan), "Empty list was not scanned"
+
+        ilist.extend(range(0, 100))
+
+        assert isinstance(prepared.plan.operations[0], ops.LookupSeek), "Plan was not rebuilt"
+        assert [(5, 5)] == list(prepared.run(value=5)), "Results did not match"
+
+    def test_filtered_lookup_not_used(self):
+        """ Test filtered lookups aren't used, as Params can't be shown to fall inside them """
+
+        ilist = IndexedList(range(0, 20))
+        ilist.create_lookup(ilist.item > 10)
+
+        prepared = ilist.prepare(ilist.item == Param("value"))
+
+        assert isinstance(prepared.plan.operations[0], ops.DataScan), "Filtered lookup was used"
+        assert [(3, 3)] == list(prepared.run(value=3)), "Results did not match"
+
+    def test_describe_shows_params(self, indexed_dicts):
+        """ Test the description of a prepared plan shows its Params """
+
+        prepared = indexed_dicts.prepare(indexed_dicts.item["id"] == Param("id"))
+
+        assert "item[id] == :id" == prepared.plan.describe()["query"], "Descriptions do not match"
@@ -6,7 +6,7 @@ import pytest
 
 import indexedlist.operations as ops
 
-from indexedlist import IndexedList, Indexable
+from indexedlist import IndexedList, Indexable, Param
 
 
 @Indexable
@@ -135,6 +135,18 @@ def lte_indexed_integers():
     return ilist
 
 
+@pytest.fixture(scope="module")
+def hash_indexed_mixed():
+    """ IndexedList of mixed integers and strings with a hashed lookup """
+
+    data = [1, "a", 2, "b", 1, "a"]
+
+    ilist = IndexedList(data)
+    ilist.create_lookup(hashed=True)
+
+    return ilist
+
+
 class TestKeySeekLookupEligiblePlans:
     """ Tests plan creation for searches that should be able to seek keys in lookups """
 
@@ -199,6 +211,22 @@ class TestKeySeekLookupEligiblePlans:
 
         assert self.expected == found, "Classes in plan do not match"
 
+    def test_hashed_equality_operations(self, hash_indexed_mixed):
+        """ Test an equality check can use a hashed lookup """
+
+        plan = hash_indexed_mixed.plan(hash_indexed_mixed.item == "a")
+        found = [type(operation) for operation in plan.operations]
+
+        assert self.expected == found, "Classes in plan do not match"
+
+    def test_hashed_in_operations(self, hash_indexed_mixed):
+        """ Test an in_ check can use a hashed lookup """
+
+        plan = hash_indexed_mixed.plan(hash_indexed_mixed.item.in_(1, "b"))
+        found = [type(operation) for operation in plan.operations]
+
+        assert self.expected == found, "Classes in plan do not match"
+
     def test_function_index_operations(self, function_indexed_integers):
         """ Test generating plan that uses an indexed function """
 
@@ -319,6 +347,28 @@ class TestRangeSeekLookupEligiblePlans:
         ops.FetchItemsByIndices
     ]
 
+    def test_between_operations(self, indexed_integers):
+        """ Test generating plan for a between operation """
+
+        plan = indexed_integers.plan(
+            indexed_integers.item.between(2, 3)
+        )
+
+        found = [type(operation) for operation in plan.operations]
+
+        assert self.expected == found, "Classes in plan do not match"
+
+    def test_gt_filtered_index_between_operations(self, gt_indexed_integers):
+        """ Test generating plan for a between operation within a gt filtered lookup """
+
+        plan = gt_indexed_integers.plan(
+            gt_indexed_integers.item.between(6, 7)
+        )
+
+        found = [type(operation) for operation in plan.operations]
+
+        assert self.expected == found, "Classes in plan do not match"
+
     def test_greater_than_correct_operations(self, indexed_integers):
         """ Test generating plan for a gt operation against a basic lookup """
 
@@ -448,6 +498,28 @@ class TestLookupIneligiblePlans:
         ops.DataScan
     ]
 
+    def test_out_of_range_between_against_gt_filter_operations(self, gt_indexed_integers):
+        """ Test generating plan for a between query extending outside a gt filter range """
+
+        plan = gt_indexed_integers.plan(
+            gt_indexed_integers.item.between(5, 7)
+        )
+
+        found = [type(operation) for operation in plan.operations]
+
+        assert self.expected == found, "Classes in plan do not match"
+
+    def test_range_against_hashed_operations(self):
+        """ Test a range query cannot use a hashed lookup """
+
+        ilist = IndexedList(range(0, 10))
+        ilist.create_lookup(hashed=True)
+
+        plan = ilist.plan(ilist.item > 5)
+        found = [type(operation) for operation in plan.operations]
+
+        assert self.expected == found, "Classes in plan do not match"
+
     def test_func_application_operations(self, indexed_integers):
         """ Test applying a function prevents using the default lookup """
 
@@ -724,6 +796,74 @@ class TestLookupIneligiblePlans:
         assert self.expected == found, "Classes in plan do not match"
 
 
+class TestCostBasedPlans:
+    """ Tests the planner chooses between lookups and scans based on estimated rows """
+
+    @pytest.fixture()
+    def skewed_integers(self):
+        """ IndexedList where 0 makes up most of the items """
+
+        ilist = IndexedList([0] * 90 + list(range(1, 11)))
+
+        ilist.create_lookup(name="all")
+        ilist.create_lookup(ilist.item > 5, name="filtered")
+
+        return ilist
+
+    def test_cheapest_lookup_chosen(self, skewed_integers):
+        """ Test the lookup finding the fewest rows is used """
+
+        plan = skewed_integers.plan(skewed_integers.item > 7)
+
+        expected = "filtered"
+        found = plan.operations[0].lookup.name
+
+        assert expected == found, "Unexpected lookup chosen"
+
+    def test_scan_chosen_for_unselective_query(self, skewed_integers):
+        """ Test a scan is used when a lookup would return almost every item """
+
+        plan = skewed_integers.plan(skewed_integers.item == 0)
+
+        expected = [ops.DataScan]
+        found = [type(operation) for operation in plan.operations]
+
+        assert expected == found, "Classes in plan do not match"
+
+    def test_estimated_rows_described(self, skewed_integers):
+        """ Test the plan description includes the estimated rows """
+
+        plan = skewed_integers.plan(skewed_integers.item.in_(1, 2))
+
+        expected = 2
+        found = plan.describe()["operations"][0]["estimated_rows"]
+
+        assert expected == found, "Unexpected row estimate"
+
+    def test_range_estimate_without_histogram(self, skewed_integers):
+        """ Test range estimates assume an even spread of items across keys """
+
+        lookup = skewed_integers.lookups["all"]
+
+        # 5 of the 11 keys fall in the range
+        expected = 100 * 5 / 11
+        found = lookup.estimate_rows((skewed_integers.item < 5).comparator)
+
+        assert expected == found, "Unexpected row estimate"
+
+    def test_range_estimate_with_histogram(self, skewed_integers):
+        """ Test range estimates account for skew once a histogram is built """
+
+        skewed_integers.analyze(buckets=100)
+
+        lookup = skewed_integers.lookups["all"]
+
+        expected = 94
+        found = lookup.estimate_rows((skewed_integers.item < 5).comparator)
+
+        assert expected == found, "Unexpected row estimate"
+
+
 class TestLookupResults:
     """ Test results of queries using lookups """
 
@@ -907,3 +1047,114 @@ class TestLookupResults:
         found = sorted(search)
 
         assert expected == found, "Results did not match"
+
+    def test_hashed_mixed_type_results(self, hash_indexed_mixed):
+        """ Test retrieving values of mixed types from a hashed lookup """
+
+        expected = [(0, 1), (1, "a"), (4, 1), (5, "a")]
+
+        search = hash_indexed_mixed.search(
+            hash_indexed_mixed.item.in_(1, "a")
+        )
+
+        found = sorted(search)
+
+        assert expected == found, "Results did not match"
+
+    def test_between_results(self, indexed_integers):
+        """ Test retrieving via a between query """
+
+        expected = [(1, 2), (2, 3), (8, 2), (9, 3), (15, 2), (16, 3)]
+
+        search = indexed_integers.search(indexed_integers.item.between(2, 3))
+
+        found = sorted(search)
+
+        assert expected == found, "Results did not match"
+
+    def test_count_results(self, indexed_integers):
+        """ Test counting the results of a query """
+
+        expected = 5
+
+        found = indexed_integers.count(indexed_integers.item > 5)
+
+        assert expected == found, "Count did not match"
+
+    def test_count_answered_by_lookups(self, indexed_integers):
+        """ Test a count can be taken from the lookup without fetching items """
+
+        plan = indexed_integers.plan(indexed_integers.item.in_(1, 2))
+
+        assert plan.answered_by_lookups, "Plan requires fetching items"
+
+    @pytest.mark.parametrize("hashed", [False, True], ids=["sorted", "hashed"])
+    def test_count_repeated_in_values(self, hashed):
+        """ Test repeated in_ values are counted once, as a scan counts them """
+
+        values = [1, 1, 2, 3, 1]
+        scanned = IndexedList(values)
+        indexed = IndexedList(values)
+        indexed.create_lookup(hashed=hashed)
+
+        for query_values in ((1, 1), (1, 2, 1, 2), (3, 3, 4)):
+            expected = scanned.count(scanned.item.in_(*query_values))
+
+            assert expected == indexed.count(indexed.item.in_(*query_values)), "Count did not match"
+            assert sorted(scanned.search(scanned.item.in_(*query_values))) == \
+                sorted(indexed.search(indexed.item.in_(*query_values))), "Results did not match"
+
+        prepared = indexed.prepare(indexed.item.in_(Param("a"), Param("b")))
+
+        assert 3 == prepared.count(a=1, b=1), "Prepared count did not match"
+
+    def test_count_majority_key_never_scans(self, monkeypatch):
+        """ Test counting a key most items share is answered by the lookup, not a scan """
+
+        ilist = IndexedList(["done"] * 900 + ["open"] * 100)
+        ilist.create_lookup(hashed=True)
+
+        prepared = ilist.prepare(ilist.item == Param("status"))
+
+        def fail_scan(self, stream, data):
+            raise AssertionError("DataScan was executed")
+
+        monkeypatch.setattr(ops.DataScan, "__call__", fail_scan)
+
+        assert 900 == ilist.count(ilist.item == "done"), "Count did not match"
+        assert 900 == ilist.count("done"), "Count did not match"
+        assert ilist.exists(ilist.item == "done"), "Match not found"
+        assert 900 == prepared.count(status="done"), "Prepared count did not match"
+        assert prepared.exists(status="done"), "Prepared match not found"
+
+        # Fetching the items still scans, which is cheaper than fetching most of them by row id
+        assert isinstance(ilist.plan(ilist.item == "done").operations[0], ops.DataScan)
+
+    def test_count_value_results(self, indexed_integers):
+        """ Test counting items equal to a value, as list.count() does """
+
+        expected = 3
+
+        found = indexed_integers.count(6)
+
+        assert expected == found, "Count did not match"
+
+    def test_exists_results(self, indexed_integers):
+        """ Test checking whether any items match a query """
+
+        assert indexed_integers.exists(indexed_integers.item == 7), "Match not found"
+        assert not indexed_integers.exists(indexed_integers.item == 8), "Unexpected match found"
+
+    def test_first_results(self, indexed_dicts):
+        """ Test retrieving the first match of a query """
+
+        expected = (2, {"a": 3, "b": 5})
+
+        found = indexed_dicts.first(indexed_dicts.item["a"] == 3)
+
+        assert expected == found, "Result did not match"
+
+    def test_first_no_results(self, indexed_dicts):
+        """ Test retrieving the first match of a query with no matches """
+
+        assert indexed_dicts.first(indexed_dicts.item["a"] == 4) is None, "Unexpected match"
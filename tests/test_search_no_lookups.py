@@ -70,7 +70,11 @@ class TestPlans:
     def test_equality(self, unique_integers):
         """ Test plans generated by equality expression """
 
-        expected = "{'query': 'item == 12', 'operations': [{'operation': 'DataScan'}]}"
+        expected = (
+            "{'query': 'item == 12', "
+            "'operations': [{'operation': 'DataScan', 'estimated_rows': 100}]}"
+        )
+
         found = str(unique_integers.plan(unique_integers.item == 12))
 
         assert expected == found, "Plans did not match"
@@ -78,7 +82,11 @@ class TestPlans:
     def test_in_(self, unique_integers):
         """ Test plans generated by in_ expression """
 
-        expected = "{'query': 'item.in_(12, 13)', 'operations': [{'operation': 'DataScan'}]}"
+        expected = (
+            "{'query': 'item.in_(12, 13)', "
+            "'operations': [{'operation': 'DataScan', 'estimated_rows': 100}]}"
+        )
+
         found = str(unique_integers.plan(unique_integers.item.in_(12, 13)))
 
         assert expected == found, "Plans did not match"
@@ -271,3 +279,35 @@ class TestResults:
         search = repeating_integers.search(repeating_integers.item <= 2)
 
         assert expected == list(search), "Results did not match"
+
+    def test_between(self, repeating_integers):
+        """ Test searching using between """
+
+        expected = [(1, 2), (2, 3), (8, 2), (9, 3), (15, 2), (16, 3)]
+
+        search = repeating_integers.search(repeating_integers.item.between(2, 3))
+
+        assert expected == list(search), "Results did not match"
+
+    def test_count(self, repeating_integers):
+        """ Test counting the results of a query """
+
+        expected = 6
+
+        found = repeating_integers.count(repeating_integers.item <= 2)
+
+        assert expected == found, "Count did not match"
+
+    def test_exists(self, integers_with_nones):
+        """ Test checking whether any items match a query """
+
+        assert integers_with_nones.exists(integers_with_nones.item == None), "Match not found"
+
+    def test_first(self, unique_integers):
+        """ Test retrieving the first match of a query """
+
+        expected = (50, 51)
+
+        found = unique_integers.first(unique_integers.item > 50)
+
+        assert expected == found, "Result did not match"
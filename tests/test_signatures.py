@@ -0,0 +1,221 @@
+""" Holds tests on transformation chains, pattern keys and finding lookups by signature """
+
+import pytest
+
+import indexedlist.operations as ops
+
+from indexedlist import IndexedList, Indexable, Param, exc
+from indexedlist.patterns import _to_pattern
+
+
+@Indexable
+def double(x):
+    return x * 2
+
+
+@Indexable
+def first_key(x):
+    return x["missing"]
+
+
+@pytest.fixture()
+def many_lookups():
+    """ IndexedList of dicts with a lookup on each of many keys """
+
+    ilist = IndexedList({f"key_{i}": row * i for i in range(0, 25)} for row in range(0, 50))
+
+    for i in range(0, 25):
+        ilist.create_lookup(ilist.item[f"key_{i}"], name=f"key_{i}")
+
+    return ilist
+
+
+class TestTransformations:
+    """ Test transformation collections built from .item """
+
+    def test_chaining_leaves_original(self):
+        """ Test extending an ItemProxy doesn't change transformations already in use """
+
+        ilist = IndexedList()
+        proxy = ilist.item["a"]
+        transformations = proxy.transformations
+
+        double(proxy["b"])
+
+        assert 1 == len(transformations), "Transformations were changed"
+        assert 3 == len(proxy.transformations), "Transformations were not chained"
+
+    def test_signature_memoized(self):
+        """ Test the signature is only generated once """
+
+        ilist = IndexedList()
+        transformations = ilist.item["a"]["b"].transformations
+
+        assert transformations.signature is transformations.signature, "Signature was regenerated"
+
+    def test_equal_chains(self):
+        """ Test separately built chains of the same functions are equal """
+
+        ilist = IndexedList()
+
+        first = double(ilist.item["a"]).transformations
+        second = double(ilist.item["a"]).transformations
+        other = ilist.item["a"].transformations
+
+        assert first == second, "Transformations did not match"
+        assert hash(first) == hash(second), "Hashes did not match"
+        assert first != other, "Different transformations matched"
+
+
+class TestCompiled:
+    """ Test transformation chains compiled into a single function """
+
+    @pytest.mark.parametrize(
+        "build_proxy,item,expected",
+        [
+            (lambda x: x.item, 5, 5),
+            (lambda x: x.item["a"]["b"][1], {"a": {"b": [7, 8]}}, 8),
+            (lambda x: double(x.item["a"]["b"]), {"a": {"b": 3}}, 6),
+            (lambda x: double(x.item[0])[3], [[1, 2]], 2)
+        ]
+    )
+    def test_results(self, build_proxy, item, expected):
+        """ Test compiled chains give the same results as applying each function """
+
+        ilist = IndexedList()
+        transformations = build_proxy(ilist).transformations
+
+        assert expected == transformations.compiled(item), "Results did not match"
+
+    @pytest.mark.parametrize("item", [{"a": {}}, {"a": {"b": []}}, {}])
+    def test_missing_keys_skipped(self, item):
+        """ Test a missing key or index anywhere in a fused chain skips the item """
+
+        ilist = IndexedList()
+        transformations = ilist.item["a"]["b"][0].transformations
+
+        with pytest.raises(exc.SkipItem):
+            transformations.compiled(item)
+
+    def test_user_function_errors_raised(self):
+        """ Test errors raised by user-defined functions aren't treated as missing keys """
+
+        ilist = IndexedList()
+        transformations = first_key(ilist.item["a"]).transformations
+
+        with pytest.raises(KeyError):
+            transformations.compiled({"a": {}})
+
+    def test_compiled_once(self):
+        """ Test the compiled function is only built once """
+
+        ilist = IndexedList()
+        transformations = ilist.item["a"].transformations
+
+        assert transformations.compiled is transformations.compiled, "Function was rebuilt"
+
+
+class TestPatternKeys:
+    """ Test patterns are compared and hashed by their keys """
+
+    def test_equal_patterns(self):
+        """ Test separately built patterns of the same query are equal """
+
+        ilist = IndexedList()
+
+        first = (ilist.item["a"] == 1) & (ilist.item["b"] > 2)
+        second = (ilist.item["a"] == 1) & (ilist.item["b"] > 2)
+
+        assert first == second, "Patterns did not match"
+        assert 1 == len({first, second}), "Patterns hashed differently"
+
+    @pytest.mark.parametrize(
+        "build_other",
+        [
+            lambda x: x.item["a"] == 2,
+            lambda x: x.item["b"] == 1,
+            lambda x: x.item["a"] >= 1,
+            lambda x: x.item["a"].in_(1),
+            lambda x: ~(x.item["a"] == 1)
+        ]
+    )
+    def test_different_patterns(self, build_other):
+        """ Test patterns differing in values, transformations or comparators aren't equal """
+
+        ilist = IndexedList()
+
+        assert _to_pattern(ilist.item["a"] == 1) != _to_pattern(build_other(ilist)), "Patterns matched"
+
+    def test_params_by_name(self):
+        """ Test patterns using Params are equal when the Params share names """
+
+        ilist = IndexedList()
+
+        first = (ilist.item == Param("value")).pattern
+        second = (ilist.item == Param("value")).pattern
+        other = (ilist.item == Param("other")).pattern
+
+        assert first == second, "Patterns did not match"
+        assert first != other, "Patterns with different Params matched"
+
+
+class TestLookupIndex:
+    """ Test lookups are found by the signature of their transformations """
+
+    def test_index_follows_lookups(self, many_lookups):
+        """ Test lookups are indexed and unindexed as they're added and removed """
+
+        signature = many_lookups.item["key_3"].transformations.signature
+
+        assert [many_lookups.lookups["key_3"]] == many_lookups.lookups.by_signature[signature], \
+            "Lookup not indexed"
+
+        many_lookups.create_lookup(many_lookups.item["key_3"], name="hashed_key_3", hashed=True)
+
+        assert 2 == len(many_lookups.lookups.by_signature[signature]), "Second lookup not indexed"
+
+        del many_lookups.lookups["key_3"]
+        many_lookups.lookups.pop("hashed_key_3")
+
+        assert signature not in many_lookups.lookups.by_signature, "Lookups not unindexed"
+
+    def test_replaced_lookup(self, many_lookups):
+        """ Test replacing a lookup under the same name unindexes the old lookup """
+
+        many_lookups.create_lookup(many_lookups.item["key_4"], name="key_3")
+
+        signature = many_lookups.item["key_3"].transformations.signature
+
+        assert signature not in many_lookups.lookups.by_signature, "Replaced lookup still indexed"
+
+    def test_other_mutators(self, many_lookups):
+        """ Test setdefault(), popitem() and |= keep the index and version up to date """
+
+        lookups = many_lookups.lookups
+        signature = many_lookups.item["key_3"].transformations.signature
+        version = lookups.version
+
+        removed = lookups.pop("key_3")
+        lookups.setdefault("key_3", removed)
+
+        assert [removed] == lookups.by_signature[signature], "setdefault() not indexed"
+
+        while lookups:
+            lookups.popitem()
+
+        assert {} == lookups.by_signature, "popitem() not unindexed"
+
+        lookups |= {"key_3": removed}
+
+        assert [removed] == lookups.by_signature[signature], "|= not indexed"
+        assert lookups.version > version, "Version not incremented"
+
+    def test_plan_finds_lookup(self, many_lookups):
+        """ Test the lookup matching a query is used among many others """
+
+        plan = many_lookups.plan(many_lookups.item["key_17"] == 34)
+
+        assert isinstance(plan.operations[0], ops.LookupSeek), "Lookup not used"
+        assert many_lookups.lookups["key_17"] is plan.operations[0].lookup, "Wrong lookup used"
+        assert [2] == [index for index, _ in many_lookups.search(many_lookups.item["key_17"] == 34)], \
+            "Results did not match"
@@ -0,0 +1,222 @@
+""" Holds tests on read-only snapshots of IndexedLists """
+
+import random
+import threading
+
+import pytest
+
+from indexedlist import IndexedList, Indexable, Param
+
+
+@Indexable
+def double(x):
+    return x * 2
+
+
+@pytest.fixture()
+def numbers():
+    """ IndexedList of numbers with sorted and hashed lookups """
+
+    ilist = IndexedList([i % 10 for i in range(0, 200)])
+    ilist.create_lookup(name="sorted")
+    ilist.create_lookup(double(ilist.item), name="hashed", hashed=True)
+
+    return ilist
+
+
+def check_searches(ilist, items):
+    """ Check lookup searches on a list (or snapshot) find the expected positions """
+
+    for key in range(0, 11):
+        expected = [(index, item) for index, item in enumerate(items) if item == key]
+        found = sorted(ilist.search(ilist.item == key))
+
+        assert found == expected, "Search results do not match"
+        assert sorted(ilist.search(double(ilist.item) == key * 2)) == expected, "Hashed results do not match"
+
+    expected = [(index, item) for index, item in enumerate(items) if item > 6]
+
+    assert sorted(ilist.search(ilist.item > 6)) == expected, "Range results do not match"
+
+    # Lookups are only skipped in favour of a scan for an empty list
+    if items:
+        assert ilist.plan(ilist.item == 3).describe()["operations"][0]["operation"] != "DataScan"
+
+
+def test_unchanged_by_list(numbers):
+    """ Test a snapshot keeps its contents while the list changes in every way """
+
+    before = list(numbers)
+    snapshot = numbers.snapshot()
+
+    numbers.extend(range(0, 10))
+    numbers[0] = 10
+    numbers.insert(5, 3)
+    del numbers[10:20]
+    numbers.remove(4)
+    numbers.sort()
+    numbers.reverse()
+
+    assert list(snapshot) == before
+    assert len(snapshot) == len(before)
+
+    check_searches(snapshot, before)
+    check_searches(numbers, list(numbers))
+
+    numbers.clear()
+
+    check_searches(snapshot, before)
+    check_searches(numbers, [])
+
+
+@pytest.mark.parametrize("change", [
+    lambda ilist: ilist.append(3),
+    lambda ilist: ilist.__setitem__(0, 10),
+    lambda ilist: ilist.__setitem__(slice(0, 10, 2), [10] * 5),
+    lambda ilist: ilist.__setitem__(slice(5, 6), [10, 10, 10]),
+    lambda ilist: ilist.insert(5, 3),
+    lambda ilist: ilist.pop(5),
+    lambda ilist: ilist.__delitem__(slice(10, 20)),
+    lambda ilist: ilist.sort(),
+], ids=["append", "setitem", "set_extended_slice", "set_slice", "insert", "pop", "delete_slice", "sort"])
+def test_rows_shared_until_changed(numbers, change):
+    """ Test a snapshot shares the list's rows until the list changes them """
+
+    before = list(numbers)
+    snapshot = numbers.snapshot()
+
+    assert snapshot._data is numbers._data, "Items were copied"
+    assert snapshot._row_ids is numbers._row_ids, "Row ids were copied"
+
+    change(numbers)
+
+    assert list(snapshot) == before, "Snapshot changed"
+    check_searches(snapshot, before)
+    check_searches(numbers, list(numbers))
+
+
+def test_many_snapshots():
+    """ Test each of several snapshots keeps its own contents while the list changes randomly """
+
+    rng = random.Random(0)
+
+    # Enough items for postings to be stored as bitmaps
+    ilist = IndexedList(rng.randrange(0, 10) for _ in range(0, 1000))
+    ilist.create_lookup(name="sorted")
+    ilist.create_lookup(double(ilist.item), name="hashed", hashed=True)
+
+    snapshots = []
+
+    for _ in range(0, 20):
+        snapshots.append((ilist.snapshot(), list(ilist)))
+
+        for _ in range(0, 20):
+            operation = rng.randrange(0, 4)
+
+            if operation == 0:
+                ilist.append(rng.randrange(0, 10))
+            elif operation == 1:
+                del ilist[rng.randrange(0, len(ilist))]
+            elif operation == 2:
+                ilist[rng.randrange(0, len(ilist))] = rng.randrange(0, 10)
+            else:
+                ilist.insert(rng.randrange(0, len(ilist)), rng.randrange(0, 10))
+
+    for snapshot, items in snapshots:
+        check_searches(snapshot, items)
+
+    check_searches(ilist, list(ilist))
+
+
+def test_read_only(numbers):
+    """ Test methods that would change a snapshot raise a TypeError """
+
+    snapshot = numbers.snapshot()
+
+    changes = [
+        lambda: snapshot.append(1),
+        lambda: snapshot.extend([1]),
+        lambda: snapshot.insert(0, 1),
+        lambda: snapshot.pop(),
+        lambda: snapshot.remove(1),
+        lambda: snapshot.clear(),
+        lambda: snapshot.sort(),
+        lambda: snapshot.reverse(),
+        lambda: snapshot.create_lookup(),
+        lambda: snapshot.batch()
+    ]
+
+    for change in changes:
+
+        with pytest.raises(TypeError):
+            change()
+
+    with pytest.raises(TypeError):
+        snapshot[0] = 1
+
+    with pytest.raises(TypeError):
+        del snapshot[0]
+
+    assert snapshot.snapshot() is snapshot
+    assert len(snapshot) == 200
+
+
+def test_queries(numbers):
+    """ Test counts, prepared queries and ordered searches on a snapshot """
+
+    snapshot = numbers.snapshot()
+    numbers.extend([3] * 10)
+
+    by_value = snapshot.prepare(snapshot.item == Param("value"))
+
+    assert snapshot.count(3) == 20
+    assert snapshot.exists(snapshot.item == 9)
+    assert by_value.count(value=3) == 20
+    assert list(by_value.run(value=3))[:2] == [(3, 3), (13, 3)]
+    assert snapshot.first(snapshot.item > 5, order_by=snapshot.item, descending=True) == (9, 9)
+    assert numbers.count(3) == 30
+
+
+def test_batch_and_unbuilt_lookups(numbers):
+    """ Test a snapshot taken in a batch sees its changes, and unbuilt lookups are left out """
+
+    numbers.create_lookup(double(numbers.item), name="lazy", lazy=True)
+
+    with numbers.batch():
+        numbers.extend([3] * 10)
+        snapshot = numbers.snapshot()
+        numbers.extend([3] * 10)
+
+    assert snapshot.count(3) == 30
+    assert numbers.count(3) == 40
+    assert "lazy" not in snapshot.lookups
+
+    # Rolling back a batch doesn't change a snapshot taken in it
+    with pytest.raises(ValueError):
+
+        with numbers.batch():
+            numbers.extend([3] * 10)
+            snapshot = numbers.snapshot()
+            raise ValueError("Roll back")
+
+    assert snapshot.count(3) == 50
+    assert numbers.count(3) == 40
+
+
+def test_search_does_not_block_writer():
+    """ Test a writer doesn't wait for searches on a concurrent list's snapshot """
+
+    ilist = IndexedList(range(0, 100), concurrent=True)
+    ilist.create_lookup()
+
+    snapshot = ilist.snapshot()
+    results = snapshot.search(snapshot.item < 50, order_by="index")
+    first = next(results)
+
+    writer = threading.Thread(target=lambda: ilist.extend(range(0, 100)), daemon=True)
+    writer.start()
+    writer.join(5)
+
+    assert not writer.is_alive()
+    assert [first] + list(results) == [(i, i) for i in range(0, 50)]
+    assert ilist.count(ilist.item < 50) == 100
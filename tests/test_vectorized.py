@@ -0,0 +1,208 @@
+""" Holds tests on vectorized (NumPy-backed) full list scans """
+
+import pytest
+
+from indexedlist import IndexedList, Indexable, patterns, vectorized
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture(autouse=True)
+def always_vectorize(monkeypatch):
+    """ Vectorize scans of lists of any size """
+
+    monkeypatch.setattr(vectorized, "MIN_ROWS", 0)
+
+
+def _scalar_results(ilist, query):
+    """ Search without vectorization, to compare results against """
+
+    pattern = patterns._to_pattern(query)
+
+    return [
+        (index, item)
+        for index, item in enumerate(ilist)
+        if pattern.matches(item)
+    ]
+
+
+@pytest.fixture
+def numbers():
+    """ IndexedList of mixed ints and floats """
+
+    return IndexedList([i % 7 + (0.5 if i % 3 == 0 else 0) for i in range(0, 50)])
+
+
+@pytest.fixture
+def dicts():
+    """ IndexedList of dicts, some missing the 'b' key """
+
+    items = [{"a": i % 5, "b": i * 2} for i in range(0, 30)]
+    items[4] = {"a": 4}
+
+    return IndexedList(items)
+
+
+@pytest.mark.parametrize(
+    "build_query",
+    [
+        lambda x: x.item == 3,
+        lambda x: x.item.in_(1, 2.5, 6),
+        lambda x: x.item > 3,
+        lambda x: x.item >= 3.5,
+        lambda x: x.item < 2,
+        lambda x: x.item <= 2,
+        lambda x: x.item.between(2, 4.5),
+        lambda x: (x.item > 1) & ~(x.item == 4),
+        lambda x: (x.item < 1) | (x.item > 5)
+    ]
+)
+def test_numbers_match_scalar_scan(numbers, build_query):
+    """ Test vectorized results match checking each item """
+
+    expected = _scalar_results(numbers, build_query(numbers))
+    found = list(numbers.search(build_query(numbers)))
+
+    assert expected == found, "Results did not match"
+    assert any(
+        isinstance(column, vectorized.Column) for column in numbers._columns.values()
+    ), "Column was not cached"
+
+
+def test_skipped_items(dicts):
+    """ Test items missing the searched key never match, except under ~ """
+
+    expected = _scalar_results(dicts, ~(dicts.item["b"] > 10))
+    found = list(dicts.search(~(dicts.item["b"] > 10)))
+
+    assert expected == found, "Results did not match"
+    assert (4, {"a": 4}) in found, "Skipped item did not match ~ query"
+
+
+def test_reverse_scan(dicts):
+    """ Test vectorized scans in list index order, last first """
+
+    expected = [25, 20, 15, 10, 5, 0]
+    found = [index for index, _ in dicts.search(dicts.item["a"] == 0, order_by="index", descending=True)]
+
+    assert expected == found, "Results did not match"
+
+
+def test_non_numeric_falls_back():
+    """ Test lists of strings are still searched one item at a time """
+
+    ilist = IndexedList(["a", "b", "c", "b"])
+
+    expected = [(1, "b"), (3, "b")]
+    found = list(ilist.search(ilist.item == "b"))
+
+    assert expected == found, "Results did not match"
+
+
+def test_non_numeric_comparison_value_falls_back(numbers):
+    """ Test comparing against a value NumPy can't compare exactly doesn't vectorize """
+
+    expected = []
+    found = list(numbers.search(numbers.item == "3"))
+
+    assert expected == found, "Results did not match"
+
+
+def test_large_integers_not_compared_as_floats():
+    """ Test integers too large to be exact floats are compared exactly """
+
+    big = 2 ** 60
+    ilist = IndexedList([big, big + 1, 1.5])
+
+    expected = [(1, big + 1)]
+    found = list(ilist.search(ilist.item == big + 1))
+
+    assert expected == found, "Results did not match"
+
+
+def test_first_inexact_integer_not_compared_as_float():
+    """ Test 2 ** 53 + 1, the first integer that rounds as a float, is compared exactly """
+
+    ilist = IndexedList([2 ** 53 + 1] * 600 + [1.0] * 600)
+    query = ilist.item <= 2 ** 53
+
+    assert 600 == ilist.count(query), "Count did not match"
+    assert _scalar_results(ilist, query) == list(ilist.search(query)), "Results did not match"
+
+    ilist = IndexedList([2 ** 53] * 600 + [1.0] * 600)
+
+    assert 600 == ilist.count(ilist.item == 2 ** 53), "Count did not match"
+    assert 0 == ilist.count(ilist.item == 2 ** 53 + 1), "Count did not match"
+
+
+def test_column_discarded_on_change(numbers):
+    """ Test the cached column is rebuilt after the list changes """
+
+    list(numbers.search(numbers.item == 100))
+
+    numbers.append(100)
+    numbers[0] = 100
+    del numbers[1]
+
+    expected = [0, 49]
+    found = [index for index, _ in numbers.search(numbers.item == 100)]
+
+    assert expected == found, "Results did not match"
+
+
+def test_non_numeric_values_stop_column():
+    """ Test transformed values that aren't numbers stop the column being built after one item """
+
+    calls = []
+
+    @Indexable
+    def label(x):
+        calls.append(x)
+        return "item {}".format(x)
+
+    ilist = IndexedList(range(0, 20))
+    found = list(ilist.search(label(ilist.item) == "item 3"))
+
+    assert found == [(3, 3)], "Results did not match"
+    assert len(calls) == 21, "Column kept transforming non-numeric values"
+
+
+def test_mixed_values_stop_column():
+    """ Test a column stops being built at the first transformed value that isn't a number """
+
+    calls = []
+
+    @Indexable
+    def numbered(x):
+        calls.append(x)
+        return x if x < 5 else "item {}".format(x)
+
+    ilist = IndexedList(range(0, 20))
+    found = list(ilist.search(numbered(ilist.item) == "item 7"))
+
+    assert found == [(7, 7)], "Results did not match"
+    assert len(calls) == 26, "Column kept transforming after a non-numeric value"
+
+
+def test_mixed_values_fall_back(dicts):
+    """ Test values that start as numbers but include others are searched one item at a time """
+
+    dicts.append({"a": "x", "b": 0})
+
+    expected = _scalar_results(dicts, dicts.item["a"] == "x")
+    found = list(dicts.search(dicts.item["a"] == "x"))
+
+    assert expected == found, "Results did not match"
+    assert found == [(30, {"a": "x", "b": 0})]
+
+
+def test_column_cache_bounded():
+    """ Test only the most recently built columns are kept """
+
+    keys = ["k{}".format(i) for i in range(0, vectorized.MAX_COLUMNS + 3)]
+    ilist = IndexedList([{key: i for key in keys} for i in range(0, 10)])
+
+    for key in keys:
+        assert list(ilist.search(ilist.item[key] == 4)) == [(4, ilist[4])]
+
+    assert len(ilist._columns) == vectorized.MAX_COLUMNS